@@ -1,110 +1,196 @@
-from flask import Flask, render_template, jsonify
+"""Flask app for the TNEA allotment dashboards.
+
+create_app() registers every route but loads no data: the page routes,
+/healthz and /readyz answer as soon as the app is built. The dataset, its
+indexes and the prerendered responses (preload()) are loaded either by the
+gunicorn master before forking (PRELOAD=1, see gunicorn.conf.py) or by
+start_background() on a thread in each process; /readyz turns 200 when that
+finishes. A data request that arrives earlier waits for the same load instead
+of starting its own.
+"""
 import os
-import pandas as pd
-from cutoff import (
-    cutoff_bp,               # the blueprint for the new cutoff page + API
-    load_data,
-    get_round_count,
-    get_year_count,
-    get_top10_colleges,
-    get_community_count,
-    get_college_type_count,
-)
-
-app = Flask(__name__)
-app.register_blueprint(cutoff_bp, url_prefix="/cutoff")  # mounts /cutoff and /cutoff/data
-from regional import regional_bp   # import blueprint
-
-app.register_blueprint(regional_bp) 
-from branch import branch_bp  # register it
-app.register_blueprint(branch_bp)
-
-# ---- Load and process data for MAIN PAGE ----
-df = load_data()
-round_count = get_round_count(df)
-year_count = get_year_count(df)
-top10_colleges = get_top10_colleges(df)
-community_count = get_community_count(df)
-college_type_count = get_college_type_count(df)
+
+from flask import Flask, render_template, jsonify
+
+from health import init_app as init_health, readiness
+from metrics import init_app as init_metrics, span
+from response_cache import cached_response
+
+# the payloads a dashboard page needs, combined by /dashboard-bundle
+BUNDLE_PARTS = {
+    "data": "/data",
+    "cutoff_dashboard": "/cutoff-dashboard-data",
+    "branch": "/branch_data",
+    "regional": "/cutoff/regional-data",
+}
+# cached JSON endpoints rendered up front by preload(); the bundle after its parts
+PRELOAD_URLS = list(BUNDLE_PARTS.values()) + ["/dashboard-bundle", "/geo/districts", "/cutoff/regional-map"]
+REFRESH_SECONDS = float(os.environ.get("TNEA_REFRESH_SECONDS", 30))
 
 # ----- MAIN PAGE API (unchanged) -----
-@app.route("/data")
+@cached_response
 def chart_data():
-    return jsonify({
-        "rounds": {
-            "labels": round_count['ROUND'].tolist(),
-            "data": round_count['count'].tolist()
-        },
-        "years": {
-            "labels": year_count['YEAR'].tolist(),
-            "data": year_count['count'].tolist()
-        },
-        "top10_colleges": {
-            "labels": top10_colleges['COLLENAME'].tolist(),
-            "data": top10_colleges['AGGRMARK'].tolist()
-        },
-        "community": {
-            "labels": community_count['COMMUNITY'].tolist(),
-            "data": community_count['count'].tolist()
-        },
-        "college_type": {
-            "labels": college_type_count['COLLEGETYPE'].tolist(),
-            "data": college_type_count['count'].tolist()
-        }
-    })
+    # rolled up from the cached cube, so this also picks up a reloaded dataset
+    from cutoff import (load_cube, get_round_count, get_year_count, get_top10_colleges,
+                        get_community_count, get_college_type_count)
+    cube = load_cube()
+    with span("data.rollups"):
+        round_count = get_round_count(cube)
+        year_count = get_year_count(cube)
+        top10_colleges = get_top10_colleges(cube)
+        community_count = get_community_count(cube)
+        college_type_count = get_college_type_count(cube)
+    with span("serialize"):
+        return jsonify({
+            "rounds": {
+                "labels": round_count['ROUND'].tolist(),
+                "data": round_count['count'].tolist()
+            },
+            "years": {
+                "labels": year_count['YEAR'].tolist(),
+                "data": year_count['count'].tolist()
+            },
+            "top10_colleges": {
+                "labels": top10_colleges['COLLENAME'].tolist(),
+                "data": top10_colleges['AGGRMARK'].tolist()
+            },
+            "community": {
+                "labels": community_count['COMMUNITY'].tolist(),
+                "data": community_count['count'].tolist()
+            },
+            "college_type": {
+                "labels": college_type_count['COLLEGETYPE'].tolist(),
+                "data": college_type_count['count'].tolist()
+            }
+        })
 
 # ----- MAIN PAGE (unchanged) -----
-@app.route("/")
 def index():
     return render_template("index.html")
 
 # ----- NEW PAGE: Cutoff Shifts Over Years -----
-@app.route("/cutoff")
 def cutoff_page():
     from cutoff import cutoff_insights   # import your function
     insights = cutoff_insights()         # get data
     return render_template("cutoff_shifts.html", insights=insights)
-import numpy as np
-from flask import jsonify
-
-
 
-# Example endpoint (ensure you import np and jsonify)
-@app.route("/cutoff-dashboard-data")
+@cached_response
 def cutoff_dashboard_data():
     # load and build insights
-    from cutoff import build_insights
-    df = load_data()
-    insights = build_insights(df)
+    from cutoff import build_insights, load_cube
+    from serialize import json_response
+    insights = build_insights(load_cube())
+
+    # DataFrames are written straight to JSON column-wise (NaN -> null), see serialize.py
+    with span("serialize"):
+        return json_response(insights)
+
+@cached_response
+def dashboard_bundle():
+    # every BUNDLE_PARTS payload in one response: {"data": {...}, "branch": {...}, ...}
+    from concurrent.futures import ThreadPoolExecutor
+    from flask import request
+    from cutoff import _dataset
+    # all parts come from the dataset version this request sees, even mid-refresh
+    snapshot = _dataset.snapshot()
+
+    def render(url):
+        # the part's own view (and its cache entry), without another trip through the app
+        with _dataset.pinned(snapshot), app.test_request_context(url):
+            view = app.view_functions[request.url_rule.endpoint]
+            return app.make_response(view(**request.view_args))
+
+    with span("bundle.parts"), ThreadPoolExecutor(len(BUNDLE_PARTS)) as pool:
+        responses = dict(zip(BUNDLE_PARTS, pool.map(render, BUNDLE_PARTS.values())))
+    for name, response in responses.items():
+        if response.status_code != 200:
+            return jsonify({"error": f"{BUNDLE_PARTS[name]} returned {response.status_code}"}), 502
+    body = "{" + ",".join(f'"{name}":{response.get_data(as_text=True)}'
+                          for name, response in responses.items()) + "}"
+    return app.response_class(body, mimetype="application/json")
 
-    # convert all DataFrames in insights to JSON-serializable lists (NaN -> None)
-    safe_response = {}
-    for k, v in insights.items():
-        if isinstance(v, pd.DataFrame):
-            safe_df = v.replace({np.nan: None})
-            safe_response[k] = safe_df.to_dict(orient="records")
-        else:
-            # if some value isn't a DataFrame, attempt direct conversion
-            safe_response[k] = v
-
-    return jsonify(safe_response)
-
-
-from flask import render_template
-@app.route('/cutoff/regional')
 def cutoff_regional_page():
     return render_template('cutoff_regional.html')
 
 
-@app.route("/cutoff-dashboard")
 def cutoff_dashboard():
     return render_template("cutoff_dashboard.html")
 
-@app.route("/branch/dashhboard")
 def branch_dashboard():
     return render_template("breanch.html")
 
+PAGES = [
+    ("/data", chart_data),
+    ("/", index),
+    ("/cutoff", cutoff_page),
+    ("/cutoff-dashboard-data", cutoff_dashboard_data),
+    ("/dashboard-bundle", dashboard_bundle),
+    ('/cutoff/regional', cutoff_regional_page),
+    ("/cutoff-dashboard", cutoff_dashboard),
+    ("/branch/dashhboard", branch_dashboard),
+]
+
+# set by create_app()
+precomputer = None
+
+def create_app():
+    global precomputer
+    app = Flask(__name__)
+    init_metrics(app)  # request timings, /metrics, /debug/profiler
+    for rule, view in PAGES:
+        app.add_url_rule(rule, view_func=view)
+
+    # importing the blueprints pulls in pandas / numpy, but loads no data
+    from cutoff import cutoff_bp, _dataset
+    from regional import regional_bp
+    from branch import branch_bp
+    from geo import geo_bp  # simplified map geometry
+    app.register_blueprint(cutoff_bp, url_prefix="/cutoff")  # mounts /cutoff/query, /cutoff/predict, ...
+    app.register_blueprint(regional_bp)
+    app.register_blueprint(branch_bp)
+    app.register_blueprint(geo_bp)
+
+    # rebuilds and publishes new dataset versions in the background; started
+    # per process by start_refresh()
+    from precompute import init_app as init_precompute
+    precomputer = init_precompute(app, _dataset, PRELOAD_URLS, REFRESH_SECONDS)
+    init_health(app)  # /healthz, /readyz
+    # without a warm-up, ready as soon as a request has loaded the dataset
+    _dataset.on_first_load(readiness.mark_ready_if_idle)
+    return app
+
+def load_data_layer():
+    # every index, then the cached dashboard responses
+    from cutoff import preload as preload_dataset
+    stats = preload_dataset()
+    with app.test_client() as client:
+        for url in PRELOAD_URLS:
+            client.get(url)
+    return stats
+
+def preload():
+    """Load the data layer now and mark the process ready.
+
+    Called from gunicorn.conf.py in the master process before workers are
+    forked, so all of this is shared with the workers copy-on-write.
+    """
+    return readiness.run(load_data_layer)
+
+def start_refresh():
+    # TNEA_REFRESH_SECONDS=0 keeps the old behaviour: requests reload a changed file themselves
+    if REFRESH_SECONDS > 0:
+        precomputer.start()
+
+def start_background():
+    """Load the data layer on a thread unless preload() already did; then start refreshing."""
+    if readiness.ready:
+        start_refresh()
+    else:
+        readiness.start(load_data_layer, then=start_refresh)
+
+app = create_app()
+
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 5000))
+    start_background()
     app.run(host="0.0.0.0", port=port)
-
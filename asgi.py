@@ -0,0 +1,178 @@
+"""ASGI entry point: the same Flask app and blueprints, served from an event loop.
+
+    uvicorn asgi:application --workers 4
+    gunicorn -c gunicorn.conf.py -k uvicorn_worker.UvicornWorker asgi:application
+
+A sync gunicorn worker handles one request at a time, so the requests a
+dashboard page fires in parallel queue up behind each other. Here one process
+keeps many connections open:
+- a GET whose response is already in the dataset's ResponseCache is run
+  straight on the event loop (the view is a dict lookup plus headers, well
+  under a millisecond). Other caches, like the regional map's, check files
+  on disk for their version, so their hits go through the pool;
+- everything else - pandas work, first renders, exports - runs on a bounded
+  thread pool of TNEA_ASGI_THREADS threads. Once TNEA_ASGI_QUEUE more requests
+  are waiting for it, new ones get a 503 with Retry-After instead of piling up.
+
+Response bodies are streamed from the pool in chunks (for /cutoff/export).
+The data layer is loaded and the refresh thread started from the lifespan
+startup event, i.e. in every worker process after any fork.
+
+uvicorn and uvicorn-worker (the gunicorn worker class) are pinned in
+requirements.txt; the WSGI app (Procfile) runs without them.
+"""
+import asyncio
+import io
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from app import app as flask_app, precomputer, start_background
+from response_cache import response_cache
+
+THREADS = int(os.environ.get("TNEA_ASGI_THREADS", min(8, (os.cpu_count() or 1) + 4)))
+QUEUE = int(os.environ.get("TNEA_ASGI_QUEUE", 64))
+# pulled from a streaming body per trip to the pool
+CHUNK_BYTES = 64 * 1024
+
+_pool = ThreadPoolExecutor(THREADS, thread_name_prefix="asgi")
+# THREADS running + QUEUE waiting; more than that is turned away
+_slots = None
+
+
+def _environ(scope, body):
+    server = scope.get("server") or ("localhost", 80)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+        "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope["query_string"].decode("latin-1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "REMOTE_ADDR": scope["client"][0] if scope.get("client") else "",
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    for name, value in scope["headers"]:
+        name = name.decode("latin-1").upper().replace("-", "_")
+        value = value.decode("latin-1")
+        key = name if name in ("CONTENT_TYPE", "CONTENT_LENGTH") else f"HTTP_{name}"
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+class _Start:
+    """start_response() that just remembers the status line and headers."""
+
+    def __call__(self, status, headers, exc_info=None):
+        self.status = int(status.split(" ", 1)[0])
+        self.headers = [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in headers]
+
+
+def _read_chunk(iterator):
+    # (data, exhausted); joins small pieces so each trip to the pool carries ~CHUNK_BYTES
+    parts, size = [], 0
+    for part in iterator:
+        parts.append(part)
+        size += len(part)
+        if size >= CHUNK_BYTES:
+            return b"".join(parts), False
+    return b"".join(parts), True
+
+
+def _close(iterable):
+    if hasattr(iterable, "close"):
+        iterable.close()
+
+
+async def _read_body(receive):
+    body = b""
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return None
+        body += message.get("body", b"")
+        if not message.get("more_body"):
+            return body
+
+
+def _cache_key(scope):
+    # what request.full_path gives inside Flask
+    return f"{scope['path']}?{scope['query_string'].decode('utf-8', 'replace')}"
+
+
+async def _run_inline(environ, send):
+    start = _Start()
+    iterable = flask_app(environ, start)
+    try:
+        body = b"".join(iterable)
+    finally:
+        _close(iterable)
+    await send({"type": "http.response.start", "status": start.status, "headers": start.headers})
+    await send({"type": "http.response.body", "body": body})
+
+
+async def _run_in_pool(environ, send):
+    loop = asyncio.get_running_loop()
+    start = _Start()
+    iterable = await loop.run_in_executor(_pool, flask_app, environ, start)
+    try:
+        iterator = iter(iterable)
+        data, done = await loop.run_in_executor(_pool, _read_chunk, iterator)
+        await send({"type": "http.response.start", "status": start.status, "headers": start.headers})
+        while not done:
+            await send({"type": "http.response.body", "body": data, "more_body": True})
+            data, done = await loop.run_in_executor(_pool, _read_chunk, iterator)
+        await send({"type": "http.response.body", "body": data})
+    finally:
+        await loop.run_in_executor(_pool, _close, iterable)
+
+
+async def _busy(send):
+    body = json.dumps({"error": "server busy, try again"}).encode()
+    await send({"type": "http.response.start", "status": 503, "headers": [
+        (b"content-type", b"application/json"), (b"retry-after", b"1"),
+        (b"content-length", str(len(body)).encode())]})
+    await send({"type": "http.response.body", "body": body})
+
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            start_background()
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def application(scope, receive, send):
+    global _slots
+    if scope["type"] == "lifespan":
+        return await _lifespan(receive, send)
+    if scope["type"] != "http":
+        return
+    body = await _read_body(receive)
+    if body is None:
+        return
+    environ = _environ(scope, body)
+
+    # the cache lookup checks the dataset version; that only stays cheap (no
+    # reload on the loop) while the refresh thread owns reloading
+    if scope["method"] in ("GET", "HEAD") and precomputer.running and response_cache.lookup(_cache_key(scope)):
+        return await _run_inline(environ, send)
+
+    if _slots is None:
+        _slots = asyncio.Semaphore(THREADS + QUEUE)
+    if _slots.locked():
+        return await _busy(send)
+    async with _slots:
+        await _run_in_pool(environ, send)
@@ -0,0 +1,133 @@
+"""Requests/sec with many concurrent clients: sync gunicorn workers vs the ASGI app.
+
+    python benchmarks/bench_async.py [clients] [seconds] [workers]
+
+Starts each server with gunicorn.conf.py (same worker count, preloaded),
+waits for /readyz, then keeps `clients` connections (default 500) busy for
+`seconds` (default 15). They cycle through the four dashboard payloads, then
+/dashboard-bundle, then the payloads mixed with an uncached export. Clients
+run as asyncio tasks spread over a few processes, one request per connection
+(the sync worker closes it anyway). Reports requests/sec, p50 / p99 latency
+of successful requests and errors by status (503 = turned away by the ASGI
+queue limit, null = connection failed), one JSON line per server and URL set.
+
+Needs uvicorn and uvicorn-worker for the ASGI server (see requirements.txt).
+"""
+import asyncio
+import collections
+import json
+import multiprocessing
+import os
+import signal
+import subprocess
+import sys
+import time
+import urllib.request
+
+from bench_workers import ROOT, free_port, wait_for
+
+SERVERS = {
+    "sync": ["app:app"],
+    "asgi": ["-k", "uvicorn_worker.UvicornWorker", "asgi:application"],
+}
+URL_SETS = {
+    "dashboard": ["/data", "/cutoff-dashboard-data", "/branch_data", "/cutoff/regional-data"],
+    "bundle": ["/dashboard-bundle"],
+    # one uncached, CPU-heavy request per five: shows whether fast requests wait behind it
+    "mixed": ["/data", "/cutoff-dashboard-data", "/branch_data", "/cutoff/regional-data",
+              "/cutoff/export?format=csv&limit=5000"],
+}
+CLIENT_PROCESSES = min(4, os.cpu_count() or 1)
+
+
+async def _get(port, path):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    try:
+        writer.write(f"GET {path} HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n\r\n".encode())
+        await writer.drain()
+        response = await reader.read()
+        return int(response[9:12])
+    finally:
+        writer.close()
+
+
+async def _client(port, paths, deadline, latencies, errors):
+    i = 0
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        try:
+            status = await _get(port, paths[i % len(paths)])
+        except OSError:
+            status = None
+        i += 1
+        if status == 200:
+            latencies.append(time.perf_counter() - start)
+        else:
+            errors.append(status)
+            await asyncio.sleep(0.01)
+
+
+def _client_process(port, paths, clients, seconds, queue):
+    async def main():
+        latencies, errors = [], []
+        deadline = time.perf_counter() + seconds
+        await asyncio.gather(*(_client(port, paths, deadline, latencies, errors) for _ in range(clients)))
+        return latencies, errors
+
+    queue.put(asyncio.run(main()))
+
+
+def load(port, paths, clients, seconds):
+    queue = multiprocessing.Queue()
+    share = [clients // CLIENT_PROCESSES + (i < clients % CLIENT_PROCESSES) for i in range(CLIENT_PROCESSES)]
+    procs = [multiprocessing.Process(target=_client_process, args=(port, paths, n, seconds, queue))
+             for n in share if n]
+    for p in procs:
+        p.start()
+    latencies, errors = [], []
+    for _ in procs:
+        lat, err = queue.get()
+        latencies += lat
+        errors += err
+    for p in procs:
+        p.join()
+    latencies.sort()
+
+    def pct(q):
+        return round(latencies[int(q * (len(latencies) - 1))] * 1000, 1) if latencies else None
+
+    return {"requests_per_sec": round(len(latencies) / seconds, 1), "p50_ms": pct(0.5), "p99_ms": pct(0.99),
+            "errors": dict(collections.Counter(str(e) for e in errors))}
+
+
+def run(server, workers, clients, seconds):
+    port = free_port()
+    env = dict(os.environ, PORT=str(port), WEB_CONCURRENCY=str(workers), PRELOAD="1")
+    master = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "--log-level", "warning",
+         "--backlog", "4096", *SERVERS[server]],
+        cwd=ROOT, env=env,
+    )
+    try:
+        wait_for(f"http://127.0.0.1:{port}/readyz")
+        for name, paths in URL_SETS.items():
+            for path in paths:
+                urllib.request.urlopen(f"http://127.0.0.1:{port}{path}").read()
+            result = {"server": server, "workers": workers, "clients": clients, "urls": name}
+            result.update(load(port, paths, clients, seconds))
+            print(json.dumps(result), flush=True)
+    finally:
+        master.send_signal(signal.SIGTERM)
+        master.wait(timeout=30)
+
+
+def main():
+    clients = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 15
+    workers = int(sys.argv[3]) if len(sys.argv) > 3 else 2
+    for server in SERVERS:
+        run(server, workers, clients, seconds)
+
+
+if __name__ == "__main__":
+    main()
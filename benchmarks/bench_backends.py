@@ -0,0 +1,65 @@
+"""Load time and resident memory of the pandas and sqlite backends.
+
+    python benchmarks/bench_backends.py [csv_path]
+
+Runs the app once per backend (TNEA_BACKEND=pandas / sqlite) in a fresh
+interpreter, each pointed at the same data (TNEA_DATA, default the app's), and
+preloads it. The sqlite database goes to a temporary file, so the first sqlite
+run includes the ingest and the second one only opens it. Prints one JSON line
+per backend with load time and resident memory after loading.
+
+That both serve the same payloads is checked by tests/test_backend_parity.py.
+"""
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def rss_mb():
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def child(out_path):
+    sys.path.insert(0, ROOT)
+    os.chdir(ROOT)
+    start = time.perf_counter()
+    from app import preload
+    stats = preload()
+    loaded = time.perf_counter() - start
+    with open(out_path, "w") as f:
+        json.dump({"load_seconds": round(loaded, 3), "rss_mb": round(rss_mb(), 1), "rows": stats["rows"]}, f)
+
+
+def run(backend, db_path, out_path):
+    env = dict(os.environ, TNEA_BACKEND=backend, TNEA_DB=db_path, TNEA_REFRESH_SECONDS="0")
+    subprocess.run([sys.executable, __file__, "--child", out_path], cwd=ROOT, env=env,
+                   check=True, capture_output=True)
+    with open(out_path) as f:
+        return json.load(f)
+
+
+def main():
+    if len(sys.argv) > 1:
+        os.environ["TNEA_DATA"] = os.path.abspath(sys.argv[1])
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "tnea.sqlite")
+        for i, backend in enumerate(("pandas", "sqlite", "sqlite (ingested)")):
+            result = run(backend.split()[0], db_path, os.path.join(tmp, f"{i}.json"))
+            print(json.dumps({"backend": backend, **result}))
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["--child"]:
+        child(sys.argv[2])
+    else:
+        main()
@@ -0,0 +1,60 @@
+"""Memory report: compact (categorical / float32 / int16) frame vs plain object columns.
+
+    python benchmarks/bench_memory.py [csv_path]
+
+The "before" frame is the same cleaned data converted back to the dtypes the
+loader used to produce (object strings, float64 marks), so both sides hold
+exactly the same values.
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from cutoff import CATEGORY_COLUMNS, DF_FILE, read_clean_csv  # noqa: E402
+
+
+def legacy_dtypes(df):
+    df = df.copy()
+    for col in CATEGORY_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].astype(object)
+    df["AGGRMARK"] = df["AGGRMARK"].astype("float64")
+    df["YEAR"] = df["YEAR"].astype("int64")
+    df["ROUND"] = df["ROUND"].astype("int64")
+    return df
+
+
+def mb(nbytes):
+    return nbytes / 1024 / 1024
+
+
+def time_groupby(df, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        df.groupby(["DISTRICT", "BRANCHCODE", "COMMUNITY"], observed=True)["AGGRMARK"].mean()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    path = sys.argv[1] if len(sys.argv) > 1 else DF_FILE
+    compact = read_clean_csv(path)
+    before = legacy_dtypes(compact)
+
+    old_cols = before.memory_usage(deep=True, index=False)
+    new_cols = compact.memory_usage(deep=True, index=False)
+    print(f"rows: {len(compact)}")
+    print(f"{'column':<15}{'before MB':>12}{'after MB':>12}  dtype")
+    for col in compact.columns:
+        print(f"{col:<15}{mb(old_cols[col]):>12.2f}{mb(new_cols[col]):>12.2f}  {compact[col].dtype}")
+    print(f"{'TOTAL':<15}{mb(old_cols.sum()):>12.2f}{mb(new_cols.sum()):>12.2f}"
+          f"  ({old_cols.sum() / new_cols.sum():.1f}x smaller)")
+
+    t_old, t_new = time_groupby(before), time_groupby(compact)
+    print(f"groupby DISTRICT x BRANCHCODE x COMMUNITY: {t_old * 1000:.1f} ms -> {t_new * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""Old (replace NaN + to_dict + jsonify) vs serialize.dumps on frames of growing size.
+
+    python benchmarks/bench_serialize.py [csv_path]
+
+The frames are slices of the cleaned allotment rows (text, categorical,
+integer and float columns, some missing values), so both paths see the kind
+of data the endpoints return.
+"""
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from flask import Flask, jsonify  # noqa: E402
+
+from cutoff import DF_FILE, read_clean_csv  # noqa: E402
+from serialize import dumps, orjson  # noqa: E402
+
+app = Flask(__name__)
+
+
+def old_path(df):
+    with app.app_context():
+        return jsonify(df.replace({np.nan: None}).to_dict(orient="records")).get_data()
+
+
+def new_path(df, layout="records"):
+    return dumps(df, layout).encode()
+
+
+def measure(fn, *args, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        body = fn(*args)
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    fn(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return best, peak, len(body)
+
+
+def main():
+    path = sys.argv[1] if len(sys.argv) > 1 else DF_FILE
+    df = read_clean_csv(path)
+    print(f"orjson: {'yes' if orjson is not None else 'no'}")
+    print(f"{'rows':>9}  {'path':<16}{'ms':>10}{'peak MB':>10}{'KB':>10}")
+    for rows in (1_000, 10_000, 100_000, len(df)):
+        frame = df.head(rows)
+        results = {
+            "to_dict+jsonify": measure(old_path, frame),
+            "dumps records": measure(new_path, frame),
+            "dumps columns": measure(new_path, frame, "columns"),
+        }
+        for name, (seconds, peak, size) in results.items():
+            print(f"{len(frame):>9}  {name:<16}{seconds * 1000:>10.1f}{peak / 2**20:>10.1f}{size / 1024:>10.0f}")
+        old, new = results["to_dict+jsonify"][0], results["dumps records"][0]
+        print(f"{'':>9}  records speedup {old / new:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
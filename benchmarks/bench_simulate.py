@@ -0,0 +1,62 @@
+"""Seat-allocation simulator timings: one big scenario, then many on a process pool.
+
+    python benchmarks/bench_simulate.py [applicants] [scenarios]
+
+Loads the dataset the app would (TNEA_DATA) and builds the seat matrix of its
+latest year. It then times simulate() with `applicants` applicants (default
+200000), split into its phases. Last it times `scenarios` scenarios (default
+8, different seeds and mark shifts) run one after another and with
+run_scenarios() on one process per core, and checks both give the same
+allotments. Prints one JSON line per measurement.
+"""
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import simulate as sm  # noqa: E402
+from cutoff import load_seat_matrices  # noqa: E402
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, round(time.perf_counter() - start, 3)
+
+
+def main():
+    applicants = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    n_scenarios = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+
+    matrices, seconds = timed(load_seat_matrices)
+    year = max(matrices)
+    matrix = matrices[year]
+    print(json.dumps({"step": "seat_matrices", "seconds": seconds, "year": year,
+                      "buckets": len(matrix.seats), "programs": len(matrix.programs)}))
+
+    scenario = sm.parse_scenario({"applicants": str(applicants)}, [year])
+    rng = np.random.default_rng(scenario["seed"])
+    seats = sm.scaled_seats(matrix, scenario["seats"])
+    (marks, community), pool_seconds = timed(sm.applicant_pool, matrix, scenario, rng)
+    preferences, pref_seconds = timed(sm.preference_lists, matrix, marks, community, scenario["choices"], rng)
+    merit = np.empty(len(marks), dtype=np.int64)
+    merit[np.lexsort([rng.random(len(marks)), -marks])] = np.arange(len(marks))
+    (held, rounds), allot_seconds = timed(sm.allot, preferences, merit, seats)
+    print(json.dumps({"step": "simulate", "applicants": applicants, "choices": scenario["choices"],
+                      "pool_seconds": pool_seconds, "preferences_seconds": pref_seconds,
+                      "allot_seconds": allot_seconds, "rounds": rounds, "allotted": int((held >= 0).sum())}))
+
+    scenarios = [sm.parse_scenario({"applicants": str(applicants), "seed": str(i), "shift": str(i - n_scenarios // 2)},
+                                   [year]) for i in range(n_scenarios)]
+    serial, serial_seconds = timed(sm.run_scenarios, matrices, scenarios, 1)
+    pooled, pool_seconds = timed(sm.run_scenarios, matrices, scenarios)
+    same = all(a["rows"].equals(b["rows"]) for a, b in zip(serial, pooled))
+    print(json.dumps({"step": "scenarios", "scenarios": n_scenarios, "processes": os.cpu_count(),
+                      "serial_seconds": serial_seconds, "pool_seconds": pool_seconds, "same_results": same}))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""Percentile sketches: build time, memory, rollup latency and error against exact quantiles.
+
+    python benchmarks/bench_sketch.py [repeat]
+
+Loads the dataset the app would (TNEA_DATA) and builds the sketches. For a
+few rollups it then times run_percentiles() (best of `repeat`, default 5)
+and compares every percentile with np.quantile over the same rows. The
+error must stay within sketch.BIN_WIDTH / 2. Prints one JSON line per rollup
+and exits 1 if the bound is broken.
+"""
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import sketch  # noqa: E402
+from cube import mark_values  # noqa: E402
+from cutoff import load_data, load_sketches  # noqa: E402
+from regional import DISTRICT_ZONE, district_lookup  # noqa: E402
+
+ROLLUPS = [
+    {},
+    {"by": "year"},
+    {"by": "zone,year"},
+    {"by": "district", "community": "BC"},
+    {"by": "college_type,year", "branch": "CS,IT"},
+    {"by": "college,branch,community,year", "limit": str(sketch.MAX_LIMIT)},
+]
+
+
+def exact(rows, args, quantiles):
+    for param in ("community", "branch"):
+        if args.get(param):
+            col = sketch.DIMENSIONS[param]
+            rows = rows[rows[col].astype(str).isin(args[param].split(","))]
+    columns = [sketch.DIMENSIONS[b] for b in args.get("by", "").split(",") if b]
+    if not columns:
+        return pd.DataFrame({name: [rows["MARK"].quantile(q)] for name, q in quantiles.items()})
+    grouped = rows.groupby(columns, observed=True, sort=True)["MARK"]
+    return pd.DataFrame({name: grouped.quantile(q) for name, q in quantiles.items()}).reset_index()
+
+
+def main():
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    rows = load_data()
+    start = time.perf_counter()
+    sketches = load_sketches()
+    print(json.dumps({"step": "build", "seconds": round(time.perf_counter() - start, 3), "rows": len(rows),
+                      "groups": len(sketches.groups), "entries": len(sketches.count),
+                      "sketch_mb": round(sketches.nbytes() / 1e6, 2)}))
+
+    rows = rows.dropna(subset=sketch.SKETCH_KEYS + ["AGGRMARK"])
+    rows = rows.assign(MARK=mark_values(rows["AGGRMARK"]),
+                       ZONE=district_lookup(rows["DISTRICT"], DISTRICT_ZONE, "UNKNOWN"))
+    broken = False
+    for args in ROLLUPS:
+        best = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = sketch.run_percentiles(sketches, args)
+            best = min(best, time.perf_counter() - start)
+        expected = exact(rows, args, result["quantiles"]).iloc[:len(result["results"])]
+        error = max(float(np.abs(expected[name].to_numpy() - result["results"][name].to_numpy()).max())
+                    for name in result["quantiles"])
+        broken |= error > sketch.BIN_WIDTH / 2 + 1e-4
+        print(json.dumps({"step": "rollup", "args": args, "cells": result["total"],
+                          "ms": round(best * 1000, 2), "max_error": round(error, 4)}))
+    sys.exit(1 if broken else 0)
+
+
+if __name__ == "__main__":
+    main()
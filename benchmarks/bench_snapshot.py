@@ -0,0 +1,53 @@
+"""Compare cold-start cost of the CSV loader against the Feather snapshot.
+
+    python benchmarks/bench_snapshot.py [csv_path]
+
+Each loader runs in a fresh interpreter so the reported peak RSS is not
+polluted by the other one.
+"""
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = """
+import json, resource, sys, time
+sys.path.insert(0, {root!r})
+import cutoff, snapshot
+start = time.perf_counter()
+if {mode!r} == "csv":
+    df = cutoff.read_clean_csv({path!r})
+else:
+    df = snapshot.read_snapshot({path!r})
+    assert df is not None, "snapshot is missing or stale"
+    df["AGGRMARK"].sum()  # touch a column so the mmap is actually paged in
+elapsed = time.perf_counter() - start
+print(json.dumps({{"mode": {mode!r}, "rows": len(df), "seconds": round(elapsed, 4),
+                  "max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)}}))
+"""
+
+
+def run(mode, path):
+    out = subprocess.check_output([sys.executable, "-c", CHILD.format(root=ROOT, mode=mode, path=path)])
+    return json.loads(out)
+
+
+def main():
+    sys.path.insert(0, ROOT)
+    from cutoff import DF_FILE, read_clean_csv
+    from snapshot import snapshot_is_fresh, write_snapshot
+
+    path = sys.argv[1] if len(sys.argv) > 1 else DF_FILE
+    if not snapshot_is_fresh(path):
+        write_snapshot(read_clean_csv(path), path)
+
+    results = [run("csv", path), run("snapshot", path)]
+    for r in results:
+        print(f"{r['mode']:>9}: {r['seconds']:.3f}s  peak RSS {r['max_rss_mb']} MB  ({r['rows']} rows)")
+    print(f"speedup: {results[0]['seconds'] / max(results[1]['seconds'], 1e-9):.1f}x")
+
+
+if __name__ == "__main__":
+    main()
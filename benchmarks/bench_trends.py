@@ -0,0 +1,76 @@
+"""Micro-benchmark: row-wise DataFrame.apply trend labels vs trends.trend_metrics.
+
+    python benchmarks/bench_trends.py [rows]
+
+Uses a random college x branch sized pivot (with missing years) and checks
+that both implementations agree before timing them.
+"""
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from trends import trend_metrics  # noqa: E402
+
+YEARS = ["2023", "2024", "2025"]
+
+
+def legacy_trend(row):
+    # the per-row classifier build_insights used before trends.py
+    if pd.notna(row["2023"]) and pd.notna(row["2024"]) and pd.notna(row["2025"]):
+        if (row["2023"] < row["2024"]) and (row["2024"] < row["2025"]):
+            return "increasing"
+        if (row["2023"] > row["2024"]) and (row["2024"] > row["2025"]):
+            return "decreasing"
+    ni = row["2025"] - row["2023"]
+    if pd.notna(ni):
+        return "up" if ni > 0 else ("down" if ni < 0 else "flat")
+    return "flat"
+
+
+def legacy(pivot):
+    out = pd.DataFrame(index=pivot.index)
+    out["Net_Change"] = pivot["2025"] - pivot["2023"]
+    out["Volatility"] = pivot[YEARS].std(axis=1)
+    out["Trend"] = pivot.apply(legacy_trend, axis=1)
+    return out
+
+
+def make_pivot(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    values = rng.normal(150, 20, size=(rows, len(YEARS))).round(1)
+    values[rng.random(values.shape) < 0.1] = np.nan
+    return pd.DataFrame(values, columns=YEARS)
+
+
+def best_of(fn, repeat=5):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 30_000
+    pivot = make_pivot(rows)
+
+    old, new = legacy(pivot), trend_metrics(pivot, YEARS)
+    assert (old["Trend"] == new["Trend"]).all()
+    assert np.allclose(old["Net_Change"], new["Net_Change"], equal_nan=True)
+    assert np.allclose(old["Volatility"], new["Volatility"], equal_nan=True)
+
+    t_old = best_of(lambda: legacy(pivot), repeat=3)
+    t_new = best_of(lambda: trend_metrics(pivot, YEARS))
+    print(f"rows: {rows}")
+    print(f"apply(axis=1): {t_old * 1000:.1f} ms")
+    print(f"trend_metrics: {t_new * 1000:.2f} ms")
+    print(f"speedup: {t_old / t_new:.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""Startup time, memory and respawn cost of gunicorn workers with and without preloading.
+
+    python benchmarks/bench_workers.py [max_workers]
+
+For each mode (PRELOAD=1 / PRELOAD=0) and worker count, starts gunicorn with
+gunicorn.conf.py and reports how long until /healthz answers (pages are
+served) and until /readyz is 200 (data loaded). It then waits until every
+worker answers /data, and reports the
+summed PSS (proportional set size, so shared copy-on-write pages are split
+between the processes that map them) of the master plus workers. With one
+worker it also SIGKILLs the worker and times how long until /data answers
+again. Linux only (reads /proc/<pid>/smaps_rollup).
+"""
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def children(pid):
+    with open(f"/proc/{pid}/task/{pid}/children") as f:
+        return [int(p) for p in f.read().split()]
+
+
+def pss_mb(pid):
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            if line.startswith("Pss:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def wait_for(url, timeout=300):
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        try:
+            with urllib.request.urlopen(url, timeout=5) as r:
+                r.read()
+                return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"{url} did not answer within {timeout}s")
+
+
+def run(workers, preload):
+    port = free_port()
+    env = dict(os.environ, PORT=str(port), WEB_CONCURRENCY=str(workers), PRELOAD="1" if preload else "0")
+    start = time.perf_counter()
+    master = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "--log-level", "warning", "app:app"],
+        cwd=ROOT, env=env,
+    )
+    base = f"http://127.0.0.1:{port}"
+    url = f"{base}/data"
+    try:
+        wait_for(f"{base}/healthz")
+        healthz = time.perf_counter() - start
+        wait_for(f"{base}/readyz")
+        ready = time.perf_counter() - start
+        while len(children(master.pid)) < workers:
+            time.sleep(0.05)
+        # a few rounds of requests so every worker has served at least once
+        for _ in range(workers * 4):
+            wait_for(url)
+        boot = time.perf_counter() - start
+        pids = [master.pid] + children(master.pid)
+        result = {
+            "preload": preload,
+            "workers": workers,
+            "healthz_seconds": round(healthz, 2),
+            "ready_seconds": round(ready, 2),
+            "boot_seconds": round(boot, 2),
+            "pss_mb": round(sum(pss_mb(p) for p in pids), 1),
+        }
+        if workers == 1:
+            os.kill(children(master.pid)[0], signal.SIGKILL)
+            start = time.perf_counter()
+            time.sleep(0.01)
+            wait_for(url)
+            result["respawn_seconds"] = round(time.perf_counter() - start, 2)
+        return result
+    finally:
+        master.send_signal(signal.SIGTERM)
+        master.wait(timeout=30)
+
+
+def main():
+    max_workers = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    for preload in (False, True):
+        for workers in sorted({1, 2, max_workers}):
+            print(json.dumps(run(workers, preload)))
+
+
+if __name__ == "__main__":
+    main()
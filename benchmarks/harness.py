@@ -0,0 +1,227 @@
+"""Time and memory-profile the loaders and endpoints on synthetic data of growing size.
+
+    python benchmarks/harness.py run --sizes 10k,100k,1M --out report.json
+    python benchmarks/harness.py compare old.json new.json
+
+`run` generates (and keeps, in --workdir) one synthetic CSV per size, see
+synthetic.py, then measures each size in a fresh interpreter pointed at that
+CSV via TNEA_DATA. Every step is timed best-of --repeat, then run once more
+under tracemalloc for its peak Python/numpy allocation. Endpoints go through
+the Flask test client twice: "cold" with the response caches cleared, and
+"warm" served from them. The JSON report also records the git commit and
+library versions, and `compare` prints the per-step ratio between two reports.
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+ENDPOINTS = [
+    "/data",
+    "/cutoff-dashboard-data",
+    "/branch_data",
+    "/cutoff/regional-data",
+    "/cutoff/regional-map",
+    "/cutoff/query?year={year}&community=BC&branch=CS&limit=50",
+    "/cutoff/predict?mark=160&community=BC",
+    "/cutoff/export?format=ndjson&year={year}&limit=100000",
+]
+# regressions smaller than this are treated as noise by `compare`
+NOISE = 0.10
+
+
+def parse_size(text):
+    text = text.strip().lower()
+    scale = {"k": 1_000, "m": 1_000_000}.get(text[-1], 1)
+    return int(float(text.rstrip("km")) * scale)
+
+
+def measure(fn, repeat):
+    """Best wall time of `repeat` calls, plus the tracemalloc peak of one more call."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, {
+        "seconds": round(min(times), 5),
+        "mean_seconds": round(sum(times) / len(times), 5),
+        "peak_mb": round(peak / 2**20, 2),
+        "max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+def run_child(csv_path, out_path, repeat):
+    # runs inside the fresh interpreter; TNEA_DATA already points at csv_path
+    import cutoff
+    import snapshot
+    from cube import build_cube
+    from predict import CutoffIndex
+    from query import QueryIndex
+
+    steps = {}
+    # the big loaders are only worth one run on the largest inputs
+    load_repeat = 1 if os.path.getsize(csv_path) > 100 * 2**20 else repeat
+    snap_path = snapshot.snapshot_path_for(csv_path)
+    if os.path.exists(snap_path):
+        os.remove(snap_path)
+
+    df, steps["read_clean_csv"] = measure(lambda: cutoff.read_clean_csv(csv_path), load_repeat)
+    _, steps["write_snapshot"] = measure(lambda: snapshot.write_snapshot(df, csv_path), load_repeat)
+    _, steps["read_snapshot"] = measure(lambda: snapshot.read_snapshot(csv_path), load_repeat)
+    cube, steps["build_cube"] = measure(lambda: build_cube(df), load_repeat)
+    _, steps["build_insights"] = measure(lambda: cutoff.build_insights(cube), repeat)
+    _, steps["QueryIndex"] = measure(lambda: QueryIndex(df), load_repeat)
+    _, steps["CutoffIndex"] = measure(lambda: CutoffIndex(df), load_repeat)
+    rows, years = len(df), cutoff.available_years(cube)
+    del df, cube
+
+    start = time.perf_counter()
+    from app import app
+    from regional import map_cache
+    from response_cache import response_cache
+    steps["app_import"] = {"seconds": round(time.perf_counter() - start, 5)}
+    cutoff.preload()
+    client = app.test_client()
+
+    def fetch(url):
+        response = client.get(url)
+        response.get_data()  # drains streamed bodies too
+        if response.status_code != 200:
+            raise RuntimeError(f"{url} -> {response.status_code}")
+
+    def cold(url):
+        response_cache.clear()
+        map_cache.clear()
+        fetch(url)
+
+    for template in ENDPOINTS:
+        url = template.format(year=years[-1])
+        _, steps[f"GET {template} cold"] = measure(lambda: cold(url), repeat)
+        fetch(url)
+        _, steps[f"GET {template} warm"] = measure(lambda: fetch(url), repeat)
+
+    with open(out_path, "w") as f:
+        json.dump({"rows": rows, "years": years, "csv_mb": round(os.path.getsize(csv_path) / 2**20, 1),
+                   "steps": steps}, f)
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args):
+    from synthetic import generate, parse_years
+
+    os.makedirs(args.workdir, exist_ok=True)
+    years_dir = os.path.join(args.workdir, "no-extra-years")
+    os.makedirs(years_dir, exist_ok=True)
+    env = {k: v for k, v in os.environ.items() if k != "TNEA_YEARS"}
+    years = parse_years(args.years)
+
+    results = []
+    for size in args.sizes.split(","):
+        rows = parse_size(size)
+        csv_path = os.path.join(args.workdir, f"synthetic_{rows}_{years[0]}-{years[-1]}_s{args.seed}.csv")
+        if not os.path.exists(csv_path):
+            print(f"generating {rows} rows -> {csv_path}", file=sys.stderr)
+            generate(csv_path, rows, years, seed=args.seed)
+        out_path = csv_path + ".result.json"
+        print(f"measuring {rows} rows", file=sys.stderr)
+        subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "child", csv_path, out_path, "--repeat", str(args.repeat)],
+            cwd=ROOT, env=dict(env, TNEA_DATA=csv_path, TNEA_YEARS_DIR=years_dir),
+            stdout=subprocess.DEVNULL, check=True,
+        )
+        with open(out_path) as f:
+            results.append(json.load(f))
+
+    import numpy
+    import pandas
+    report = {
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "pandas": pandas.__version__,
+        "numpy": numpy.__version__,
+        "repeat": args.repeat,
+        "results": results,
+    }
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+    for result in results:
+        print(f"\n{result['rows']} rows ({result['csv_mb']} MB csv)")
+        for name, step in result["steps"].items():
+            peak = f"{step['peak_mb']:>9.1f} MB" if "peak_mb" in step else ""
+            print(f"  {name:<70}{step['seconds'] * 1000:>10.1f} ms{peak}")
+    print(f"\nreport written to {args.out}")
+
+
+def compare(args):
+    with open(args.old) as f:
+        old = {r["rows"]: r for r in json.load(f)["results"]}
+    with open(args.new) as f:
+        new = {r["rows"]: r for r in json.load(f)["results"]}
+    regressions = 0
+    for rows in sorted(set(old) & set(new)):
+        print(f"\n{rows} rows{'':<62}old ms     new ms   ratio")
+        for name, step in new[rows]["steps"].items():
+            before = old[rows]["steps"].get(name)
+            if before is None:
+                continue
+            ratio = step["seconds"] / before["seconds"] if before["seconds"] else float("inf")
+            flag = "  REGRESSION" if ratio > 1 + NOISE else ""
+            regressions += bool(flag)
+            print(f"  {name:<70}{before['seconds'] * 1000:>9.1f}{step['seconds'] * 1000:>11.1f}"
+                  f"{ratio:>8.2f}x{flag}")
+    return 1 if regressions else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("run")
+    p.add_argument("--sizes", default="10k,100k,1M", help="comma-separated, e.g. 10k,100k,1M,10M")
+    p.add_argument("--years", default="2022-2025")
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--repeat", type=int, default=3)
+    p.add_argument("--workdir", default=os.path.join(ROOT, "benchmarks", "data"))
+    p.add_argument("--out", default="benchmark-report.json")
+
+    p = sub.add_parser("compare")
+    p.add_argument("old")
+    p.add_argument("new")
+
+    p = sub.add_parser("child")
+    p.add_argument("csv_path")
+    p.add_argument("out_path")
+    p.add_argument("--repeat", type=int, default=3)
+
+    args = parser.parse_args()
+    if args.command == "run":
+        run(args)
+    elif args.command == "compare":
+        sys.exit(compare(args))
+    else:
+        run_child(args.csv_path, args.out_path, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
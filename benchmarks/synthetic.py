@@ -0,0 +1,158 @@
+"""Synthetic TNEA allotment CSVs for benchmarking (the real data is not in the repo).
+
+    python benchmarks/synthetic.py --rows 1000000 --years 2022-2025 -o /tmp/tnea_1m.csv
+
+Rows use the raw headers of data/Recent_Cleaned.csv ("APPLN NO", "COLLEGE
+CODE", "2023-2025 CLEANED.DISTRICT", ...) and roughly realistic shapes:
+- a few hundred colleges spread over all 38 districts, Chennai-heavy;
+- mostly self-financing colleges;
+- branch popularity skewed towards CS/EC/IT;
+- community shares close to the reservation split;
+- marks depending on college quality, branch and year;
+- earlier rounds for higher marks;
+- the same dirt the cleaner has to handle (missing marks, padded or
+  lower-case districts, alternative district spellings, abbreviated college
+  names, unmapped branch codes).
+
+Output is written in chunks, so 10M rows need no more memory than 500k.
+"""
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+COLUMNS = ["APPLN NO", "COMMUNITY", "COLLEGE CODE", "BRANCHCODE", "ALLOTTED CATEGORY", "ROUND", "YEAR",
+           "AGGRMARK", "2023-2025 CLEANED.NAME OF THE COLLEGES", "2023-2025 CLEANED.DISTRICT",
+           "2023-2025 CLEANED.TYPE OF COLLEGE"]
+
+# district -> relative number of colleges
+DISTRICTS = {
+    "CHENNAI": 40, "KANCHEEPURAM": 30, "THIRUVALLUR": 25, "CHENGALPATTU": 25, "COIMBATORE": 40,
+    "TIRUPPUR": 10, "ERODE": 15, "SALEM": 18, "NAMAKKAL": 16, "MADURAI": 18, "TIRUCHIRAPPALLI": 16,
+    "THANJAVUR": 10, "TIRUNELVELI": 14, "KANYAKUMARI": 14, "VELLORE": 10, "VILLUPURAM": 8,
+    "CUDDALORE": 6, "DINDIGUL": 8, "KARUR": 5, "KRISHNAGIRI": 6, "DHARMAPURI": 4,
+    "TIRUVANNAMALAI": 6, "VIRUDHUNAGAR": 8, "THOOTHUKUDI": 6, "PUDUKKOTTAI": 4, "SIVAGANGAI": 4,
+    "RAMANATHAPURAM": 3, "THENI": 4, "NAGAPATTINAM": 3, "THIRUVARUR": 3, "PERAMBALUR": 3,
+    "ARIYALUR": 2, "THE NILGIRIS": 2, "TENKASI": 3, "RANIPET": 4, "TIRUPATHUR": 3,
+    "KALLAKKURICHI": 2, "MAYILADUTHURAI": 2,
+}
+# spellings the cleaner sees in the wild, used for a small share of rows
+DISTRICT_VARIANTS = {
+    "NAGAPATTINAM": "NAGAPPATTINAM", "TIRUPPUR": "TIRUPUR", "THE NILGIRIS": "NILGIRIS",
+    "TIRUPATHUR": "THIRUPPATTUR",
+}
+COLLEGE_TYPES = {"Self Financing": 0.82, "Aided": 0.10, "Government": 0.08}
+# branch -> (relative seats, mark offset)
+BRANCHES = {
+    "CS": (20, 8), "EC": (14, 5), "IT": (9, 5), "AD": (8, 6), "EE": (8, 0), "ME": (9, -8),
+    "CE": (6, -9), "AL": (4, 6), "CZ": (2, 4), "BT": (2, -2), "BS": (1, -3), "CH": (1, -4),
+    "AU": (1, -7), "AE": (1, -2), "MT": (1, -6), "IB": (1, -3), "TX": (0.5, -10), "XM": (0.5, -5),
+}
+# community -> share of students; most students compete in OC first
+COMMUNITIES = {"BC": 0.33, "MBC": 0.22, "SC": 0.15, "OC": 0.17, "BCM": 0.05, "SCA": 0.05, "ST": 0.03}
+CHUNK_ROWS = 500_000
+
+
+def parse_years(text):
+    # "2022-2025" or "2023,2025"
+    if "-" in text:
+        start, end = (int(y) for y in text.split("-"))
+        return list(range(start, end + 1))
+    return [int(y) for y in text.split(",") if y.strip()]
+
+
+def make_colleges(rng, n_colleges):
+    names = list(DISTRICTS)
+    weights = np.array(list(DISTRICTS.values()), dtype=float)
+    district = rng.choice(names, n_colleges, p=weights / weights.sum())
+    ctype = rng.choice(list(COLLEGE_TYPES), n_colleges, p=list(COLLEGE_TYPES.values()))
+    quality = rng.normal(0, 10, n_colleges) + np.where(ctype == "Government", 12, 0)
+    codes = np.array([f"{c:04d}" for c in rng.choice(np.arange(1, 9999), n_colleges, replace=False)])
+    prefix = np.where(ctype == "Government", "Government College of Engineering",
+                      np.where(ctype == "Aided", "Aided College of Engineering", "College of Engineering"))
+    names = [f"{p} {c}, {d.title()}" for p, c, d in zip(prefix, codes, district)]
+    return pd.DataFrame({
+        "code": codes,
+        "name": names,
+        # how some years' files spell the same college
+        "short_name": [n.replace("Government", "Govt.").replace("Engineering", "Engg.") for n in names],
+        "district": district,
+        "type": ctype,
+        "quality": quality,
+        # popular colleges fill more seats
+        "weight": np.exp(quality / 15),
+    })
+
+
+def make_chunk(rng, n, colleges, years):
+    college = rng.choice(len(colleges), n, p=(colleges["weight"] / colleges["weight"].sum()).to_numpy())
+    branch_codes = list(BRANCHES)
+    branch_weights = np.array([w for w, _ in BRANCHES.values()])
+    branch = rng.choice(len(branch_codes), n, p=branch_weights / branch_weights.sum())
+    year = rng.choice(years, n)
+    community = rng.choice(list(COMMUNITIES), n, p=list(COMMUNITIES.values()))
+
+    drift = {y: 1.5 * (y - years[0]) + rng.normal(0, 1) for y in years}
+    mark = (140 + colleges["quality"].to_numpy()[college]
+            + np.array([o for _, o in BRANCHES.values()])[branch]
+            + np.vectorize(drift.get)(year)
+            + rng.normal(0, 16, n))
+    mark = np.round(np.clip(mark, 77.5, 200), 2)
+
+    # higher marks are allotted in earlier rounds
+    rounds = 1 + (mark < rng.normal(165, 12, n)) + (mark < rng.normal(135, 12, n))
+    # high scorers take open-competition seats, the rest their community quota
+    open_seat = (community == "OC") | (mark > rng.normal(178, 6, n))
+    allotted = np.where(open_seat, "OC", np.where((community == "SCA") & (rng.random(n) < 0.4), "SC", community))
+
+    district = colleges["district"].to_numpy()[college].astype(object)
+    dirty = rng.random(n)
+    district = np.where(dirty < 0.01, [f" {d.lower()} " for d in district], district)
+    variant = np.vectorize(lambda d: DISTRICT_VARIANTS.get(d, d))(district)
+    district = np.where((dirty >= 0.01) & (dirty < 0.05), variant, district)
+    name = np.where((dirty >= 0.05) & (dirty < 0.07), colleges["short_name"].to_numpy()[college],
+                    colleges["name"].to_numpy()[college])
+    mark = np.where(rng.random(n) < 0.01, np.nan, mark)
+
+    return pd.DataFrame(dict(zip(COLUMNS, [
+        rng.integers(100_000, 999_999, n),
+        community,
+        colleges["code"].to_numpy()[college],
+        np.array(branch_codes)[branch],
+        allotted,
+        rounds,
+        year,
+        mark,
+        name,
+        district,
+        colleges["type"].to_numpy()[college],
+    ])))
+
+
+def generate(path, rows, years, seed=0, n_colleges=450):
+    """Write `rows` synthetic allotment rows to `path`; returns path."""
+    rng = np.random.default_rng(seed)
+    colleges = make_colleges(rng, n_colleges)
+    tmp_path = path + ".tmp"
+    for start in range(0, rows, CHUNK_ROWS):
+        chunk = make_chunk(rng, min(CHUNK_ROWS, rows - start), colleges, years)
+        chunk.to_csv(tmp_path, mode="w" if start == 0 else "a", header=(start == 0), index=False)
+    os.replace(tmp_path, path)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--years", default="2022-2025", help='"2022-2025" or "2023,2025"')
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--colleges", type=int, default=450)
+    parser.add_argument("-o", "--output", required=True)
+    args = parser.parse_args()
+    generate(args.output, args.rows, parse_years(args.years), args.seed, args.colleges)
+    print(f"wrote {args.output} ({args.rows} rows)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,28 @@
-from flask import Blueprint, jsonify
-import pandas as pd
+from flask import Blueprint
 import numpy as np
+from metrics import span
+from response_cache import cached_response
+from serialize import json_response
+from trends import pair_label, year_pairs
 
 branch_bp = Blueprint("branch", __name__)
 
 @branch_bp.route("/branch_data")
+@cached_response
 def branch_popularity():
-    from cutoff import load_data
-    df = load_data()
-
-    # Pivot data: branches vs year
-    branch_counts = df.groupby(['BRANCHCODE','YEAR'])['STUDENTID'].count().unstack(fill_value=0)
-
-    branch_counts['new_branch'] = (branch_counts[2023] == 0) & (branch_counts[2025] > 0)
+    from cutoff import available_years, load_cube
+    from cube import rollup
+    cube = load_cube()
+    years = available_years(cube)
+
+    # Pivot data: branches vs year (allotments per branch, from the aggregate cube)
+    branch_counts = (rollup(cube, ['BRANCHCODE','YEAR'])
+                     .set_index(['BRANCHCODE','YEAR'])['count']
+                     .unstack(fill_value=0)
+                     .reindex(columns=years, fill_value=0))
+
+    # Mark new branches (no students in the first year but students in the last)
+    branch_counts['new_branch'] = (branch_counts[years[0]] == 0) & (branch_counts[years[-1]] > 0)
     new_branches = branch_counts[branch_counts['new_branch']].index.astype(str).tolist()
 
 
@@ -23,61 +33,46 @@ def branch_popularity():
     # Filter out small branches (total < 100 across all years)
     branch_counts = branch_counts[branch_counts.sum(axis=1) >= 180]
 
-    # --- Growth calculations ---
-    # Absolute growth
-    branch_counts['growth_23_24'] = branch_counts.get('2024',0) - branch_counts.get('2023',0)
-    branch_counts['growth_24_25'] = branch_counts.get('2025',0) - branch_counts.get('2024',0)
-    branch_counts['growth_23_25'] = branch_counts.get('2025',0) - branch_counts.get('2023',0)
-
-    # Percent growth
-    branch_counts['growth_percent_23_24'] = np.nan
-    branch_counts['growth_percent_24_25'] = np.nan
-    branch_counts['growth_percent_23_25'] = np.nan
-
-    # Avoid divide by zero
-    mask_23 = branch_counts.get('2023',0) > 0
-    mask_24 = branch_counts.get('2024',0) > 0
+    # --- Growth calculations (consecutive years and first -> last) ---
+    for start, end in year_pairs(years):
+        label = pair_label(start, end)
+        start, end = str(start), str(end)
 
-    branch_counts.loc[mask_23, 'growth_percent_23_24'] = (
-        branch_counts.loc[mask_23,'growth_23_24'] / branch_counts.loc[mask_23,'2023'] * 100
-    ).round(1)
+        # Absolute growth
+        branch_counts[f'growth_{label}'] = branch_counts[end] - branch_counts[start]
 
-    branch_counts.loc[mask_24, 'growth_percent_24_25'] = (
-        branch_counts.loc[mask_24,'growth_24_25'] / branch_counts.loc[mask_24,'2024'] * 100
-    ).round(1)
+        # Percent growth (avoid divide by zero)
+        branch_counts[f'growth_percent_{label}'] = np.nan
+        mask = branch_counts[start] > 0
+        branch_counts.loc[mask, f'growth_percent_{label}'] = (
+            branch_counts.loc[mask, f'growth_{label}'] / branch_counts.loc[mask, start] * 100
+        ).round(1)
 
-    branch_counts.loc[mask_23, 'growth_percent_23_25'] = (
-        branch_counts.loc[mask_23,'growth_23_25'] / branch_counts.loc[mask_23,'2023'] * 100
-    ).round(1)
-
-    # Mark new branches (no students in 2023 but students in 2025)
+    overall = pair_label(years[0], years[-1])
 
     # Categorize branches
     
-    increasing_branches = branch_counts[branch_counts['growth_23_25'] > 0].index.astype(str).tolist()
-    decreasing_branches = branch_counts[branch_counts['growth_23_25'] < 0].index.astype(str).tolist()
+    increasing_branches = branch_counts[branch_counts[f'growth_{overall}'] > 0].index.astype(str).tolist()
+    decreasing_branches = branch_counts[branch_counts[f'growth_{overall}'] < 0].index.astype(str).tolist()
 
-    # Top growing & declining based on 2023→2025 percent
-    top_growing = (branch_counts.dropna(subset=['growth_percent_23_25'])
-                   .sort_values('growth_percent_23_25', ascending=False)
+    # Top growing & declining based on first -> last year percent
+    top_growing = (branch_counts.dropna(subset=[f'growth_percent_{overall}'])
+                   .sort_values(f'growth_percent_{overall}', ascending=False)
                    .head(8).index.astype(str).tolist())
 
-    top_declining = (branch_counts.dropna(subset=['growth_percent_23_25'])
-                     .sort_values('growth_percent_23_25')
+    top_declining = (branch_counts.dropna(subset=[f'growth_percent_{overall}'])
+                     .sort_values(f'growth_percent_{overall}')
                      .head(8).index.astype(str).tolist())
 
-    # Convert to dict for JSON
-    records = branch_counts.reset_index().to_dict(orient='records')
-
-    safe_df = branch_counts.replace([np.nan, np.inf, -np.inf], None)
-
-    result = {
-        "branches": safe_df.reset_index().to_dict(orient='records'),
-        "new_branches": new_branches,
-        "increasing_branches": increasing_branches,
-        "decreasing_branches": decreasing_branches,
-        "top_growing": top_growing,
-        "top_declining": top_declining
-    }
-
-    return jsonify(result)
+    # NaN / inf -> null happens in the encoder (serialize.py)
+    with span("serialize"):
+        result = {
+            "branches": branch_counts.reset_index(),
+            "new_branches": new_branches,
+            "increasing_branches": increasing_branches,
+            "decreasing_branches": decreasing_branches,
+            "top_growing": top_growing,
+            "top_declining": top_declining
+        }
+
+        return json_response(result)
@@ -0,0 +1,359 @@
+"""Canonical district and college names, resolved once per distinct spelling at ingestion.
+
+The CSVs spell one district several ways ("NAGAPPATTINAM", "TIRUPUR", "THE
+NILGIRIS") and one college differently across years ("Govt. College of Engg.,
+Salem" / "Government College of Engineering, Salem"). Grouped on the raw text,
+one district or college becomes several groups, and a district spelling
+regional.DISTRICT_ZONE does not list silently falls to "UNKNOWN".
+
+canonicalise() replaces DISTRICT and COLLENAME with one canonical name per
+district / college. The columns stay categorical, so groupbys run on their
+integer codes. Each distinct raw name is resolved once, never per row:
+1. a cached alias is used as is;
+2. otherwise its folded key (districts.district_key / college_key) is looked up;
+3. otherwise AliasIndex looks for a canonical name within a few edits. The
+   candidates come from a trigram index (n-gram blocking), so a name is only
+   compared with the canonical names sharing enough trigrams with it, never
+   with all of them.
+
+Districts are matched against the names regional.DISTRICT_ZONE and
+URBAN_RURAL know. A district matching none of them keeps its own name and is
+reported as unresolved. Colleges have no reference list: the first spelling
+seen (the most frequent one in its file) becomes the canonical name. A near
+match is only accepted when both share a college code and the same digits, so
+"College 0103" never swallows "College 0104". A name that starts a new college
+although its code already has one (a rename, or a typo too big to match) is
+reported too.
+
+The aliases are cached in a JSON file next to the CSV (TNEA_ALIASES), so
+ingesting a new year only resolves the names that year adds. The year files
+of a dataset share its main CSV's cache (cutoff.dataset_alias_path). Aliases are
+only ever added, never changed, so every file read with the same cache agrees
+on the names.
+
+    python canonical.py report [csv_path]   # alias counts and unresolved names
+"""
+import contextlib
+import json
+import os
+import re
+import sys
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+
+from districts import district_key
+
+try:
+    import fcntl
+except ImportError:  # no file locking on Windows; concurrent ingests may then drop new aliases
+    fcntl = None
+
+ALIAS_SUFFIX = ".aliases.json"
+# bump when keys or matching change, so cached aliases are resolved again
+ALIAS_FORMAT = 1
+CANONICAL_COLUMNS = ["DISTRICT", "COLLENAME"]
+Q = 3
+# a near match may differ in at most this share of the key's characters (at least one)
+MAX_EDIT_RATIO = {"DISTRICT": 0.2, "COLLENAME": 0.15}
+# near-match candidates checked per name, most shared trigrams first
+CANDIDATES = 20
+# suggestions listed for an unresolved district
+SUGGESTIONS = 3
+ABBREVIATIONS = {
+    "ENGG": "ENGINEERING", "ENGINEERIN": "ENGINEERING", "COLL": "COLLEGE", "CLG": "COLLEGE",
+    "GOVT": "GOVERNMENT", "INST": "INSTITUTE", "TECH": "TECHNOLOGY", "UNIV": "UNIVERSITY",
+}
+
+
+def college_key(name):
+    """Loose key: upper case words, '&' -> AND, common abbreviations spelled out."""
+    if name is None or name != name:
+        return None
+    text = str(name).upper().replace("&", " AND ")
+    words = [ABBREVIATIONS.get(w, w) for w in re.split(r"[^A-Z0-9]+", text) if w and w != "THE"]
+    return " ".join(words) or None
+
+
+KEYS = {"DISTRICT": district_key, "COLLENAME": college_key}
+
+
+def alias_path_for(csv_path):
+    return os.environ.get("TNEA_ALIASES") or os.path.splitext(csv_path)[0] + ALIAS_SUFFIX
+
+
+def edit_distance(a, b, limit):
+    """Levenshtein distance of a and b, or limit + 1 as soon as it must exceed limit."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    if len(a) > len(b):
+        a, b = b, a
+    over = limit + 1
+    # only the cells within `limit` of the diagonal can stay within limit
+    previous = [j if j <= limit else over for j in range(len(a) + 1)]
+    for i, cb in enumerate(b, 1):
+        lo, hi = max(1, i - limit), min(len(a), i + limit)
+        current = [over] * (len(a) + 1)
+        if i <= limit:
+            current[0] = i
+        for j in range(lo, hi + 1):
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (a[j - 1] != cb))
+        if min(current[lo - 1:hi + 1]) > limit:
+            return over
+        previous = current
+    return min(previous[-1], over)
+
+
+def _grams(key):
+    padded = "#" * (Q - 1) + key + "#" * (Q - 1)
+    return {padded[i:i + Q] for i in range(len(padded) - Q + 1)}
+
+
+def _digits(key):
+    return re.sub(r"\D", "", key)
+
+
+class AliasIndex:
+    """Canonical names, by folded key and by trigram for near matches."""
+
+    def __init__(self, key, max_ratio):
+        self.key = key
+        self.max_ratio = max_ratio
+        self.names = []
+        self.keys = []
+        self.grams = []
+        self.digits = []
+        self.codes = []        # college codes seen per canonical name
+        self.by_name = {}
+        self.by_key = {}
+        self.by_code = defaultdict(set)     # college code -> canonical ids
+        self.postings = defaultdict(list)   # trigram -> canonical ids
+
+    def add(self, name, codes=()):
+        """Id of canonical `name`, adding it first if it is new."""
+        i = self.by_name.get(name)
+        if i is None:
+            i = len(self.names)
+            key = self.key(name) or ""
+            self.names.append(name)
+            self.keys.append(key)
+            self.grams.append(_grams(key))
+            self.digits.append(_digits(key))
+            self.codes.append(set())
+            self.by_name[name] = i
+            self.by_key.setdefault(key, i)
+            for gram in self.grams[i]:
+                self.postings[gram].append(i)
+        for code in codes:
+            self.codes[i].add(code)
+            self.by_code[code].add(i)
+        return i
+
+    def limit(self, key):
+        return max(1, int(self.max_ratio * len(key)))
+
+    def candidates(self, key, codes=()):
+        """(canonical id, shared trigrams) of the names `key` may be a near match of, most shared first.
+
+        Names with other digits, or whose college codes are all different from
+        `codes`, are left out.
+        """
+        grams, digits = _grams(key), _digits(key)
+        # prefix filter: a name within limit edits shares all but limit * Q of the
+        # key's trigrams, so it has one of any limit * Q + 1 of them. Taking the
+        # rarest ones skips the long posting lists of "COL", "LEG", "ENG", ...
+        rarest = sorted(grams, key=lambda gram: (len(self.postings.get(gram, ())), gram))
+        ids = {i for gram in rarest[:self.limit(key) * Q + 1] for i in self.postings.get(gram, ())
+               if self.digits[i] == digits and not (codes and self.codes[i] and self.codes[i].isdisjoint(codes))}
+        shared = sorted(((i, len(grams & self.grams[i])) for i in ids), key=lambda c: (-c[1], c[0]))
+        return shared[:CANDIDATES]
+
+    def match(self, name, codes=()):
+        """Id of the canonical name `name` folds to or nearly matches, or None."""
+        key = self.key(name)
+        if key is None:
+            return None
+        if key in self.by_key:
+            return self.by_key[key]
+        limit = self.limit(key)
+        # q-gram lemma: one edit changes at most Q of the key's trigrams, so a
+        # name within `limit` edits shares at least this many
+        needed = len(_grams(key)) - limit * Q
+        best, best_distance = None, limit + 1
+        for i, shared in self.candidates(key, codes):
+            if shared < needed:
+                break
+            distance = edit_distance(key, self.keys[i], limit)
+            if distance < best_distance:
+                best, best_distance = i, distance
+        return best
+
+
+def _reference_districts():
+    from regional import DISTRICT_ZONE, URBAN_RURAL
+    from districts import DistrictIndex
+    return list(dict.fromkeys(DistrictIndex(DISTRICT_ZONE, URBAN_RURAL).canonical_by_key.values()))
+
+
+class Canonicalizer:
+    """Resolves the raw names of one column, keeping its part of the alias cache up to date."""
+
+    def __init__(self, column, state):
+        self.index = AliasIndex(KEYS[column], MAX_EDIT_RATIO[column])
+        # districts resolve to the known names only; colleges learn theirs from the data
+        self.learn = column != "DISTRICT"
+        if not self.learn:
+            for name in _reference_districts():
+                self.index.add(name)
+        self.aliases = state.get("aliases", {})
+        self.unresolved = state.get("unresolved", {})
+        codes = state.get("codes", {})
+        for name in self.aliases.values():
+            self.index.add(name, codes.get(name, ()))
+        self.changed = False
+
+    def resolve(self, raw, codes=()):
+        """Canonical name for the raw name `raw` (seen with college `codes`)."""
+        codes = set(codes)
+        if raw in self.aliases:
+            canonical = self.aliases[raw]
+        else:
+            canonical = self._match(raw, codes)
+            if canonical is None:
+                return raw
+            self.aliases[raw] = canonical
+            self.changed = True
+        i = self.index.add(canonical)
+        if not codes <= self.index.codes[i]:
+            self.index.codes[i] |= codes
+            self.changed = True
+        return canonical
+
+    def _match(self, raw, codes):
+        i = self.index.match(raw, codes)
+        if i is not None:
+            self.unresolved.pop(raw, None)
+            return self.index.names[i]
+        if self.learn:
+            # a new college; suspicious if its code already belongs to another name
+            taken = sorted({self.index.names[i] for code in codes for i in self.index.by_code.get(code, ())})
+            if taken:
+                self.unresolved[raw] = taken
+            return raw
+        # unknown district: kept as it is and tried again next time, the known names may have grown
+        suggestions = [self.index.names[j] for j, _ in self.index.candidates(self.index.key(raw) or "")[:SUGGESTIONS]]
+        if self.unresolved.get(raw) != suggestions:
+            self.unresolved[raw] = suggestions
+            self.changed = True
+        return None
+
+    def state(self):
+        state = {"aliases": self.aliases, "unresolved": self.unresolved}
+        if self.learn:
+            state["codes"] = {name: sorted(codes) for name, codes in zip(self.index.names, self.index.codes) if codes}
+        return state
+
+
+def _load(alias_path):
+    try:
+        with open(alias_path) as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return state if state.get("format") == ALIAS_FORMAT else {}
+
+
+def _save(alias_path, state):
+    # written next to the target and renamed, so readers never see half a file
+    tmp_path = alias_path + ".tmp"
+    try:
+        with open(tmp_path, "w") as f:
+            json.dump(state, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, alias_path)
+    except OSError:
+        pass   # read-only data directory: everything still resolves, just again next time
+
+
+@contextlib.contextmanager
+def _locked(alias_path):
+    # one ingest at a time reads, extends and writes the cache
+    if fcntl is None:
+        yield
+        return
+    try:
+        lock = open(alias_path + ".lock", "a")
+    except OSError:
+        yield
+        return
+    with lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        yield
+
+
+def _column_codes(df, codes, n):
+    # college codes seen with each distinct name, as strings
+    if "COLLEGECODE" not in df.columns:
+        return [() for _ in range(n)]
+    pairs = pd.DataFrame({"name": codes, "code": df["COLLEGECODE"].to_numpy()}).dropna().drop_duplicates()
+    pairs = pairs[pairs["name"] >= 0]
+    by_name = [set() for _ in range(n)]
+    for name, code in zip(pairs["name"], pairs["code"]):
+        # 5.0 when the column has gaps; the same college as 5
+        by_name[name].add(str(int(code) if isinstance(code, float) and code.is_integer() else code))
+    return by_name
+
+
+def canonicalise(df, alias_path=None):
+    """`df` with DISTRICT and COLLENAME replaced by their canonical names (categorical)."""
+    columns = [c for c in CANONICAL_COLUMNS if c in df.columns]
+    if not columns:
+        return df
+    with _locked(alias_path) if alias_path else contextlib.nullcontext():
+        state = _load(alias_path) if alias_path else {}
+        changed = False
+        for col in columns:
+            codes, uniques = pd.factorize(df[col])
+            uniques = [str(u).strip() for u in uniques]
+            canonicalizer = Canonicalizer(col, state.get(col, {}))
+            college_codes = _column_codes(df, codes, len(uniques)) if canonicalizer.learn else [()] * len(uniques)
+            # most frequent spelling first, so it becomes a new college's canonical name
+            counts = np.bincount(codes[codes >= 0], minlength=len(uniques))
+            resolved = [None] * len(uniques)
+            for i in np.argsort(-counts, kind="stable"):
+                resolved[i] = canonicalizer.resolve(uniques[i], college_codes[i])
+            categories = pd.Index(sorted(set(resolved)))
+            # the trailing -1 keeps missing values (code -1) missing
+            mapped = np.append(categories.get_indexer(resolved), -1)
+            df[col] = pd.Categorical.from_codes(mapped[codes], categories)
+            state[col] = canonicalizer.state()
+            changed |= canonicalizer.changed
+        if alias_path and changed:
+            state["format"] = ALIAS_FORMAT
+            _save(alias_path, state)
+    return df
+
+
+def report(alias_path):
+    """Alias counts and unresolved names per column, from the cache at `alias_path`."""
+    state = _load(alias_path)
+    out = {"path": alias_path}
+    for col in CANONICAL_COLUMNS:
+        part = state.get(col, {})
+        aliases = part.get("aliases", {})
+        out[col] = {
+            "spellings": len(aliases),
+            "canonical": len(set(aliases.values())),
+            "renamed": sum(raw != canonical for raw, canonical in aliases.items()),
+            # name -> known names it may be (districts) or names already holding its code (colleges)
+            "unresolved": part.get("unresolved", {}),
+        }
+    return out
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "report":
+        print("usage: python canonical.py report [csv_path]")
+        sys.exit(1)
+    from cutoff import DF_FILE
+    print(json.dumps(report(alias_path_for(sys.argv[2] if len(sys.argv) > 2 else DF_FILE)), indent=1))
@@ -0,0 +1,95 @@
+"""Pre-aggregated AGGRMARK statistics for every combination of the key columns.
+
+The cube is built once per dataset version (see cutoff.load_cube) and every
+dashboard endpoint answers from rollup() instead of grouping the row-level
+frame again. Because count/sum/sumsq/min/max are all additive, any subset of
+the keys gives exact means and standard deviations.
+"""
+import numpy as np
+import pandas as pd
+
+# COLLENAME is functionally dependent on COLLEGECODE (up to spelling variants),
+# so keeping it as a key costs almost nothing and lets build_insights group by name
+CUBE_KEYS = ["YEAR", "ROUND", "COLLEGECODE", "COLLENAME", "BRANCHCODE",
+             "COMMUNITY", "DISTRICT", "COLLEGETYPE"]
+MEASURES = ["count", "sum", "sumsq", "min", "max"]
+# AGGRMARK is held as float32; marks have at most a few decimals, so rounding
+# the float64 upcast to this many places gives back the value from the CSV
+MARK_DECIMALS = 4
+# TNEA aggregate marks are out of 200
+MAX_MARK = 200.0
+
+
+def mark_values(marks):
+    """AGGRMARK as exact float64 (undoes float32 noise like 115.2399978)."""
+    return np.round(np.asarray(marks, dtype="float64"), MARK_DECIMALS)
+
+
+def build_cube(df: pd.DataFrame) -> pd.DataFrame:
+    keys = [k for k in CUBE_KEYS if k in df.columns]
+    marks = pd.Series(mark_values(df["AGGRMARK"]), index=df.index)
+    cube = (
+        df[keys]
+          .assign(_mark=marks, _sq=marks * marks)
+          .groupby(keys, observed=True, dropna=False, sort=False)
+          .agg(count=("_mark", "size"), sum=("_mark", "sum"), sumsq=("_sq", "sum"),
+               min=("_mark", "min"), max=("_mark", "max"))
+          .reset_index()
+    )
+    return cube
+
+
+def align_categories(frames, columns):
+    """Give categorical `columns` the same (sorted) categories in every frame,
+    so pd.concat keeps them categorical instead of falling back to object."""
+    frames = list(frames)
+    for col in columns:
+        if not all(col in f.columns and isinstance(f[col].dtype, pd.CategoricalDtype) for f in frames):
+            continue
+        cats = frames[0][col].cat.categories
+        for f in frames[1:]:
+            cats = cats.union(f[col].cat.categories)
+        frames = [f.assign(**{col: f[col].cat.set_categories(cats)}) for f in frames]
+    return frames
+
+
+def merge_cube(cube: pd.DataFrame, new_rows: pd.DataFrame) -> pd.DataFrame:
+    """Fold freshly appended allotment rows into an existing cube.
+
+    Only the new rows are aggregated; the old cube is combined cell by cell,
+    so earlier years are never rescanned.
+    """
+    return combine_cubes(cube, build_cube(new_rows))
+
+
+def combine_cubes(cube: pd.DataFrame, other: pd.DataFrame) -> pd.DataFrame:
+    """One cube holding the cells of both (cells with the same keys are merged)."""
+    keys = [k for k in CUBE_KEYS if k in cube.columns]
+    parts = align_categories([cube, other], keys)
+    return (
+        pd.concat(parts, ignore_index=True)
+          .groupby(keys, observed=True, dropna=False, sort=False)
+          .agg(count=("count", "sum"), sum=("sum", "sum"), sumsq=("sumsq", "sum"),
+               min=("min", "min"), max=("max", "max"))
+          .reset_index()
+    )
+
+
+def rollup(cube: pd.DataFrame, keys) -> pd.DataFrame:
+    """Collapse the cube onto `keys` and add mean / std (ddof=1) columns.
+
+    Rows with a missing key are dropped, like a plain df.groupby(keys) would.
+    """
+    keys = list(keys)
+    grouped = cube.groupby(keys, observed=True)
+    out = grouped[["count", "sum", "sumsq"]].sum()
+    out["min"] = grouped["min"].min()
+    out["max"] = grouped["max"].max()
+    out = out.reset_index()
+
+    n = out["count"].to_numpy(dtype="float64")
+    out["mean"] = out["sum"] / n
+    with np.errstate(divide="ignore", invalid="ignore"):
+        var = (out["sumsq"].to_numpy() - out["sum"].to_numpy() ** 2 / n) / (n - 1)
+    out["std"] = np.where(n > 1, np.sqrt(np.clip(var, 0, None)), np.nan)
+    return out
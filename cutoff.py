@@ -1,10 +1,23 @@
-from flask import Blueprint, jsonify,render_template
+from flask import Blueprint, Response, jsonify,render_template, request
+import os
 import pandas as pd
-import numpy as np
+from datastore import DatasetCache
+from metrics import span
+from response_cache import cached_response
+from serialize import json_response
+from cube import align_categories, build_cube, combine_cubes, merge_cube, rollup
+from trends import trend_metrics
 
 cutoff_bp = Blueprint("cutoff", __name__)
 
-DF_FILE = "data/Recent_Cleaned.csv"
+# TNEA_DATA / TNEA_YEARS_DIR point the app at another dataset (e.g. the synthetic
+# ones in benchmarks/)
+DF_FILE = os.environ.get("TNEA_DATA", "data/Recent_Cleaned.csv")
+# every *.csv dropped in here (e.g. one file per new counselling year) is
+# appended to DF_FILE incrementally, without recomputing earlier years
+YEARS_DIR = os.environ.get("TNEA_YEARS_DIR", "data/years")
+# optional whitelist like TNEA_YEARS=2023,2024,2025; by default every year in the data is used
+YEAR_FILTER = [int(y) for y in os.environ.get("TNEA_YEARS", "").split(",") if y.strip()]
 
 def clean_column(col: str) -> str:
     return (col.replace("\n", "")
@@ -83,8 +96,17 @@ def add_branch_names(df):
     df["BranchName"] = df["BRANCHCODE"].map(BRANCH_CODE_MAP).fillna(df["BRANCHCODE"])
     return df
 
-def load_data():
-    df = pd.read_csv(DF_FILE)
+def dataset_alias_path(path):
+    # DF_FILE and the year files appended to it share DF_FILE's alias cache, so
+    # they agree on every name; any other CSV gets its own next to it
+    from canonical import alias_path_for
+    in_years_dir = os.path.abspath(os.path.dirname(path)) == os.path.abspath(YEARS_DIR)
+    if in_years_dir or os.path.abspath(path) == os.path.abspath(DF_FILE):
+        return alias_path_for(DF_FILE)
+    return alias_path_for(path)
+
+def read_clean_csv(path=DF_FILE, alias_path=None):
+    df = pd.read_csv(path)
     df = add_branch_names(df)
     df.columns = [clean_column(c) for c in df.columns]
 
@@ -102,35 +124,277 @@ def load_data():
         '2023-2025 CLEANED.TYPE OF COLLEGE': 'COLLEGETYPE'
     }, inplace=True)
 
-    # Ensure numeric + limit to 2023–2025 if present
+    # Ensure numeric (the YEAR_FILTER whitelist is applied in load_clean)
     if 'AGGRMARK' in df.columns:
         df['AGGRMARK'] = pd.to_numeric(df['AGGRMARK'], errors='coerce')
     df = df.dropna(subset=['AGGRMARK'])
     if 'YEAR' in df.columns:
         df['YEAR'] = pd.to_numeric(df['YEAR'], errors='coerce')
-        df = df[df['YEAR'].isin([2023, 2024, 2025])]
+        df = df.dropna(subset=['YEAR'])
     df["DISTRICT"] = df["DISTRICT"].str.strip().str.upper()
+    # one canonical name per district / college (see canonical.py)
+    from canonical import canonicalise
+    df = canonicalise(df, alias_path or dataset_alias_path(path))
+
+    return apply_dtypes(df)
+
+# repeated text columns are stored as categoricals (one shared dictionary + integer
+# codes per row), year/round as int16 and AGGRMARK as float32
+CATEGORY_COLUMNS = ["COMMUNITY", "BRANCHCODE", "DISTRICT", "COLLEGETYPE",
+                    "COLLENAME", "ALLOTCATEGORY", "BRANCHNAME"]
+SMALL_INT_COLUMNS = ["YEAR", "ROUND"]
+
+def apply_dtypes(df):
+    df = df.reset_index(drop=True)
+    for col in CATEGORY_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].astype("category")
+    for col in SMALL_INT_COLUMNS:
+        if col in df.columns:
+            values = pd.to_numeric(df[col], errors="coerce")
+            df[col] = values.astype("int16") if values.notna().all() else values
+    if "AGGRMARK" in df.columns:
+        df["AGGRMARK"] = df["AGGRMARK"].astype("float32")
+    return df
 
-
+def load_clean(path=DF_FILE):
+    # prefer the memory-mapped snapshot (see snapshot.py), fall back to the CSV
+    from snapshot import read_snapshot
+    with span("load.snapshot"):
+        df = read_snapshot(path)
+    if df is None:
+        with span("load.csv"):
+            df = read_clean_csv(path)
+    # filtered after loading so one snapshot serves any TNEA_YEARS setting
+    if YEAR_FILTER:
+        df = df[df["YEAR"].isin(YEAR_FILTER)].reset_index(drop=True)
     return df
 
+def concat_clean(df, new_rows):
+    # keep categoricals categorical by giving both sides the same categories
+    frames = align_categories([df, new_rows], CATEGORY_COLUMNS)
+    return pd.concat(frames, ignore_index=True)
+
+# TNEA_BACKEND=sqlite keeps the rows in an SQLite file instead of in every
+# worker's memory (see sqlstore.py); the dashboards answer the same either way
+BACKEND = os.environ.get("TNEA_BACKEND", "pandas")
+
+if BACKEND == "sqlite":
+    import sqlstore
+    _dataset = DatasetCache(DF_FILE, sqlstore.loader(sqlstore.db_path_for(DF_FILE), YEAR_FILTER),
+                            extra_dir=YEARS_DIR, combine=sqlstore.combine)
+    _dataset.register_merge("cube", sqlstore.merge_cube)
+else:
+    # one parsed copy per process, re-read only when the CSV changes on disk;
+    # new files in YEARS_DIR are appended and folded into the cube incrementally
+    _dataset = DatasetCache(DF_FILE, load_clean, extra_dir=YEARS_DIR, combine=concat_clean)
+    _dataset.register_merge("cube", merge_cube)
+
+def merge_sketches(sketches, new_rows):
+    # appended files are folded into the percentile sketches, see sketch.py
+    from sketch import MarkSketches
+    if BACKEND == "sqlite":
+        new_rows = sqlstore.read_frame(new_rows)
+    return sketches.merge(MarkSketches(new_rows))
+
+_dataset.register_merge("sketches", merge_sketches)
+
+def _from_rows(builder, rows=None):
+    # builders take the row-level frame; under sqlite it is read for the build and then dropped
+    if BACKEND == "sqlite":
+        return lambda table: builder(sqlstore.read_frame(table) if rows is None else rows)
+    return builder
+
+def load_data():
+    if BACKEND == "sqlite":
+        return sqlstore.read_frame(_dataset.snapshot().df)
+    return _dataset.get()
+
+def load_cube():
+    # aggregate cube for the current dataset version (see cube.py)
+    return _dataset.derived("cube", sqlstore.build_cube if BACKEND == "sqlite" else build_cube)
+
+def load_query_index():
+    # posting lists for /cutoff/query (see query.py)
+    from query import QueryIndex
+    return _dataset.derived("query_index", _from_rows(QueryIndex))
+
+def load_cutoff_index(rows=None):
+    # sorted per-group marks for /cutoff/predict (see predict.py)
+    from predict import CutoffIndex
+    return _dataset.derived("cutoff_index", _from_rows(CutoffIndex, rows))
+
+def load_round_movement(rows=None):
+    # per-round closing marks and seat fill for /cutoff/rounds (see rounds.py)
+    from rounds import RoundMovement
+    return _dataset.derived("round_movement", _from_rows(RoundMovement, rows))
+
+def load_sketches(rows=None):
+    # mergeable mark histograms per year/college/branch/community for /cutoff/percentiles (see sketch.py)
+    from sketch import MarkSketches
+    return _dataset.derived("sketches", _from_rows(MarkSketches, rows))
+
+def load_seat_matrices():
+    # {year: seats and applicant pool} for /cutoff/simulate (see simulate.py)
+    from simulate import SeatMatrix
+    return _dataset.derived("seat_matrices", _from_rows(
+        lambda df: {int(year): SeatMatrix(part, int(year))
+                    for year, part in df.groupby("YEAR", observed=True, sort=True)}))
+
+def simulated_insights(result):
+    """build_insights() with the scenario's year replaced by its simulated allotments."""
+    cube = load_cube()
+    year = result["summary"]["year"]
+    simulated = build_cube(apply_dtypes(result["rows"]))
+    return build_insights(combine_cubes(cube[cube["YEAR"] != year], simulated))
+
+def preload():
+    """Build the dataset and every derived index up front.
+
+    Run in the gunicorn master (see gunicorn.conf.py) so forked workers share
+    these pages copy-on-write instead of each loading their own copy. Under
+    sqlite the rows are read once for the indexes that need them and the
+    query index is skipped: /cutoff/query runs in SQL.
+    """
+    if BACKEND == "sqlite":
+        with _dataset.pinned(_dataset.snapshot()):
+            load_cube()
+            rows = load_data()
+            load_cutoff_index(rows)
+            load_round_movement(rows)
+            load_sketches(rows)
+        return _dataset.stats()
+    load_data()
+    load_cube()
+    load_query_index()
+    load_cutoff_index()
+    load_round_movement()
+    load_sketches()
+    return _dataset.stats()
+
+def available_years(cube):
+    return sorted(int(y) for y in cube["YEAR"].dropna().unique())
+
+def dataset_version():
+    return _dataset.current_version()
+
+def dataset_stats():
+    return _dataset.stats()
+
+@cutoff_bp.route("/cache-stats")
+def cache_stats():
+    from regional import map_cache
+    from response_cache import response_cache
+    return jsonify({"dataset": dataset_stats(), "responses": response_cache.stats(),
+                    "map_responses": map_cache.stats()})
+
+@cutoff_bp.route("/aliases")
+def cutoff_aliases():
+    # canonical district / college names and the spellings nothing matched (see canonical.py)
+    from canonical import alias_path_for, report
+    return jsonify(report(alias_path_for(DF_FILE)))
+
+@cutoff_bp.route("/query")
+def cutoff_query():
+    # e.g. /cutoff/query?year=2025&community=BC&branch=CS&district=COIMBATORE&sort=-AGGRMARK&page=1&limit=50
+    from params import ArgumentError
+    from query import run_query
+    try:
+        if BACKEND == "sqlite":
+            return json_response(sqlstore.run_query(_dataset.snapshot().df, request.args))
+        return json_response(run_query(load_query_index(), request.args))
+    except ArgumentError as e:
+        return jsonify({"error": str(e)}), 400
+
+@cutoff_bp.route("/predict")
+def cutoff_predict():
+    # e.g. /cutoff/predict?mark=182.5&community=BC&year=2025&round=1&branch=CS,IT
+    from params import ArgumentError
+    from predict import run_prediction
+    try:
+        return json_response(run_prediction(load_cutoff_index(), request.args))
+    except ArgumentError as e:
+        return jsonify({"error": str(e)}), 400
+
+@cutoff_bp.route("/rounds")
+@cached_response
+def cutoff_rounds():
+    # e.g. /cutoff/rounds?year=2025&college=0103&branch=CS,IT&category=BC&sort=drop&limit=50
+    from params import ArgumentError
+    from rounds import run_rounds
+    try:
+        return json_response(run_rounds(load_round_movement(), request.args))
+    except ArgumentError as e:
+        return jsonify({"error": str(e)}), 400
+
+@cutoff_bp.route("/percentiles")
+@cached_response
+def cutoff_percentiles():
+    # e.g. /cutoff/percentiles?by=zone,year&community=BC&branch=CS,IT&q=0.1,0.5,0.9
+    from params import ArgumentError
+    from sketch import run_percentiles
+    try:
+        return json_response(run_percentiles(load_sketches(), request.args))
+    except ArgumentError as e:
+        return jsonify({"error": str(e)}), 400
+
+@cutoff_bp.route("/simulate")
+@cached_response
+def cutoff_simulate():
+    # e.g. /cutoff/simulate?year=2025&seats=CS:1.2,IT:0.9&shift=-5&applicants=200000&choices=30&seed=1
+    from params import ArgumentError, limit as limit_arg
+    from simulate import check_size, closing_changes, parse_scenario, simulate
+    matrices = load_seat_matrices()
+    try:
+        scenario = parse_scenario(request.args, sorted(matrices))
+        check_size(matrices[scenario["year"]], scenario)
+        limit = limit_arg(request.args)
+    except ArgumentError as e:
+        return jsonify({"error": str(e)}), 400
+    with span("simulate.run"):
+        result = simulate(matrices[scenario["year"]], scenario)
+    with span("simulate.insights"):
+        insights = simulated_insights(result)
+    return json_response({"scenario": scenario, "summary": result["summary"],
+                          "closing_changes": closing_changes(result, limit), "insights": insights})
+
+@cutoff_bp.route("/export")
+def cutoff_export():
+    # e.g. /cutoff/export?format=csv&year=2025&community=BC&offset=0&limit=100000 (kind=cube for aggregates)
+    from export import FORMATS, prepare_export, stream_rows
+    from params import ArgumentError
+    try:
+        frame, positions, fmt, offset, next_offset, total = prepare_export(
+            load_query_index(), load_cube(), request.args)
+    except ArgumentError as e:
+        return jsonify({"error": str(e)}), 400
+
+    response = Response(stream_rows(frame, positions, fmt), mimetype=FORMATS[fmt])
+    response.headers["Content-Disposition"] = f"attachment; filename=tnea_export.{fmt}"
+    response.headers["X-Total-Rows"] = str(total)
+    response.headers["X-Offset"] = str(offset)
+    response.headers["X-Next-Offset"] = str(next_offset)
+    return response
+
 # ---- helpers used by MAIN PAGE (so imports in app.py keep working) ----
-def get_round_count(df):
-    return df.groupby('ROUND').size().reset_index(name='count')
+# all of them take the aggregate cube from load_cube(), not the row-level frame
+def get_round_count(cube):
+    return rollup(cube, ['ROUND'])[['ROUND', 'count']]
 
-def get_year_count(df):
-    return df.groupby('YEAR').size().reset_index(name='count')
+def get_year_count(cube):
+    return rollup(cube, ['YEAR'])[['YEAR', 'count']]
 
-def get_top10_colleges(df):
+def get_top10_colleges(cube):
     # by average AGGRMARK overall (for main page widget)
-    college_avg = df.groupby(['COLLEGECODE', 'COLLENAME'])['AGGRMARK'].mean().reset_index()
+    college_avg = rollup(cube, ['COLLEGECODE', 'COLLENAME']).rename(columns={'mean': 'AGGRMARK'})
+    college_avg = college_avg[['COLLEGECODE', 'COLLENAME', 'AGGRMARK']]
     return college_avg.sort_values(by='AGGRMARK', ascending=False).head(10)
 
-def get_community_count(df):
-    return df.groupby('COMMUNITY').size().reset_index(name='count')
+def get_community_count(cube):
+    return rollup(cube, ['COMMUNITY'])[['COMMUNITY', 'count']]
 
-def get_college_type_count(df):
-    return df.groupby('COLLEGETYPE').size().reset_index(name='count')
+def get_college_type_count(cube):
+    return rollup(cube, ['COLLEGETYPE'])[['COLLEGETYPE', 'count']]
 
 # ---- payload for /cutoff/data ----
 def _safe_val(row, year):
@@ -143,129 +407,94 @@ def _pct_change(v2023, v2025):
     return round(((v2025 - v2023) / v2023) * 100.0, 2)
 
 
-# cutoff.py (or your backend module)
-import numpy as np
-import pandas as pd
-from flask import jsonify
-
-# assume load_data() and cutoff_bp defined earlier in this module
-
-def build_insights(df: pd.DataFrame):
+def build_insights(cube: pd.DataFrame):
+    # cube: aggregate cube from load_cube(), rolled up per section below
     insights = {}
+    # every year present in the data, oldest first; start/end metrics use the first and last
+    years = available_years(cube)
+    year_cols = [str(y) for y in years]
 
     # --- 1) Yearly average trend (safe)
-    yearly_avg = (
-        df.groupby("YEAR")["AGGRMARK"]
-          .mean()
-          .reset_index(name="AVG")
-          .sort_values("YEAR")
-    )
-    yearly_avg["YoY_Change"] = yearly_avg["AVG"].diff()
+    with span("insights.yearly_avg"):
+        yearly_avg = (
+            rollup(cube, ["YEAR"])[["YEAR", "mean"]]
+              .rename(columns={"mean": "AVG"})
+              .sort_values("YEAR")
+        )
+        yearly_avg["YoY_Change"] = yearly_avg["AVG"].diff()
     insights["yearly_avg_trend"] = yearly_avg
 
     # --- 2) College average per year pivot (one row per college, cols for each year)
-    college_year = (
-        df.groupby(["COLLENAME", "YEAR"])["AGGRMARK"]
-          .mean()
-          .reset_index()
-    )
-    # pivot -> index COLLENAME, columns are years (as integers). Convert columns to strings for JSON safety.
-    college_pivot = college_year.pivot(index="COLLENAME", columns="YEAR", values="AGGRMARK")
-    # ensure 2023/2024/2025 exist and convert year columns to strings
-    for yr in [2023, 2024, 2025]:
-        if yr not in college_pivot.columns:
-            college_pivot[yr] = np.nan
-    # convert numeric-year columns to string names "2023", "2024", "2025" (makes JSON keys predictable)
-    college_pivot.columns = college_pivot.columns.map(lambda c: str(c))
-
-    # overall average across available years (skipna)
-    college_pivot["AVG_OVERALL"] = college_pivot[["2023", "2024", "2025"]].mean(axis=1, skipna=True)
-
-    # get first & last year available per college (for informational display)
-    first_last = college_year.groupby("COLLENAME")["YEAR"].agg(["min", "max"]).rename(columns={"min":"First_Year", "max":"Last_Year"})
-
-    # select top-10 by AVG_OVERALL
-    top10 = college_pivot.sort_values("AVG_OVERALL", ascending=False).head(10).copy()
-    # join first/last
-    top10 = top10.merge(first_last, left_index=True, right_index=True)
-
-    # compute start/end/net/pct/trend
-    top10["Start_Cutoff"] = top10["2023"]
-    top10["End_Cutoff"] = top10["2025"]
-    top10["Net_Increase_Cutoff"] = top10["End_Cutoff"] - top10["Start_Cutoff"]
-    top10["Pct_Change"] = np.where(
-        top10["Start_Cutoff"].notna() & top10["End_Cutoff"].notna() & (top10["Start_Cutoff"] != 0),
-        (top10["Net_Increase_Cutoff"] / top10["Start_Cutoff"]) * 100.0,
-        np.nan
-    )
-
-    def compute_trend(row):
-        # strictly monotonic across all three years -> labeled increasing/decreasing
-        if pd.notna(row["2023"]) and pd.notna(row["2024"]) and pd.notna(row["2025"]):
-            if (row["2023"] < row["2024"]) and (row["2024"] < row["2025"]):
-                return "increasing"
-            if (row["2023"] > row["2024"]) and (row["2024"] > row["2025"]):
-                return "decreasing"
-        # fallback to sign of net increase
-        ni = row["Net_Increase_Cutoff"]
-        if pd.notna(ni):
-            return "up" if ni > 0 else ("down" if ni < 0 else "flat")
-        return "flat"
-
-    top10["Trend"] = top10.apply(compute_trend, axis=1)
-
-    # prepare DataFrame to return
-    top10_out = top10.reset_index().rename_axis(None)  # COLLENAME becomes column
-    insights["top_10_colleges_by_average_overall_cutoff"] = top10_out
+    with span("insights.college_pivot"):
+        college_year = (
+            rollup(cube, ["COLLENAME", "YEAR"])[["COLLENAME", "YEAR", "mean"]]
+              .rename(columns={"mean": "AGGRMARK"})
+        )
+        # pivot -> index COLLENAME, columns are years (as integers). Convert columns to strings for JSON safety.
+        college_pivot = college_year.pivot(index="COLLENAME", columns="YEAR", values="AGGRMARK")
+        # ensure every year exists and convert year columns to strings
+        college_pivot = college_pivot.reindex(columns=years)
+        # convert numeric-year columns to string names like "2023" (makes JSON keys predictable)
+        college_pivot.columns = year_cols
+
+        # overall average across available years (skipna)
+        college_pivot["AVG_OVERALL"] = college_pivot[year_cols].mean(axis=1, skipna=True)
+
+        # get first & last year available per college (for informational display)
+        first_last = college_year.groupby("COLLENAME", observed=True)["YEAR"].agg(["min", "max"]).rename(columns={"min":"First_Year", "max":"Last_Year"})
+
+        # select top-10 by AVG_OVERALL
+        top10 = college_pivot.sort_values("AVG_OVERALL", ascending=False).head(10).copy()
+        # join first/last
+        top10 = top10.merge(first_last, left_index=True, right_index=True)
+
+        # compute start/end/net/pct/trend (vectorised, see trends.py)
+        metrics = trend_metrics(top10, year_cols)
+        top10["Start_Cutoff"] = top10[year_cols[0]]
+        top10["End_Cutoff"] = top10[year_cols[-1]]
+        top10["Net_Increase_Cutoff"] = metrics["Net_Change"]
+        top10["Pct_Change"] = metrics["Pct_Change"]
+        top10["Trend"] = metrics["Trend"]
+
+        # prepare DataFrame to return
+        top10_out = top10.reset_index().rename_axis(None)  # COLLENAME becomes column
+        insights["top_10_colleges_by_average_overall_cutoff"] = top10_out
 
     # --- 3) Branch-level averages (across all colleges) and trends (no college names)
-    branch_year = (
-        df.groupby(["BRANCHCODE", "YEAR"])["AGGRMARK"]
-          .mean()
-          .reset_index()
-    )
-    branch_pivot = branch_year.pivot(index="BRANCHCODE", columns="YEAR", values="AGGRMARK")
-    for yr in [2023, 2024, 2025]:
-        if yr not in branch_pivot.columns:
-            branch_pivot[yr] = np.nan
-    branch_pivot.columns = branch_pivot.columns.map(lambda c: str(c))
-
-    # metrics
-    branch_pivot["Net_Increase"] = branch_pivot["2025"] - branch_pivot["2023"]
-    branch_pivot["Pct_Change"] = np.where(
-        branch_pivot["2023"].notna() & branch_pivot["2025"].notna() & (branch_pivot["2023"] != 0),
-        (branch_pivot["Net_Increase"] / branch_pivot["2023"]) * 100.0,
-        np.nan
-    )
-    # strict monotonic increasing/decreasing flags
-    branch_pivot["Increasing"] = (
-        branch_pivot["2023"].notna() & branch_pivot["2024"].notna() & branch_pivot["2025"].notna() &
-        (branch_pivot["2023"] < branch_pivot["2024"]) & (branch_pivot["2024"] < branch_pivot["2025"])
-    )
-    branch_pivot["Decreasing"] = (
-        branch_pivot["2023"].notna() & branch_pivot["2024"].notna() & branch_pivot["2025"].notna() &
-        (branch_pivot["2023"] > branch_pivot["2024"]) & (branch_pivot["2024"] > branch_pivot["2025"])
-    )
-
-    # only branch-level results (no college names)
-    inc_branches = branch_pivot[branch_pivot["Increasing"]].copy()
-    dec_branches = branch_pivot[branch_pivot["Decreasing"]].copy()
-
-    # sort for convenience
-    inc_branches = inc_branches.sort_values("Net_Increase", ascending=False).reset_index()
-    dec_branches = dec_branches.sort_values("Net_Increase", ascending=True).reset_index()
-
-    insights["increasing_branches"] = inc_branches
-    insights["decreasing_branches"] = dec_branches
+    with span("insights.branch_trends"):
+        branch_year = (
+            rollup(cube, ["BRANCHCODE", "YEAR"])[["BRANCHCODE", "YEAR", "mean"]]
+              .rename(columns={"mean": "AGGRMARK"})
+        )
+        branch_pivot = branch_year.pivot(index="BRANCHCODE", columns="YEAR", values="AGGRMARK")
+        branch_pivot = branch_pivot.reindex(columns=years)
+        branch_pivot.columns = year_cols
+
+        # metrics + strict monotonic increasing/decreasing flags
+        metrics = trend_metrics(branch_pivot, year_cols)
+        branch_pivot["Net_Increase"] = metrics["Net_Change"]
+        branch_pivot["Pct_Change"] = metrics["Pct_Change"]
+        branch_pivot["Increasing"] = metrics["Increasing"]
+        branch_pivot["Decreasing"] = metrics["Decreasing"]
+
+        # only branch-level results (no college names)
+        inc_branches = branch_pivot[branch_pivot["Increasing"]].copy()
+        dec_branches = branch_pivot[branch_pivot["Decreasing"]].copy()
+
+        # sort for convenience
+        inc_branches = inc_branches.sort_values("Net_Increase", ascending=False).reset_index()
+        dec_branches = dec_branches.sort_values("Net_Increase", ascending=True).reset_index()
+
+        insights["increasing_branches"] = inc_branches
+        insights["decreasing_branches"] = dec_branches
 
     # --- 4) Keep the community trend existing output (if you want it)
-    community_trends = (
-        df.groupby(["YEAR", "COMMUNITY"])["AGGRMARK"]
-          .mean()
-          .reset_index(name="CUTOFF")
-          .sort_values(["YEAR", "COMMUNITY"])
-    )
-    insights["community_avg_mark_trends"] = community_trends
-    print(insights)
+    with span("insights.community_trends"):
+        community_trends = (
+            rollup(cube, ["YEAR", "COMMUNITY"])[["YEAR", "COMMUNITY", "mean"]]
+              .rename(columns={"mean": "CUTOFF"})
+              .sort_values(["YEAR", "COMMUNITY"])
+        )
+        insights["community_avg_mark_trends"] = community_trends
 
     return insights
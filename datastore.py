@@ -0,0 +1,209 @@
+import os
+import threading
+from contextlib import contextmanager
+
+from metrics import span
+
+
+class _State:
+    """One loaded dataset version and the values derived from it."""
+
+    def __init__(self, df, signature, derived=None):
+        self.df = df
+        self.signature = signature
+        self.derived = derived or {}
+        # builders run under the state's own lock, so building the next version
+        # in the background never blocks requests reading the current one
+        self.lock = threading.RLock()
+
+
+class DatasetCache:
+    """Keeps one cleaned copy of the allotment data per process.
+
+    The file is only parsed again when its mtime or size changes. Callers get a
+    shallow copy, so they can add or replace columns (like regional.py does)
+    without touching the cached frame - but they must not write into existing
+    columns in place.
+
+    If `extra_dir` is given, every *.csv in it is treated as an appended file
+    (e.g. a new counselling year). When only new files show up there, just
+    those files are parsed and appended with `combine`, and derived values
+    that have a registered merge function are updated from the new rows alone
+    instead of being rebuilt from scratch.
+
+    By default a change on disk is picked up by the first call that notices
+    it. With `auto_reload = False` calls keep reading the published version and
+    the owner moves to a new one explicitly: stage() loads it on the side,
+    pinned() lets the current thread warm it up, publish() swaps it in (see
+    precompute.py).
+    """
+
+    def __init__(self, path, loader, extra_dir=None, combine=None):
+        self.path = path
+        self.loader = loader
+        self.extra_dir = extra_dir
+        self.combine = combine
+        self.auto_reload = True
+        self._lock = threading.RLock()
+        self._state = None
+        self._local = threading.local()
+        self._mergers = {}
+        self._on_first_load = []
+        self.hits = 0
+        self.misses = 0
+        self.reloads = 0
+        self.incremental_loads = 0
+
+    def _stat(self):
+        st = os.stat(self.path)
+        return ((st.st_mtime_ns, st.st_size), self._stat_extras())
+
+    def _stat_extras(self):
+        if not self.extra_dir or not os.path.isdir(self.extra_dir):
+            return ()
+        extras = []
+        for entry in os.scandir(self.extra_dir):
+            if entry.is_file() and entry.name.endswith(".csv"):
+                st = entry.stat()
+                extras.append((entry.path, st.st_mtime_ns, st.st_size))
+        return tuple(sorted(extras))
+
+    def _new_extras(self, old, signature):
+        """Extra files added since `old` was loaded, or None if a full reload is needed."""
+        if old is None or self.combine is None:
+            return None
+        (base, extras), (old_base, old_extras) = signature, old.signature
+        if base != old_base or not set(old_extras) <= set(extras):
+            return None
+        return [e for e in extras if e not in set(old_extras)]
+
+    def _load(self, old, signature):
+        """A new state for `signature`, built incrementally from `old` when possible."""
+        new_extras = self._new_extras(old, signature)
+        if new_extras is not None:
+            self.incremental_loads += 1
+            df, derived = old.df, old.derived
+            for path, _, _ in new_extras:
+                part = self.loader(path)
+                df = self.combine(df, part)
+                # anything without a merge function is rebuilt lazily on next use
+                derived = {name: self._mergers[name](value, part)
+                           for name, value in derived.items() if name in self._mergers}
+            return _State(df, signature, derived)
+
+        if old is not None:
+            self.reloads += 1
+        self.misses += 1
+        df = self.loader(self.path)
+        for path, _, _ in signature[1]:
+            df = self.combine(df, self.loader(path))
+        return _State(df, signature)
+
+    def _current(self):
+        pinned = getattr(self._local, "state", None)
+        if pinned is not None:
+            return pinned
+        state = self._state
+        if state is not None and not self.auto_reload:
+            self.hits += 1
+            return state
+
+        signature = self._stat()
+        if state is not None and signature == state.signature:
+            self.hits += 1
+            return state
+
+        with self._lock:
+            # another thread may have reloaded while we waited for the lock
+            state = self._state
+            if state is not None and signature == state.signature:
+                self.hits += 1
+                return state
+            self._set_state(self._load(state, signature))
+            return self._state
+
+    def get(self):
+        return self._current().df.copy(deep=False)
+
+    def derived(self, name, builder):
+        """Return builder(df), computed once per dataset version."""
+        state = self._current()
+        if name in state.derived:
+            return state.derived[name]
+        with state.lock:
+            # builders may ask for other derived values, hence the RLock
+            if name not in state.derived:
+                with span(f"build.{name}"):
+                    state.derived[name] = builder(state.df)
+            return state.derived[name]
+
+    def register_merge(self, name, merge):
+        """merge(old_value, new_rows) -> value; used when files are appended."""
+        self._mergers[name] = merge
+
+    def on_first_load(self, callback):
+        """callback() once the first version is in place, however it got loaded."""
+        if self._state is not None:
+            callback()
+        else:
+            self._on_first_load.append(callback)
+
+    def _set_state(self, state):
+        first = self._state is None
+        self._state = state
+        if first:
+            for callback in self._on_first_load:
+                callback()
+
+    def stage(self):
+        """Load the version on disk without publishing it; None if it is already current."""
+        signature = self._stat()
+        with self._lock:
+            state = self._state
+            if state is not None and state.signature == signature:
+                return None
+            return self._load(state, signature)
+
+    def snapshot(self):
+        """The state this thread reads now; hand it to pinned() to read the same one elsewhere."""
+        return self._current()
+
+    @contextmanager
+    def pinned(self, state):
+        """Make this thread (only) read `state`, e.g. to warm it up before publish()."""
+        previous = getattr(self._local, "state", None)
+        self._local.state = state
+        try:
+            yield state
+        finally:
+            self._local.state = previous
+
+    def publish(self, state):
+        # a single reference swap: readers see either the old or the new state, never a mix
+        self._set_state(state)
+
+    def current_version(self):
+        # like .version, but first picks up any change to the files on disk
+        return self._current().signature
+
+    @property
+    def version(self):
+        # changes every time the underlying files change (None until first load)
+        state = getattr(self._local, "state", None) or self._state
+        return None if state is None else state.signature
+
+    def stats(self):
+        state = self._state
+        return {
+            "path": self.path,
+            "extra_files": [] if state is None else [e[0] for e in state.signature[1]],
+            "loaded": state is not None,
+            "rows": 0 if state is None else len(state.df),
+            "version": None if state is None else state.signature,
+            "auto_reload": self.auto_reload,
+            "hits": self.hits,
+            "misses": self.misses,
+            "reloads": self.reloads,
+            "incremental_loads": self.incremental_loads,
+            "derived": [] if state is None else sorted(state.derived),
+        }
@@ -0,0 +1,71 @@
+"""District name normalisation shared by the data and the map geometry.
+
+The allotment CSVs and boundary files spell districts differently
+("NAGAPPATTINAM" / "Nagapattinam", "TIRUPUR" / "Tiruppur", "THE NILGIRIS" /
+"Nilgiris"). district_key() folds a name to a loose comparison key, ALIASES
+covers renames that no spelling rule can catch, and DistrictIndex maps any
+known spelling to one canonical name.
+"""
+import re
+
+# spelling -> canonical name, for variants district_key() alone does not fold together
+ALIASES = {
+    "KANCHIPURAM": "KANCHEEPURAM",
+    "KANNIYAKUMARI": "KANYAKUMARI",
+    "TUTICORIN": "THOOTHUKUDI",
+    "TRICHY": "TIRUCHIRAPPALLI",
+    "TIRUCHCHIRAPPALLI": "TIRUCHIRAPPALLI",
+    "CHENGALPET": "CHENGALPATTU",
+    "PUDUCHERRY": "PONDICHERRY",
+}
+# words that are dropped before comparing ("THE NILGIRIS", "SALEM DISTRICT")
+NOISE_WORDS = {"THE", "DISTRICT", "DT"}
+# property holding the district name, in the order tried, for common boundary files
+NAME_PROPERTIES = ("DISTRICT", "District", "district", "DTNAME", "dtname", "DIST_NAME", "NAME_2", "NAME", "name")
+
+
+def district_key(name):
+    """Loose key: upper case letters only, TH -> T, doubled letters collapsed."""
+    if name is None or name != name:
+        return None
+    words = [w for w in re.split(r"[^A-Z]+", str(name).upper()) if w and w not in NOISE_WORDS]
+    text = "".join(words)
+    text = ALIASES.get(text, text)
+    text = text.replace("TH", "T")
+    text = re.sub(r"(.)\1+", r"\1", text)
+    return text or None
+
+
+class DistrictIndex:
+    """Lookup from any spelling to a canonical district name.
+
+    The first name given for a key becomes its canonical spelling, so pass
+    the preferred list (e.g. regional.DISTRICT_ZONE) first.
+    """
+
+    def __init__(self, *name_lists):
+        self.canonical_by_key = {}
+        for names in name_lists:
+            for name in names:
+                key = district_key(name)
+                if key is not None:
+                    name = str(name).strip().upper()
+                    self.canonical_by_key.setdefault(key, ALIASES.get(name, name))
+
+    def canonical(self, name):
+        """Canonical name for `name`, or None if it matches no known district."""
+        return self.canonical_by_key.get(district_key(name))
+
+    def __contains__(self, name):
+        return self.canonical(name) is not None
+
+    def __len__(self):
+        return len(self.canonical_by_key)
+
+
+def feature_name(properties):
+    """District name of a GeoJSON feature, or None if it has none."""
+    for prop in NAME_PROPERTIES:
+        if properties.get(prop):
+            return properties[prop]
+    return None
@@ -0,0 +1,321 @@
+"""Simplified, quantized map geometry for the regional page (/geo/...).
+
+The GeoJSON files in static/ are full survey resolution. On first use (or in
+the gunicorn master, see app.preload) each source is turned into a small
+topology:
+- coordinates are snapped to a QUANTIZATION x QUANTIZATION grid;
+- rings are cut into arcs wherever neighbouring shapes meet, so every shared
+  border is stored once;
+- each arc is simplified with Douglas-Peucker at every level in LEVELS.
+
+Neighbours reference the same simplified arc, so borders never gap or overlap.
+
+Each level is served as GeoJSON or TopoJSON from a URL containing its content
+hash. The bodies are precompressed (gzip, plus brotli when installed) and sent
+with an immutable Cache-Control. /geo/<name> is the small manifest listing
+those URLs:
+
+    python geo.py [name]     # print the size of every level / format
+"""
+import json
+import math
+import sys
+
+import numpy as np
+from flask import Blueprint, jsonify, redirect, url_for
+
+from datastore import DatasetCache
+from response_cache import IMMUTABLE_CACHE_CONTROL, make_entry, response_cache
+
+geo_bp = Blueprint("geo", __name__)
+
+GEO_SOURCES = {
+    "districts": "static/tamilnadu_districts.geojson",
+}
+# Douglas-Peucker tolerance in degrees (0.01 deg is roughly 1 km): "low" is
+# plenty for a phone-sized state map, "high" for zooming into one district
+LEVELS = {"low": 0.01, "medium": 0.002, "high": 0.0005}
+# grid size the coordinates are snapped to (like TopoJSON's -q)
+QUANTIZATION = 100_000
+FORMATS = {"geojson": "application/geo+json", "topojson": "application/json"}
+
+
+def _polygons(geometry):
+    # -> list of polygons, each a list of rings of [x, y(, z)] points
+    if geometry is None:
+        return []
+    if geometry["type"] == "Polygon":
+        return [geometry["coordinates"]]
+    if geometry["type"] == "MultiPolygon":
+        return geometry["coordinates"]
+    raise ValueError(f"unsupported geometry type {geometry['type']}")
+
+
+def _junctions(rings):
+    """Points where a ring meets more than one other neighbour - arcs are cut there."""
+    neighbours = {}
+    for ring in rings:
+        n = len(ring)
+        for i, point in enumerate(ring):
+            seen = neighbours.setdefault(point, set())
+            seen.add(ring[i - 1])
+            seen.add(ring[(i + 1) % n])
+    return {point for point, seen in neighbours.items() if len(seen) > 2}
+
+
+def douglas_peucker(points, tolerance):
+    """Boolean mask of the points to keep; the endpoints always stay."""
+    n = len(points)
+    keep = np.zeros(n, dtype=bool)
+    keep[[0, -1]] = True
+    if n < 3:
+        return keep
+    pts = np.asarray(points, dtype=float)
+    stack = [(0, n - 1)]
+    if (pts[0] == pts[-1]).all():
+        # closed arc: start from the point farthest from the start, so a ring
+        # bigger than the tolerance never collapses to a line
+        far = int(np.argmax(((pts - pts[0]) ** 2).sum(axis=1)))
+        keep[far] = True
+        stack = [(0, far), (far, n - 1)]
+    while stack:
+        a, b = stack.pop()
+        if b - a < 2:
+            continue
+        chord = pts[b] - pts[a]
+        rel = pts[a + 1:b] - pts[a]
+        length = math.hypot(*chord)
+        if length == 0:
+            dist = np.hypot(rel[:, 0], rel[:, 1])
+        else:
+            dist = np.abs(chord[0] * rel[:, 1] - chord[1] * rel[:, 0]) / length
+        i = int(np.argmax(dist))
+        if dist[i] > tolerance:
+            mid = a + 1 + i
+            keep[mid] = True
+            stack += [(a, mid), (mid, b)]
+    return keep
+
+
+def _ring_area(points):
+    x, y = points[:, 0], points[:, 1]
+    return abs(np.dot(x, np.roll(y, -1)) - np.dot(y, np.roll(x, -1))) / 2
+
+
+class Topology:
+    """Quantized arcs shared between features, plus each feature's rings as arc references.
+
+    An arc reference `i` means arcs[i]; `~i` means arcs[i] walked backwards
+    (the TopoJSON convention).
+    """
+
+    def __init__(self, collection, quantization=QUANTIZATION):
+        features = collection.get("features", [])
+        polygons = [_polygons(f.get("geometry")) for f in features]
+        coords = np.array([pt[:2] for polys in polygons for poly in polys for ring in poly for pt in ring],
+                          dtype=float).reshape(-1, 2)
+        lo = coords.min(axis=0) if len(coords) else np.zeros(2)
+        hi = coords.max(axis=0) if len(coords) else np.ones(2)
+        self.translate = lo
+        self.scale = np.where(hi > lo, (hi - lo) / (quantization - 1), 1.0)
+        self.properties = [f.get("properties") or {} for f in features]
+
+        quantized = [[[self._quantize(ring) for ring in poly] for poly in polys] for polys in polygons]
+        junctions = _junctions(ring for polys in quantized for poly in polys for ring in poly)
+        self.arcs = []
+        self._arc_ids = {}
+        # feature -> polygons -> rings -> arc references
+        self.geometries = [[[self._cut(ring, junctions) for ring in poly if len(ring) >= 3]
+                            for poly in polys] for polys in quantized]
+        del self._arc_ids
+
+    def _quantize(self, ring):
+        q = np.rint((np.asarray(ring, dtype=float)[:, :2] - self.translate) / self.scale).astype(np.int64)
+        keep = np.r_[True, (np.diff(q, axis=0) != 0).any(axis=1)]
+        points = [tuple(p) for p in q[keep].tolist()]
+        if len(points) > 1 and points[0] == points[-1]:
+            points.pop()  # rings are kept open here; the closing point is implied
+        return points
+
+    def _cut(self, ring, junctions):
+        cuts = [i for i, p in enumerate(ring) if p in junctions]
+        if not cuts:
+            # a ring nobody else touches is one closed arc; rotate it to a fixed
+            # start so the same ring seen from both sides (island / hole) matches
+            start = ring.index(min(ring))
+            ring = ring[start:] + ring[:start]
+            return [self._arc(ring + [ring[0]])]
+        ring = ring[cuts[0]:] + ring[:cuts[0]]
+        cuts = [i for i, p in enumerate(ring) if p in junctions] + [len(ring)]
+        closed = ring + [ring[0]]
+        return [self._arc(closed[a:b + 1]) for a, b in zip(cuts, cuts[1:])]
+
+    def _arc(self, points):
+        key = tuple(points)
+        if key in self._arc_ids:
+            return self._arc_ids[key]
+        if key[::-1] in self._arc_ids:
+            return ~self._arc_ids[key[::-1]]
+        self._arc_ids[key] = len(self.arcs)
+        self.arcs.append(np.array(points, dtype=np.int64))
+        return self._arc_ids[key]
+
+    @staticmethod
+    def _ring_points(refs, arcs):
+        parts = [arcs[r] if r >= 0 else arcs[~r][::-1] for r in refs]
+        return np.concatenate([parts[0]] + [p[1:] for p in parts[1:]])
+
+    def simplify(self, tolerance):
+        """(arcs, geometries) at `tolerance` degrees; rings that collapse are dropped.
+
+        Outer rings smaller than tolerance^2 are dropped too (specks of
+        islands), except the largest polygon of each feature.
+        """
+        arcs = [arc[douglas_peucker(arc * self.scale, tolerance)] for arc in self.arcs]
+        geometries = []
+        for polys in self.geometries:
+            kept = []
+            for poly in polys:
+                rings = [refs for refs in poly if len(self._ring_points(refs, arcs)) >= 4]
+                if rings and rings[0] is poly[0]:
+                    area = _ring_area(self._ring_points(rings[0], arcs) * self.scale)
+                    kept.append((area, rings))
+            largest = max((area for area, _ in kept), default=0)
+            geometries.append([rings for area, rings in kept
+                               if area >= tolerance ** 2 or area == largest])
+        return arcs, geometries
+
+    def _decimals(self):
+        # enough decimals to tell neighbouring grid points apart
+        return max(0, math.ceil(-math.log10(float(self.scale.min())))) if self.scale.min() < 1 else 0
+
+    def to_geojson(self, arcs, geometries, properties=None):
+        # `properties` replaces the source features' properties (same order)
+        properties = self.properties if properties is None else properties
+        decimals = self._decimals()
+        features = []
+        for props, polys in zip(properties, geometries):
+            coords = [[np.round(self._ring_points(refs, arcs) * self.scale + self.translate, decimals).tolist()
+                       for refs in rings] for rings in polys]
+            if not coords:
+                geometry = None
+            elif len(coords) == 1:
+                geometry = {"type": "Polygon", "coordinates": coords[0]}
+            else:
+                geometry = {"type": "MultiPolygon", "coordinates": coords}
+            features.append({"type": "Feature", "properties": props, "geometry": geometry})
+        return {"type": "FeatureCollection", "features": features}
+
+    def to_topojson(self, arcs, geometries, name, properties=None):
+        properties = self.properties if properties is None else properties
+        # only ship the arcs still referenced, renumbered densely
+        used = sorted({r if r >= 0 else ~r for polys in geometries for rings in polys
+                       for refs in rings for r in refs})
+        new_id = {old: new for new, old in enumerate(used)}
+
+        def remap(r):
+            return new_id[r] if r >= 0 else ~new_id[~r]
+
+        objects = []
+        for props, polys in zip(properties, geometries):
+            rings = [[[remap(r) for r in refs] for refs in poly] for poly in polys]
+            if not rings:
+                objects.append({"type": None, "properties": props})
+            elif len(rings) == 1:
+                objects.append({"type": "Polygon", "arcs": rings[0], "properties": props})
+            else:
+                objects.append({"type": "MultiPolygon", "arcs": rings, "properties": props})
+        return {
+            "type": "Topology",
+            "transform": {"scale": self.scale.tolist(), "translate": self.translate.tolist()},
+            "objects": {name: {"type": "GeometryCollection", "geometries": objects}},
+            # delta-encoded, as in the TopoJSON spec
+            "arcs": [np.diff(arcs[i], axis=0, prepend=[[0, 0]]).tolist() for i in used],
+        }
+
+
+def load_geojson(path):
+    with open(path, "rb") as f:
+        return json.load(f)
+
+
+def build_assets(name):
+    """{filename: Entry} for every level and format, plus the manifest dict."""
+    topology = load_topology(name)
+    assets, manifest = {}, {"name": name, "levels": {}}
+    for level, tolerance in LEVELS.items():
+        arcs, geometries = load_level(name, level)
+        info = manifest["levels"][level] = {"tolerance": tolerance}
+        for fmt, doc in (("geojson", topology.to_geojson(arcs, geometries)),
+                         ("topojson", topology.to_topojson(arcs, geometries, name))):
+            entry = make_entry(json.dumps(doc, separators=(",", ":")).encode(), FORMATS[fmt], best=True)
+            filename = f"{level}.{entry.etag[:12]}.{fmt}"
+            assets[filename] = entry
+            info[fmt] = {
+                "url": url_for("geo.geo_asset", name=name, filename=filename),
+                "bytes": {enc: len(body) for enc, body in entry.bodies.items()},
+            }
+    return assets, manifest
+
+
+# one cache per source file, rebuilt only when the file changes on disk
+_sources = {name: DatasetCache(path, load_geojson) for name, path in GEO_SOURCES.items()}
+
+
+def load_topology(name):
+    return _sources[name].derived("topology", Topology)
+
+
+def load_level(name, level):
+    """(arcs, geometries) of `name` simplified to LEVELS[level]."""
+    return _sources[name].derived(f"level:{level}", lambda _: load_topology(name).simplify(LEVELS[level]))
+
+
+def load_assets(name):
+    return _sources[name].derived("assets", lambda _: build_assets(name))
+
+
+def geo_version(name):
+    return _sources[name].current_version()
+
+
+@geo_bp.route("/geo/<name>")
+def geo_manifest(name):
+    if name not in _sources:
+        return jsonify({"error": f"unknown map {name}"}), 404
+    _, manifest = load_assets(name)
+    # the manifest itself must revalidate, it is what points at the new hashes
+    return response_cache.respond(make_entry(json.dumps(manifest).encode(), "application/json"))
+
+
+@geo_bp.route("/geo/<name>/<filename>")
+def geo_asset(name, filename):
+    if name not in _sources:
+        return jsonify({"error": f"unknown map {name}"}), 404
+    assets, _ = load_assets(name)
+    if filename in assets:
+        return response_cache.respond(assets[filename], cache_control=IMMUTABLE_CACHE_CONTROL)
+    # an outdated hash (the source changed): send the client to the current file
+    level, fmt = filename.split(".")[0], filename.rpartition(".")[2]
+    for current in assets:
+        if current.startswith(level + ".") and current.endswith("." + fmt):
+            return redirect(url_for("geo.geo_asset", name=name, filename=current))
+    return jsonify({"error": f"no such file {filename}"}), 404
+
+
+def print_sizes(name):
+    from flask import Flask
+    app = Flask(__name__)
+    app.register_blueprint(geo_bp)
+    with app.test_request_context():
+        raw = len(open(GEO_SOURCES[name], "rb").read())
+        print(f"source: {raw / 1024:.0f} KB")
+        _, manifest = load_assets(name)
+    for level, info in manifest["levels"].items():
+        for fmt in FORMATS:
+            sizes = "  ".join(f"{enc} {n / 1024:.1f} KB" for enc, n in info[fmt]["bytes"].items())
+            print(f"{level:<7}{fmt:<9}{sizes}")
+
+
+if __name__ == "__main__":
+    print_sizes(sys.argv[1] if len(sys.argv) > 1 else "districts")
@@ -0,0 +1,49 @@
+"""Gunicorn settings: `gunicorn -c gunicorn.conf.py app:app` (see Procfile).
+
+With preload_app the master imports app.py, loads the dataset and renders the
+cached responses once, then forks the workers. The workers share those pages
+copy-on-write, so adding a worker costs little extra memory and a respawned
+worker is serving immediately instead of re-parsing the CSV.
+
+After the fork every worker starts a background thread (precompute.py) that
+picks up a changed dataset, renders the cached responses for it and only then
+swaps it in, so no request waits on a reload (TNEA_REFRESH_SECONDS sets the
+polling interval, 0 turns it off).
+
+Set PRELOAD=0 to turn preloading off: each worker then imports the app
+itself, serves pages and /healthz right away and loads the data on a thread
+(/readyz is 503 until it is done).
+"""
+import gc
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
+# a small default: each worker still ends up with its own copy of every dataset
+# version the refresh thread loads after the fork; raise it with WEB_CONCURRENCY
+workers = int(os.environ.get("WEB_CONCURRENCY", 2))
+threads = int(os.environ.get("GUNICORN_THREADS", 1))
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 60))
+preload_app = os.environ.get("PRELOAD", "1") != "0"
+
+
+def when_ready(server):
+    # runs in the master after the app is imported and before any worker is forked
+    if not preload_app:
+        return
+    from app import preload
+    stats = preload()
+    server.log.info("preloaded %s rows (%s)", stats["rows"], ", ".join(stats["derived"]))
+
+    # move everything allocated so far out of the collector's reach; otherwise
+    # the first gc pass in each worker touches every object header and copies
+    # the shared pages
+    gc.collect()
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    # threads do not survive fork(), so these are started per worker: the data
+    # layer load (only without PRELOAD, /readyz is 503 until it finishes) and
+    # the refresh thread
+    from app import start_background
+    start_background()
@@ -0,0 +1,125 @@
+"""Liveness and readiness checks (/healthz, /readyz) for load balancers and deploys.
+
+/healthz answers 200 as soon as the process is serving: the page routes work
+from that point on. /readyz answers 503 until the dataset is loaded, then 200.
+That is normally the warm-up (the dataset, its indexes and the prerendered
+responses, see app.preload); when nothing warms the process up, the first
+request that loads the dataset makes it ready. While a warm-up is running only
+its end counts. Both report how long startup took.
+
+    readiness.start(load)   # run load() on a background thread, ready when it returns
+    readiness.run(load)     # same, on the calling thread
+    readiness.mark_ready()  # ready now
+    readiness.mark_ready_if_idle()  # same, unless a warm-up is still running
+"""
+import threading
+import time
+import traceback
+
+from flask import jsonify
+
+from metrics import register_collector
+
+# close enough to process start: this is imported before the app is built
+PROCESS_STARTED = time.time()
+
+
+class Readiness:
+    def __init__(self):
+        self.state = "starting"   # -> loading -> ready | failed
+        self.error = None
+        self.serving_at = None
+        self.ready_at = None
+        self.load_seconds = None
+        self._thread = None
+
+    @property
+    def ready(self):
+        return self.state == "ready"
+
+    @property
+    def loading(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def run(self, load):
+        self.state = "loading"
+        start = time.perf_counter()
+        try:
+            result = load()
+        except Exception as e:
+            self.state = "failed"
+            self.error = f"{type(e).__name__}: {e}"
+            raise
+        self.load_seconds = time.perf_counter() - start
+        self.mark_ready()
+        return result
+
+    def mark_ready(self):
+        if self.ready_at is None:
+            self.ready_at = time.time()
+        self.error = None
+        self.state = "ready"
+
+    def mark_ready_if_idle(self):
+        # e.g. a request loaded the dataset; a running warm-up still has the
+        # indexes and prerendered responses to go and says when it is done
+        if self.state != "loading":
+            self.mark_ready()
+
+    def start(self, load, then=None):
+        """Load in the background (once); `then` runs after a successful load."""
+        if self.ready or self.loading:
+            return
+
+        def target():
+            try:
+                self.run(load)
+            except Exception:
+                traceback.print_exc()
+                return
+            if then is not None:
+                then()
+
+        # loading from here on, so a dataset load by a request in the meantime
+        # does not count as ready (mark_ready_if_idle)
+        self.state = "loading"
+        self._thread = threading.Thread(target=target, daemon=True, name="warm-up")
+        self._thread.start()
+
+    def status(self):
+        def since_start(moment):
+            return None if moment is None else round(moment - PROCESS_STARTED, 3)
+
+        return {
+            "status": self.state,
+            "error": self.error,
+            "serving_after_seconds": since_start(self.serving_at),
+            "ready_after_seconds": since_start(self.ready_at),
+            "load_seconds": None if self.load_seconds is None else round(self.load_seconds, 3),
+        }
+
+    def _metrics(self):
+        status = self.status()
+        samples = [
+            ("tnea_ready", "1 once the data layer is loaded", "gauge", [({}, int(self.ready))]),
+        ]
+        if status["ready_after_seconds"] is not None:
+            samples.append(("tnea_startup_seconds", "Seconds from process start until ready", "gauge",
+                            [({}, status["ready_after_seconds"])]))
+        return samples
+
+
+readiness = Readiness()
+
+
+def init_app(app):
+    register_collector(readiness._metrics)
+    readiness.serving_at = time.time()
+
+    @app.route("/healthz")
+    def healthz():
+        return jsonify({"status": "ok"})
+
+    @app.route("/readyz")
+    def readyz():
+        return jsonify(readiness.status()), 200 if readiness.ready else 503
@@ -0,0 +1,284 @@
+"""Request / span timings and a Prometheus text endpoint (/metrics).
+
+    from metrics import span
+    with span("insights.college_pivot"):
+        ...
+
+Every span is recorded in the tnea_span_seconds histogram. Inside a request
+it is also added to the Server-Timing response header, so a slow
+/cutoff-dashboard-data shows its breakdown in the browser's network tab.
+
+init_app() adds:
+- request count / latency metrics and cache hit counters;
+- GET /metrics;
+- a sampling profiler under /debug/profiler, off unless TNEA_DEBUG_TOKEN is set.
+
+The profiler can be started on a live worker and returns folded stacks, which
+flamegraph.pl or speedscope turn into a flame graph.
+
+Numbers are per process: under gunicorn every worker keeps its own, and a
+scrape sees whichever worker answers it.
+"""
+import collections
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import Response, g, has_request_context, jsonify, request
+
+# histogram upper bounds in seconds
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_registry = []
+_collectors = []
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = collections.defaultdict(float)
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] += amount
+
+    def lines(self):
+        for labels, value in sorted(self._values.items()):
+            yield f"{self.name}{_labels(self.labelnames, labels)} {value:g}"
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> [count per bucket (+inf last), sum]
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value, *labels):
+        # first bucket whose bound is >= value; the last slot is +Inf
+        slot = next((i for i, bound in enumerate(self.buckets) if value <= bound), len(self.buckets))
+        with self._lock:
+            counts = self._values.setdefault(labels, [[0] * (len(self.buckets) + 1), 0.0])
+            counts[0][slot] += 1
+            counts[1] += value
+
+    def lines(self):
+        for labels, (counts, total) in sorted(self._values.items()):
+            cumulative = 0
+            for bound, n in zip(self.buckets + ("+Inf",), counts):
+                cumulative += n
+                yield f"{self.name}_bucket{_labels(self.labelnames, labels, [('le', bound)])} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.labelnames, labels)} {total:.6f}"
+            yield f"{self.name}_count{_labels(self.labelnames, labels)} {cumulative}"
+
+
+REQUESTS = Counter("tnea_requests_total", "HTTP requests served", ["endpoint", "method", "status"])
+REQUEST_SECONDS = Histogram("tnea_request_seconds", "HTTP request latency", ["endpoint", "method"])
+SPAN_SECONDS = Histogram("tnea_span_seconds", "Time spent in instrumented code sections", ["span"])
+
+
+@contextmanager
+def span(name):
+    """Time a block into tnea_span_seconds (and Server-Timing, inside a request)."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        SPAN_SECONDS.observe(elapsed, name)
+        if has_request_context():
+            g.setdefault("spans", []).append((name, elapsed))
+
+
+def register_collector(collect):
+    """collect() -> [(name, help, kind, [(labels_dict, value)])], called on every scrape."""
+    _collectors.append(collect)
+
+
+def render():
+    out = []
+    for metric in _registry:
+        out += [f"# HELP {metric.name} {metric.help}", f"# TYPE {metric.name} {metric.kind}"]
+        out += list(metric.lines())
+    for collect in _collectors:
+        for name, help_text, kind, samples in collect():
+            out += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+            for labels, value in samples:
+                out.append(f"{name}{_labels(labels, labels.values())} {value:g}")
+    return "\n".join(out) + "\n"
+
+
+def _cache_metrics():
+    from cutoff import dataset_stats
+    from regional import map_cache
+    from response_cache import response_cache
+
+    caches = {"responses": response_cache.stats(), "regional_map": map_cache.stats()}
+    dataset = dataset_stats()
+    ratio = []
+    for cache, stats in caches.items():
+        total = stats["hits"] + stats["misses"]
+        ratio.append(({"cache": cache}, stats["hits"] / total if total else 0.0))
+    return [
+        ("tnea_response_cache_hits_total", "Responses served from the response cache", "counter",
+         [({"cache": cache}, stats["hits"]) for cache, stats in caches.items()]),
+        ("tnea_response_cache_misses_total", "Responses rendered because they were not cached", "counter",
+         [({"cache": cache}, stats["misses"]) for cache, stats in caches.items()]),
+        ("tnea_response_cache_not_modified_total", "304 responses to If-None-Match", "counter",
+         [({"cache": cache}, stats["not_modified"]) for cache, stats in caches.items()]),
+        ("tnea_response_cache_hit_ratio", "Hits / (hits + misses) since start", "gauge", ratio),
+        ("tnea_dataset_loads_total", "Dataset loads, by kind", "counter", [
+            ({"kind": "hit"}, dataset["hits"]),
+            ({"kind": "full"}, dataset["misses"]),
+            ({"kind": "incremental"}, dataset["incremental_loads"]),
+        ]),
+        ("tnea_dataset_rows", "Rows in the loaded dataset", "gauge", [({}, dataset["rows"])]),
+    ]
+
+
+# ---- sampling profiler ----
+
+class SamplingProfiler:
+    """Samples every other thread's stack from a background thread.
+
+    Stacks are aggregated by function, in the folded format ("a;b;c count")
+    read by flamegraph.pl and speedscope.
+    """
+
+    def __init__(self):
+        self.stacks = collections.Counter()
+        self.samples = 0
+        self.interval = None
+        self.started_at = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, interval=0.005, seconds=60):
+        if self.running:
+            return False
+        self.stacks = collections.Counter()
+        self.samples = 0
+        self.interval = interval
+        self.started_at = time.time()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(interval, seconds), daemon=True,
+                                        name="sampling-profiler")
+        self._thread.start()
+        return True
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self, interval, seconds):
+        own = threading.get_ident()
+        deadline = time.monotonic() + seconds
+        while not self._stop.wait(interval) and time.monotonic() < deadline:
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def folded(self):
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def status(self):
+        return {"running": self.running, "samples": self.samples, "interval": self.interval,
+                "started_at": self.started_at, "stacks": len(self.stacks)}
+
+
+profiler = SamplingProfiler()
+
+
+def _profiler_allowed():
+    token = os.environ.get("TNEA_DEBUG_TOKEN")
+    return bool(token) and request.headers.get("X-Debug-Token") == token
+
+
+def init_app(app):
+    register_collector(_cache_metrics)
+
+    @app.before_request
+    def _start_timer():
+        g.request_start = time.perf_counter()
+
+    @app.after_request
+    def _record_request(response):
+        if "request_start" not in g:
+            return response
+        elapsed = time.perf_counter() - g.request_start
+        endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+        REQUESTS.inc(endpoint, request.method, str(response.status_code))
+        REQUEST_SECONDS.observe(elapsed, endpoint, request.method)
+        timings = [f"{name};dur={seconds * 1000:.2f}" for name, seconds in g.get("spans", [])]
+        timings.append(f"total;dur={elapsed * 1000:.2f}")
+        response.headers["Server-Timing"] = ", ".join(timings)
+        return response
+
+    @app.route("/metrics")
+    def metrics():
+        return Response(render(), mimetype="text/plain; version=0.0.4")
+
+    @app.route("/debug/profiler", methods=["GET", "POST"])
+    def debug_profiler():
+        # e.g. curl -X POST -H "X-Debug-Token: $T" ".../debug/profiler?action=start&seconds=30"
+        #      curl -H "X-Debug-Token: $T" ".../debug/profiler?format=folded" > out.folded
+        if not _profiler_allowed():
+            return jsonify({"error": "not found"}), 404
+        if request.method == "POST":
+            action = request.args.get("action", "start")
+            if action == "start":
+                try:
+                    interval = float(request.args.get("interval", 0.005))
+                    seconds = float(request.args.get("seconds", 60))
+                except ValueError:
+                    return jsonify({"error": "interval and seconds must be numbers"}), 400
+                if not profiler.start(max(interval, 0.001), min(seconds, 600)):
+                    return jsonify({"error": "profiler is already running"}), 409
+            elif action == "stop":
+                profiler.stop()
+            else:
+                return jsonify({"error": "action must be start or stop"}), 400
+            return jsonify(profiler.status())
+        if request.args.get("format") == "folded":
+            return Response(profiler.folded(), mimetype="text/plain")
+        return jsonify(profiler.status())
+
+    if os.environ.get("TNEA_PROFILE") == "1":
+        profiler.start()
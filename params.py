@@ -0,0 +1,79 @@
+"""Query-string arguments shared by the /cutoff endpoints.
+
+query, export, predict, rounds, simulate and sketch all read their numbers,
+limits and filter values through here, so a bad value gets the same 400
+(ArgumentError) and the same message whichever endpoint it was sent to.
+"""
+import math
+
+from districts import district_key
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 500
+
+
+class ArgumentError(ValueError):
+    """A query argument the endpoint cannot use; the routes answer it with a 400."""
+
+
+def normalise(value):
+    # "cs " -> "CS", "0005" -> "5", 2025 -> "2025" so query values match however the CSV spelled them
+    text = str(value).strip().upper()
+    return str(int(text)) if text.isdigit() else text
+
+
+def match_key(column, value):
+    """What a filter value and a stored value of `column` are compared by.
+
+    DISTRICT holds canonical names (canonical.py), so it compares by
+    districts.district_key: ?district=tirupur finds TIRUPPUR and "THE
+    NILGIRIS" finds NILGIRIS, as before the names were canonicalised.
+    Everything else compares normalise()d.
+    """
+    if column == "DISTRICT":
+        return district_key(value) or normalise(value)
+    return normalise(value)
+
+
+def _show(value):
+    return f"{value:,.0f}" if float(value).is_integer() else f"{value:g}"
+
+
+def number(args, name, cast=float, default=None, lo=None, hi=None):
+    """args[name] as `cast`, or `default` when it is missing or empty.
+
+    Anything that does not parse, is not finite (nan, inf) or falls outside
+    lo..hi raises ArgumentError.
+    """
+    raw = args.get(name)
+    if raw is None or str(raw).strip() == "":
+        return default
+    kind = "an integer" if cast is int else "a number"
+    try:
+        value = cast(raw)
+    except (TypeError, ValueError):
+        raise ArgumentError(f"{name} must be {kind}")
+    if not math.isfinite(value):
+        raise ArgumentError(f"{name} must be a finite number")
+    if (lo is not None and value < lo) or (hi is not None and value > hi):
+        if hi is None:
+            raise ArgumentError(f"{name} must be at least {_show(lo)}")
+        if lo is None:
+            raise ArgumentError(f"{name} must be at most {_show(hi)}")
+        raise ArgumentError(f"{name} must be between {_show(lo)} and {_show(hi)}")
+    return value
+
+
+def limit(args, default=DEFAULT_LIMIT, maximum=MAX_LIMIT):
+    """?limit= (an integer), clamped to 1..maximum."""
+    return min(max(number(args, "limit", int, default), 1), maximum)
+
+
+def page(args, pages):
+    """?page= (an integer), clamped to 1..pages."""
+    return min(max(number(args, "page", int, 1), 1), pages)
+
+
+def comma_list(args, name):
+    """Comma-separated ?name=a,b values, stripped and without empties."""
+    return [v.strip() for v in (args.get(name) or "").split(",") if v.strip()]
@@ -0,0 +1,138 @@
+"""Background rebuild of every cached payload when the dataset changes.
+
+Without this, the first request after a data refresh notices the new file,
+reloads it and renders its endpoint inline. Once init_app() has started the
+scheduler, requests never do that; instead, every TNEA_REFRESH_SECONDS a
+background thread:
+1. stages the version on disk next to the live one (DatasetCache.stage);
+2. pins itself to it and rebuilds the indexes and renders every URL in
+   app.PRELOAD_URLS through the test client - the rendered bodies land in the
+   response caches under the new version, so live requests never see them;
+3. publishes it with one reference swap (DatasetCache.publish).
+
+Requests keep reading the previous, complete snapshot until step 3 and the
+fully warmed one after it, without taking any lock.
+
+Under gunicorn the thread is started per worker (post_fork in
+gunicorn.conf.py), since threads do not survive the fork; each worker
+rebuilds its own copy. GET /cutoff/snapshot-status reports the live version
+and its age.
+"""
+import threading
+import time
+import traceback
+
+from flask import jsonify
+
+from metrics import register_collector, span
+
+DEFAULT_INTERVAL = 30
+
+
+class Precomputer:
+    def __init__(self, dataset, app=None, urls=(), interval=DEFAULT_INTERVAL):
+        self.dataset = dataset
+        self.app = app
+        self.urls = list(urls)
+        self.interval = interval
+        self.published_at = None
+        self.last_check = None
+        self.last_build_seconds = None
+        self.last_error = None
+        self.builds = 0
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()  # one refresh at a time
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def warm(self):
+        """Build the derived indexes and render every URL for the current (or pinned) version."""
+        from cutoff import preload
+        preload()
+        with self.app.test_client() as client:
+            for url in self.urls:
+                response = client.get(url)
+                if response.status_code != 200:
+                    raise RuntimeError(f"prerendering {url} returned {response.status_code}")
+
+    def refresh(self):
+        """Stage, warm and publish the version on disk; returns True if a new one went live."""
+        with self._lock:
+            self.last_check = time.time()
+            state = self.dataset.stage()
+            if state is None:
+                return False
+            start = time.perf_counter()
+            with span("precompute"), self.dataset.pinned(state):
+                self.warm()
+            self.dataset.publish(state)
+            self.last_build_seconds = time.perf_counter() - start
+            self.published_at = time.time()
+            self.builds += 1
+            return True
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.refresh()
+                self.last_error = None
+            except Exception as e:
+                # keep serving the last good snapshot and try again next tick
+                self.last_error = f"{type(e).__name__}: {e}"
+                traceback.print_exc()
+
+    def start(self):
+        if self.running:
+            return
+        # from now on only publish() moves requests to a new version
+        self.dataset.auto_reload = False
+        if self.published_at is None:
+            self.refresh()
+            self.published_at = self.published_at or time.time()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True, name="precompute")
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.dataset.auto_reload = True
+
+    def status(self):
+        now = time.time()
+        return {
+            "running": self.running,
+            "interval": self.interval,
+            "version": self.dataset.version,
+            "published_at": self.published_at,
+            "age_seconds": None if self.published_at is None else round(now - self.published_at, 1),
+            "last_check": self.last_check,
+            "last_build_seconds": None if self.last_build_seconds is None else round(self.last_build_seconds, 3),
+            "builds": self.builds,
+            "last_error": self.last_error,
+        }
+
+    def _metrics(self):
+        status = self.status()
+        return [
+            ("tnea_snapshot_age_seconds", "Seconds since the live dataset snapshot was published", "gauge",
+             [({}, status["age_seconds"] or 0)]),
+            ("tnea_snapshot_builds_total", "Snapshots built and published in the background", "counter",
+             [({}, status["builds"])]),
+        ]
+
+
+def init_app(app, dataset, urls, interval=DEFAULT_INTERVAL):
+    """Attach a (not yet started) Precomputer to `app` and add /cutoff/snapshot-status."""
+    precomputer = Precomputer(dataset, app, urls, interval)
+    register_collector(precomputer._metrics)
+
+    @app.route("/cutoff/snapshot-status")
+    def snapshot_status():
+        return jsonify(precomputer.status())
+
+    return precomputer
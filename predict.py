@@ -0,0 +1,158 @@
+"""Closing-mark lookup for "which colleges can I get with mark X" (/cutoff/predict).
+
+CutoffIndex is built once per dataset version (cutoff.load_cutoff_index). All
+rows are sorted by (YEAR, ROUND, COLLEGECODE, BRANCHCODE, ALLOTCATEGORY,
+AGGRMARK), so each group's marks are a contiguous sorted slice. Per group we
+keep the closing (lowest allotted) and opening marks and P10/P50/P90; per
+category the groups are also kept sorted by closing mark, so a query is a
+couple of np.searchsorted calls.
+"""
+import numpy as np
+import pandas as pd
+
+from cube import MAX_MARK, mark_values
+from params import ArgumentError, comma_list, limit as limit_arg, match_key, number
+
+GROUP_KEYS = ["YEAR", "ROUND", "COLLEGECODE", "BRANCHCODE", "ALLOTCATEGORY"]
+INFO_COLUMNS = ["COLLENAME", "BRANCHNAME", "DISTRICT", "COLLEGETYPE"]
+PERCENTILES = {"p10": 0.10, "p50": 0.50, "p90": 0.90}
+
+# seats a student of each community may compete for (open competition is open to all;
+# SCA candidates are also eligible for SC seats)
+COMMUNITY_CATEGORIES = {
+    "OC": ["OC"],
+    "BC": ["OC", "BC"],
+    "BCM": ["OC", "BCM"],
+    "MBC": ["OC", "MBC"],
+    "SC": ["OC", "SC"],
+    "SCA": ["OC", "SC", "SCA"],
+    "ST": ["OC", "ST"],
+}
+# marks are out of MAX_MARK, so group_id * MARK_SPAN + mark is sorted across all groups
+# (run_prediction rejects marks outside 0..MAX_MARK, which would run into the next group)
+MARK_SPAN = 1000.0
+
+
+class CutoffIndex:
+    def __init__(self, df: pd.DataFrame):
+        df = df.dropna(subset=GROUP_KEYS)
+        codes = [pd.factorize(df[k], sort=True)[0] for k in GROUP_KEYS]
+        marks = mark_values(df["AGGRMARK"])
+        order = np.lexsort([marks] + codes[::-1])
+
+        marks = marks[order]
+        sorted_codes = np.vstack([c[order] for c in codes])
+        starts = np.flatnonzero(np.r_[True, (np.diff(sorted_codes, axis=1) != 0).any(axis=0)])
+        ends = np.r_[starts[1:], len(marks)]
+        n_groups = len(starts)
+
+        self.marks = marks
+        self.starts = starts
+        self.counts = ends - starts
+        # sorted across groups, for counting "marks <= x" in every group at once
+        group_of_row = np.repeat(np.arange(n_groups), self.counts)
+        self.keyed_marks = group_of_row * MARK_SPAN + marks
+
+        first_rows = df.iloc[order[starts]]
+        self.groups = pd.DataFrame({
+            col: first_rows[col].to_numpy()
+            for col in GROUP_KEYS + INFO_COLUMNS if col in df.columns
+        })
+        self.groups["closing"] = marks[starts]
+        self.groups["opening"] = marks[ends - 1]
+        self.groups["allotted"] = self.counts
+        for name, q in PERCENTILES.items():
+            self.groups[name] = self._quantile(q)
+
+        # text keys for filtering (params.match_key), and plain arrays for building records
+        self.lookup = {col: self._keys(col) for col in ("ALLOTCATEGORY", "BRANCHCODE", "DISTRICT") if col in self.groups}
+        self.columns = {col: self.groups[col].to_numpy() for col in self.groups.columns}
+
+        # per category: group ids ordered by closing mark
+        self.by_category = {}
+        categories = self.lookup["ALLOTCATEGORY"]
+        closing = self.groups["closing"].to_numpy()
+        for cat in np.unique(categories):
+            ids = np.flatnonzero(categories == cat)
+            ids = ids[np.argsort(closing[ids], kind="stable")]
+            self.by_category[cat] = (ids, closing[ids])
+
+    def _keys(self, col):
+        # one match_key per distinct value, not per group
+        codes, uniques = pd.factorize(self.groups[col].astype(str))
+        return np.array([match_key(col, u) for u in uniques], dtype=object)[codes]
+
+    def _quantile(self, q):
+        # linear interpolation inside each group's sorted slice (same as np.quantile)
+        pos = self.starts + q * (self.counts - 1)
+        lo = np.floor(pos).astype(np.int64)
+        hi = np.minimum(lo + 1, self.starts + self.counts - 1)
+        return self.marks[lo] + (self.marks[hi] - self.marks[lo]) * (pos - lo)
+
+    def eligible(self, mark, categories):
+        """Group ids (any category in `categories`) whose closing mark is <= mark."""
+        parts = []
+        for cat in categories:
+            if cat in self.by_category:
+                ids, closing = self.by_category[cat]
+                parts.append(ids[:np.searchsorted(closing, mark, side="right")])
+        return np.concatenate(parts) if parts else np.empty(0, dtype=np.int64)
+
+    def records(self, ids):
+        values = {col: [None if v != v else v for v in array[ids].tolist()]
+                  for col, array in self.columns.items()}
+        return [dict(zip(values, row)) for row in zip(*values.values())]
+
+    def share_at_or_below(self, ids, mark):
+        """Fraction of each group's allotted students with a mark <= `mark`."""
+        below = np.searchsorted(self.keyed_marks, ids * MARK_SPAN + mark, side="right") - self.starts[ids]
+        return below / self.counts[ids]
+
+
+def categories_for(community):
+    community = community.strip().upper()
+    return COMMUNITY_CATEGORIES.get(community, ["OC", community])
+
+
+def run_prediction(index, args):
+    mark = number(args, "mark", lo=0, hi=MAX_MARK)
+    if mark is None:
+        raise ArgumentError("mark is required")
+    community = args.get("community", "OC").strip().upper()
+    categories = categories_for(community)
+    limit = limit_arg(args)
+
+    ids = index.eligible(mark, categories)
+
+    # default to the latest year in the data; round defaults to every round
+    years = index.columns["YEAR"]
+    year = number(args, "year", int, int(years.max()) if len(years) else None)
+    keep = years[ids] == year
+    round_no = number(args, "round", int)
+    if round_no is not None:
+        keep &= index.columns["ROUND"][ids] == round_no
+    for param, col in (("branch", "BRANCHCODE"), ("district", "DISTRICT")):
+        if args.get(param) and col in index.lookup:
+            wanted = [match_key(col, v) for v in comma_list(args, param)]
+            keep &= np.isin(index.lookup[col][ids], wanted)
+    ids = ids[keep]
+
+    # most competitive seats first - the closest fits for this mark
+    ids = ids[np.argsort(-index.columns["closing"][ids], kind="stable")]
+    total = len(ids)
+    ids = ids[:limit]
+
+    results = index.records(ids)
+    shares = index.share_at_or_below(ids, mark)
+    for record, share in zip(results, shares.tolist()):
+        record["margin"] = round(mark - record["closing"], 2)
+        record["percentile_in_group"] = round(share * 100, 1)
+
+    return {
+        "mark": mark,
+        "community": community,
+        "categories": categories,
+        "year": year,
+        "total": total,
+        "results": results,
+    }
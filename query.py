@@ -0,0 +1,169 @@
+"""Indexed filtering of the allotment rows for /cutoff/query.
+
+QueryIndex is built once per dataset version (cutoff.load_query_index). For
+every filterable column it keeps a posting list - the sorted row positions
+for each distinct value - plus the row order sorted by AGGRMARK, so a request
+only intersects a few small integer arrays instead of masking the whole frame.
+"""
+import math
+
+import numpy as np
+import pandas as pd
+
+from cube import mark_values
+from params import ArgumentError, comma_list, limit as limit_arg, match_key, number, page as page_arg
+
+# query-string parameter -> column
+FILTERS = {
+    "year": "YEAR",
+    "round": "ROUND",
+    "community": "COMMUNITY",
+    "category": "ALLOTCATEGORY",
+    "college": "COLLEGECODE",
+    "branch": "BRANCHCODE",
+    "district": "DISTRICT",
+    "college_type": "COLLEGETYPE",
+}
+# filters whose values must be integers; anything else is a 400, not an empty result
+INTEGER_FILTERS = {"year", "round"}
+RESULT_COLUMNS = ["YEAR", "ROUND", "COLLEGECODE", "COLLENAME", "BRANCHCODE", "BRANCHNAME",
+                  "COMMUNITY", "ALLOTCATEGORY", "DISTRICT", "COLLEGETYPE", "AGGRMARK"]
+
+
+class QueryIndex:
+    def __init__(self, df: pd.DataFrame):
+        self.df = df
+        self.postings = {}
+        for col in FILTERS.values():
+            if col in df.columns:
+                self.postings[col] = self._posting_lists(col, df[col])
+
+        marks = mark_values(df["AGGRMARK"])
+        self.mark_order = np.argsort(marks, kind="stable")
+        self.sorted_marks = marks[self.mark_order]
+
+        # plain arrays for building result rows without going through pandas;
+        # categoricals stay as (codes, categories) instead of being materialised
+        self.columns = {}
+        for col in RESULT_COLUMNS:
+            if col not in df.columns:
+                continue
+            if isinstance(df[col].dtype, pd.CategoricalDtype):
+                categories = np.append(df[col].cat.categories.to_numpy(dtype=object), None)
+                self.columns[col] = (df[col].cat.codes.to_numpy(), categories)
+            elif col == "AGGRMARK":
+                self.columns[col] = (marks, None)
+            else:
+                self.columns[col] = (df[col].to_numpy(), None)
+
+    def rows(self, positions):
+        """Result records for the given row positions (NaN -> None)."""
+        values = {}
+        for col, (array, categories) in self.columns.items():
+            # code -1 (missing) picks the trailing None in categories
+            picked = categories[array[positions]] if categories is not None else array[positions]
+            values[col] = [None if v != v else v for v in picked.tolist()]
+        return [dict(zip(values, row)) for row in zip(*values.values())]
+
+    @staticmethod
+    def _posting_lists(col, column):
+        codes, uniques = pd.factorize(column)
+        order = np.argsort(codes, kind="stable")  # stable -> positions stay sorted
+        bounds = np.cumsum(np.bincount(codes[codes >= 0], minlength=len(uniques)))
+        start = int((codes < 0).sum())  # missing values sort first (code -1)
+        lists = {}
+        for value, end in zip(uniques, bounds + start):
+            lists.setdefault(match_key(col, value), []).append(order[start:end])
+            start = end
+        return {key: parts[0] if len(parts) == 1 else np.sort(np.concatenate(parts))
+                for key, parts in lists.items()}
+
+    def select(self, filters, min_mark=None, max_mark=None):
+        """Sorted row positions matching every filter ({column: [values]}) and the mark range."""
+        candidates = []
+        for col, values in filters.items():
+            lists = self.postings[col]
+            parts = [lists[v] for v in (match_key(col, v) for v in values) if v in lists]
+            if not parts:
+                return np.empty(0, dtype=np.int64)
+            candidates.append(parts[0] if len(parts) == 1 else np.sort(np.concatenate(parts)))
+
+        if min_mark is not None or max_mark is not None:
+            lo = 0 if min_mark is None else np.searchsorted(self.sorted_marks, min_mark, side="left")
+            hi = len(self.sorted_marks) if max_mark is None else np.searchsorted(self.sorted_marks, max_mark, side="right")
+            candidates.append(np.sort(self.mark_order[lo:hi]))
+
+        if not candidates:
+            return np.arange(len(self.df))
+        # intersect smallest first so every step works on the fewest positions
+        candidates.sort(key=len)
+        positions = candidates[0]
+        for other in candidates[1:]:
+            positions = np.intersect1d(positions, other, assume_unique=True)
+        return positions
+
+
+def filter_values(args, param):
+    """The comma-separated values of filter `param`, checked where they must be integers."""
+    wanted = comma_list(args, param)
+    if param in INTEGER_FILTERS:
+        for value in wanted:
+            try:
+                int(value)
+            except ValueError:
+                raise ArgumentError(f"{param} must be a comma-separated list of integers")
+    return wanted
+
+
+def parse_filters(index, args):
+    """{column: [values]} from query args; comma-separated values are OR-ed."""
+    filters = {}
+    for param, col in FILTERS.items():
+        wanted = filter_values(args, param)
+        if wanted and col in index.postings:
+            filters[col] = wanted
+    return filters, number(args, "min_mark"), number(args, "max_mark")
+
+
+def sort_positions(index, positions, sort):
+    # "-AGGRMARK" = descending; ties keep row order, missing values go last
+    descending = sort.startswith("-")
+    col = sort.lstrip("-+").upper()
+    if col not in index.df.columns:
+        raise ArgumentError(f"cannot sort by {col}")
+    if col == "AGGRMARK" and len(positions) > len(index.mark_order) // 16:
+        # big result: walk the presorted mark order instead of sorting again
+        selected = np.zeros(len(index.mark_order), dtype=bool)
+        selected[positions] = True
+        ordered = index.mark_order[selected[index.mark_order]]
+        return ordered[::-1] if descending else ordered
+    ranks, _ = pd.factorize(index.df[col].to_numpy()[positions], sort=True)
+    missing = ranks < 0
+    if descending:
+        ranks = -ranks
+        ranks[missing] = 1
+    else:
+        ranks[missing] = len(ranks)
+    return positions[np.argsort(ranks, kind="stable")]
+
+
+def run_query(index, args):
+    filters, min_mark, max_mark = parse_filters(index, args)
+    positions = index.select(filters, min_mark, max_mark)
+
+    sort = args.get("sort", "-AGGRMARK")
+    limit = limit_arg(args)
+    pages = max(1, math.ceil(len(positions) / limit))
+    page = page_arg(args, pages)
+
+    ordered = sort_positions(index, positions, sort)
+    window = ordered[(page - 1) * limit: page * limit]
+
+    return {
+        "total": int(len(positions)),
+        "page": page,
+        "pages": pages,
+        "limit": limit,
+        "sort": sort,
+        "results": index.rows(window),
+    }
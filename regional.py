@@ -1,12 +1,20 @@
 import pandas as pd
 import numpy as np
 from flask import Blueprint, jsonify
-from cutoff import load_data  # your existing loader
+from cutoff import available_years, dataset_version, load_cube  # aggregate cube of the cached dataset
+from cube import rollup
+from trends import pair_label, pct_change, trend_metrics, year_pairs
 import traceback
+from flask import request
+from districts import DistrictIndex, feature_name
+from metrics import span
+from response_cache import ResponseCache, cached_response
+from serialize import json_response
 
 regional_bp = Blueprint("regional", __name__)
 
-# Hardcoded mapping: district → zone
+# Hardcoded mapping: district → zone. Its names (with URBAN_RURAL) are also what
+# canonical.py resolves the data's district spellings to
 DISTRICT_ZONE = {
     "CHENNAI": "NORTH", "THIRUVALLUR": "NORTH", "KANCHEEPURAM": "NORTH",
     "VELLORE": "NORTH", "TIRUPATHUR": "NORTH", "RANIPET": "NORTH",
@@ -42,135 +50,222 @@ URBAN_RURAL = {
     "MAYILADUTHURAI": "URBAN", "DINDIGUL": "URBAN", "KARUR": "URBAN",
     # All other districts will implicitly be considered RURAL if not listed here.
 }
+def district_lookup(districts, mapping, default):
+    """Map a categorical DISTRICT column through `mapping` once per category.
+
+    The result is categorical too: each row just gets the code of its
+    district's label, so nothing is looked up (or stored as a string) per row.
+    """
+    districts = districts.astype("category")
+    labels = pd.Index(districts.cat.categories).map(mapping).fillna(default)
+    lookup = pd.Categorical(labels)
+    categories = lookup.categories
+    if default not in categories:
+        categories = categories.append(pd.Index([default]))
+    # code -1 (missing district) picks the extra trailing default entry
+    codes = np.append(lookup.codes, categories.get_loc(default))
+    return pd.Series(pd.Categorical.from_codes(codes[districts.cat.codes.to_numpy()], categories),
+                     index=districts.index)
+
+def regional_partials(cube):
+    """count/sum/sumsq/min/max per district, college type and year, tagged with ZONE and AREA_TYPE.
+
+    The measures are additive, so every regional level is an exact rollup of
+    these few hundred rows; the allotment rows (and the cube) are scanned once.
+    """
+    keys = [k for k in ("DISTRICT", "COLLEGETYPE", "YEAR") if k in cube.columns]
+    # rows without a district or year never count; a missing college type
+    # still counts towards its district, zone and area type
+    cube = cube.dropna(subset=["DISTRICT", "YEAR"])
+    partials = (
+        cube.groupby(keys, observed=True, dropna=False, sort=False)
+            .agg({"count": "sum", "sum": "sum", "sumsq": "sum", "min": "min", "max": "max"})
+            .reset_index()
+    )
+    return partials.assign(ZONE=district_lookup(partials["DISTRICT"], DISTRICT_ZONE, "UNKNOWN"),
+                           AREA_TYPE=district_lookup(partials["DISTRICT"], URBAN_RURAL, "RURAL"))
+
+def level_averages(cube, keys, years):
+    """One row per `keys` value: avg_<year> columns plus first->last change, volatility and trend."""
+    keys = [keys] if isinstance(keys, str) else list(keys)
+    avg = (
+        rollup(cube, keys + ["YEAR"])
+          .pivot(index=keys, columns="YEAR", values="mean")
+          .reindex(columns=years)
+    )
+    year_cols = [f"avg_{y}" for y in years]
+    avg.columns = year_cols
+    avg = avg.reset_index()
+    # keys may be categorical; plain strings let fillna(0) work later on
+    for key in keys:
+        avg[key] = avg[key].astype(object)
+
+    metrics = trend_metrics(avg, year_cols, stable_label="stable")
+    avg[f"avg_change_{pair_label(years[0], years[-1])}"] = metrics["Net_Change"]
+    avg["volatility"] = metrics["Volatility"]
+    avg["trend"] = metrics["Trend"]
+    return avg
+
+def regional_pct_change(start, end):
+    # a zero start year counts as +1000% if the end year moved, else 0%
+    start = np.asarray(start, dtype="float64")
+    end = np.asarray(end, dtype="float64")
+    return np.where(start == 0, np.where(end != 0, 1000.0, 0.0), pct_change(start, end))
+
 @regional_bp.route("/cutoff/regional-data")
+@cached_response
 def regional_data():
     try:
-        df = load_data()
+        cube = load_cube()
 
-        if "DISTRICT" not in df.columns or "YEAR" not in df.columns or "AGGRMARK" not in df.columns:
+        if "DISTRICT" not in cube.columns or "YEAR" not in cube.columns:
             return jsonify({"error": "Essential columns (DISTRICT, YEAR, AGGRMARK) missing"}), 400
 
-        all_years = [2023, 2024, 2025]
+        all_years = available_years(cube)
+
+        # --- District x college type x year partials; every level below rolls these up ---
+        with span("regional.partials"):
+            partials = regional_partials(cube)
 
         # --- District-level analysis ---
-        district_avg = (
-            df.groupby(["DISTRICT", "YEAR"])["AGGRMARK"]
-              .mean()
-              .reset_index(name="avg_cutoff")
-              .pivot(index="DISTRICT", columns="YEAR", values="avg_cutoff")
-              .reset_index()
-        )
-        for year in all_years:
-            if year not in district_avg.columns:
-                district_avg[year] = np.nan
-        district_avg = district_avg[['DISTRICT'] + all_years]
-        district_avg = district_avg.rename(columns=lambda x: f"avg_{x}" if isinstance(x, int) else x)
-
-        # --- Change & percentage change metrics ---
-        district_avg["avg_change_23_24"] = district_avg["avg_2024"] - district_avg["avg_2023"]
-        district_avg["avg_change_24_25"] = district_avg["avg_2025"] - district_avg["avg_2024"]
-        district_avg["avg_change_23_25"] = district_avg["avg_2025"] - district_avg["avg_2023"]
-
-        for col_name, start_year, end_year in [
-            ("pct_change_23_24", "avg_2023", "avg_2024"),
-            ("pct_change_24_25", "avg_2024", "avg_2025"),
-            ("pct_change_23_25", "avg_2023", "avg_2025")
-        ]:
-            district_avg[col_name] = np.where(
-                district_avg[start_year] != 0,
-                ((district_avg[end_year] - district_avg[start_year]) / district_avg[start_year]) * 100,
-                0
-            )
-            district_avg.loc[(district_avg[start_year] == 0) & (district_avg[end_year] != 0), col_name] = 1000.0
-
-        # --- Volatility & Trend ---
-        district_avg["volatility"] = district_avg[[f"avg_{y}" for y in all_years]].std(axis=1)
-        def trend(row):
-            if row["avg_2023"] < row["avg_2024"] < row["avg_2025"]:
-                return "increasing"
-            elif row["avg_2023"] > row["avg_2024"] > row["avg_2025"]:
-                return "decreasing"
-            else:
-                return "stable"
-        district_avg["trend"] = district_avg.apply(trend, axis=1)
-
-        # Add Zone and Urban/Rural info
-        district_avg["ZONE"] = district_avg["DISTRICT"].map(DISTRICT_ZONE).fillna("UNKNOWN")
-        district_avg["AREA_TYPE"] = district_avg["DISTRICT"].map(URBAN_RURAL).fillna("RURAL")
-
-        # --- Zone-level analysis ---
-        df["ZONE"] = df["DISTRICT"].map(DISTRICT_ZONE).fillna("UNKNOWN")
-        zone_avg = (
-            df.groupby(["ZONE", "YEAR"])["AGGRMARK"]
-              .mean()
-              .reset_index(name="avg_cutoff")
-              .pivot(index="ZONE", columns="YEAR", values="avg_cutoff")
-              .reset_index()
-        )
-        for year in all_years:
-            if year not in zone_avg.columns:
-                zone_avg[year] = np.nan
-        zone_avg = zone_avg[['ZONE'] + all_years]
-        zone_avg = zone_avg.rename(columns=lambda x: f"avg_{x}" if isinstance(x, int) else x)
-        zone_avg["avg_change_23_25"] = zone_avg["avg_2025"] - zone_avg["avg_2023"]
-        zone_avg["volatility"] = zone_avg[[f"avg_{y}" for y in all_years]].std(axis=1)
-        def zone_trend(row):
-            if row["avg_2023"] < row["avg_2024"] < row["avg_2025"]:
-                return "increasing"
-            elif row["avg_2023"] > row["avg_2024"] > row["avg_2025"]:
-                return "decreasing"
-            else:
-                return "stable"
-        zone_avg["trend"] = zone_avg.apply(zone_trend, axis=1)
-
-        # --- Area Type analysis ---
-        df["AREA_TYPE"] = df["DISTRICT"].map(URBAN_RURAL).fillna("RURAL")
-        area_type_avg = (
-            df.groupby(["AREA_TYPE", "YEAR"])["AGGRMARK"]
-              .mean()
-              .reset_index(name="avg_cutoff")
-              .pivot(index="AREA_TYPE", columns="YEAR", values="avg_cutoff")
-              .reset_index()
-        )
-        for year in all_years:
-            if year not in area_type_avg.columns:
-                area_type_avg[year] = np.nan
-        area_type_avg = area_type_avg[['AREA_TYPE'] + all_years]
-        area_type_avg = area_type_avg.rename(columns=lambda x: f"avg_{x}" if isinstance(x, int) else x)
-        area_type_avg["avg_change_23_25"] = area_type_avg["avg_2025"] - area_type_avg["avg_2023"]
-        area_type_avg["volatility"] = area_type_avg[[f"avg_{y}" for y in all_years]].std(axis=1)
-        def area_trend(row):
-            if row["avg_2023"] < row["avg_2024"] < row["avg_2025"]:
-                return "increasing"
-            elif row["avg_2023"] > row["avg_2024"] > row["avg_2025"]:
-                return "decreasing"
+        with span("regional.district"):
+            district_avg = level_averages(partials, "DISTRICT", all_years)
+
+            # --- Change & percentage change metrics (consecutive years and first -> last) ---
+            for start, end in year_pairs(all_years):
+                label = pair_label(start, end)
+                district_avg[f"avg_change_{label}"] = district_avg[f"avg_{end}"] - district_avg[f"avg_{start}"]
+                district_avg[f"pct_change_{label}"] = regional_pct_change(district_avg[f"avg_{start}"], district_avg[f"avg_{end}"])
+
+            # Add Zone and Urban/Rural info
+            district_avg["ZONE"] = district_avg["DISTRICT"].map(DISTRICT_ZONE).fillna("UNKNOWN")
+            district_avg["AREA_TYPE"] = district_avg["DISTRICT"].map(URBAN_RURAL).fillna("RURAL")
+
+        # --- Zone, area type and college type x zone levels ---
+        with span("regional.levels"):
+            zone_avg = level_averages(partials, "ZONE", all_years)
+            area_type_avg = level_averages(partials, "AREA_TYPE", all_years)
+            if "COLLEGETYPE" in partials.columns:
+                college_type_zone_avg = level_averages(partials, ["COLLEGETYPE", "ZONE"], all_years)
             else:
-                return "stable"
-        area_type_avg["trend"] = area_type_avg.apply(area_trend, axis=1)
+                college_type_zone_avg = pd.DataFrame(columns=["COLLEGETYPE", "ZONE"])
 
         # --- Top districts by allotment ---
-        district_counts = (
-            df.groupby("DISTRICT")
-              .size()
-              .reset_index(name="allotment_count")
-              .sort_values("allotment_count", ascending=False)
-              .head(10)
-        )
+        with span("regional.top_districts"):
+            district_counts = (
+                rollup(partials, ["DISTRICT"])[["DISTRICT", "count"]]
+                  .rename(columns={"count": "allotment_count"})
+                  .sort_values("allotment_count", ascending=False)
+                  .head(10)
+            )
 
         # Fill NaN with 0 for consistency
         district_avg = district_avg.fillna(0)
         zone_avg = zone_avg.fillna(0)
         area_type_avg = area_type_avg.fillna(0)
+        college_type_zone_avg = college_type_zone_avg.fillna(0)
 
         # --- Return everything with NEW trend & volatility fields ---
-        return jsonify({
-            "district_data": district_avg.to_dict(orient="records"),
-            "zone_data": zone_avg.to_dict(orient="records"),
-            "area_type_data": area_type_avg.to_dict(orient="records"),
-            "top_district_counts": district_counts.to_dict(orient="records")
-        })
+        with span("serialize"):
+            return json_response({
+                "district_data": district_avg,
+                "zone_data": zone_avg,
+                "area_type_data": area_type_avg,
+                "college_type_zone_data": college_type_zone_avg,
+                "top_district_counts": district_counts
+            })
 
     except Exception as e:
         print("ERROR in /cutoff/regional-data:", e)
         traceback.print_exc()
         return jsonify({"error": str(e)}), 500
+
+
+# ---- /cutoff/regional-map: district shapes with the year's stats joined in ----
+MAP_NAME = "districts"
+
+def _map_version():
+    from geo import geo_version
+    return (dataset_version(), geo_version(MAP_NAME))
+
+# depends on both the allotment data and the boundary file
+map_cache = ResponseCache(_map_version)
+
+def district_year_stats(cube, index):
+    """rollup() per canonical district and year, so spelling variants are counted together."""
+    keyed = cube.assign(DISTRICT_KEY=district_lookup(cube["DISTRICT"], index.canonical, "UNKNOWN"))
+    return rollup(keyed, ["DISTRICT_KEY", "YEAR"]).set_index(["DISTRICT_KEY", "YEAR"])
+
+def _mark(value):
+    return None if value != value else round(float(value), 2)
+
+@regional_bp.route("/cutoff/regional-map")
+@map_cache.cached
+def regional_map():
+    # e.g. /cutoff/regional-map?year=2025&level=low&format=topojson
+    from geo import FORMATS, LEVELS, load_level, load_topology
+    level = request.args.get("level", "low")
+    fmt = request.args.get("format", "geojson")
+    if level not in LEVELS:
+        return jsonify({"error": f"level must be one of {', '.join(LEVELS)}"}), 400
+    if fmt not in FORMATS:
+        return jsonify({"error": f"format must be one of {', '.join(FORMATS)}"}), 400
+
+    cube = load_cube()
+    years = available_years(cube)
+    try:
+        year = int(request.args.get("year", years[-1] if years else 0))
+    except ValueError:
+        return jsonify({"error": "year must be an integer"}), 400
+    if year not in years:
+        return jsonify({"error": f"no data for year {year}"}), 400
+    previous = years[years.index(year) - 1] if years.index(year) > 0 else None
+
+    topology = load_topology(MAP_NAME)
+    # features without a district name (e.g. a state outline) cannot be labelled or joined
+    features = [(i, name) for i, name in enumerate(feature_name(props) for props in topology.properties) if name]
+    if not features:
+        from geo import GEO_SOURCES
+        message = f"the boundary file {GEO_SOURCES[MAP_NAME]} has no district features"
+        print("ERROR in /cutoff/regional-map:", message)
+        return jsonify({"error": message}), 404
+    names = [name for _, name in features]
+    # known spellings first, so canonical names are the DISTRICT_ZONE ones
+    index = DistrictIndex(DISTRICT_ZONE, URBAN_RURAL, cube["DISTRICT"].cat.categories, names)
+    zone = {index.canonical(d): z for d, z in DISTRICT_ZONE.items()}
+    area_type = {index.canonical(d): a for d, a in URBAN_RURAL.items()}
+    with span("regional_map.join"):
+        stats = district_year_stats(cube, index)
+
+    properties = []
+    for name in names:
+        district = index.canonical(name)
+        props = {
+            "district": district or name,
+            "zone": zone.get(district, "UNKNOWN"),
+            "area_type": area_type.get(district, "RURAL"),
+            "allotments": 0,
+            "avg_mark": None,
+            "closing_mark": None,
+            "change": None,
+        }
+        if (district, year) in stats.index:
+            row = stats.loc[(district, year)]
+            props.update(allotments=int(row["count"]), avg_mark=_mark(row["mean"]), closing_mark=_mark(row["min"]))
+            if previous is not None and (district, previous) in stats.index:
+                props["change"] = _mark(row["mean"] - stats.loc[(district, previous), "mean"])
+        properties.append(props)
+
+    arcs, geometries = load_level(MAP_NAME, level)
+    geometries = [geometries[i] for i, _ in features]
+    with span("regional_map.encode"):
+        if fmt == "topojson":
+            doc = topology.to_topojson(arcs, geometries, MAP_NAME, properties)
+        else:
+            doc = topology.to_geojson(arcs, geometries, properties)
+    on_map = {p["district"] for p in properties}
+    doc["year"] = year
+    # districts with allotments that have no shape on the map (spelling nobody maps yet)
+    doc["unmatched"] = sorted({d for d, y in stats.index if y == year} - on_map - {"UNKNOWN"})
+    with span("serialize"):
+        return json_response(doc)
@@ -0,0 +1,151 @@
+"""In-memory cache of serialised JSON responses, keyed by dataset version.
+
+Wrap a view with @cached_response and its body is rendered once per dataset
+version. The body is stored with gzip (and brotli, when the `brotli` package is
+installed) variants and a strong ETag, so browsers can revalidate with
+If-None-Match and get a 304 back.
+"""
+import gzip
+import hashlib
+import threading
+from collections import namedtuple
+from functools import wraps
+
+from flask import Response, request
+
+from metrics import span
+
+try:
+    import brotli
+except ImportError:  # optional - gzip is always available
+    brotli = None
+
+# only bodies at least this large are worth precompressing
+MIN_COMPRESS_BYTES = 1024
+CACHE_CONTROL = "public, max-age=60, must-revalidate"
+# for URLs that embed a content hash and so never change
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+Entry = namedtuple("Entry", "etag mimetype bodies")
+Generation = namedtuple("Generation", "version entries")
+
+
+def _encode(body, best=False):
+    # best=True spends more CPU for smaller output; meant for bodies built once
+    bodies = {"identity": body}
+    if len(body) >= MIN_COMPRESS_BYTES:
+        bodies["gzip"] = gzip.compress(body, compresslevel=9 if best else 6)
+        if brotli is not None:
+            bodies["br"] = brotli.compress(body, quality=11 if best else 5)
+    return bodies
+
+
+def make_entry(body, mimetype, best=False):
+    """Precompressed Entry for a body, ready for ResponseCache.respond()."""
+    return Entry(etag=hashlib.sha1(body).hexdigest(), mimetype=mimetype, bodies=_encode(body, best))
+
+
+def _etag_for(etag, encoding):
+    # a strong ETag must differ between content codings of the same resource
+    return etag if encoding == "identity" else f"{etag}-{encoding}"
+
+
+class ResponseCache:
+    def __init__(self, version_fn, max_entries=256, keep_generations=2):
+        self.version_fn = version_fn
+        self.max_entries = max_entries
+        # one generation per dataset version; more than one is alive while the
+        # next version is being prerendered (precompute.py) next to the current one
+        self.keep_generations = keep_generations
+        self._lock = threading.Lock()
+        self._generations = {}
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+
+    def _current_generation(self):
+        version = self.version_fn()
+        generation = self._generations.get(version)
+        if generation is None:
+            with self._lock:
+                generation = self._generations.get(version)
+                if generation is None:
+                    generation = self._generations[version] = Generation(version, {})
+                    while len(self._generations) > self.keep_generations:
+                        del self._generations[next(iter(self._generations))]
+        return generation
+
+    def store(self, generation, key, response):
+        with span("compress"):
+            entry = make_entry(response.get_data(), response.mimetype)
+        if len(generation.entries) < self.max_entries:
+            generation.entries[key] = entry
+        return entry
+
+    def lookup(self, key):
+        """Return the cached entry for key under the current version, or None."""
+        return self._current_generation().entries.get(key)
+
+    def respond(self, entry, cache_control=CACHE_CONTROL):
+        accepted = request.accept_encodings
+        encoding = "identity"
+        for candidate in ("br", "gzip"):
+            if candidate in entry.bodies and accepted[candidate]:
+                encoding = candidate
+                break
+        etag = _etag_for(entry.etag, encoding)
+
+        if request.if_none_match.contains(etag):
+            self.not_modified += 1
+            response = Response(status=304)
+        else:
+            response = Response(entry.bodies[encoding], mimetype=entry.mimetype)
+            if encoding != "identity":
+                response.headers["Content-Encoding"] = encoding
+        response.set_etag(etag)
+        response.headers["Cache-Control"] = cache_control
+        response.vary.add("Accept-Encoding")
+        return response
+
+    def cached(self, view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            key = request.full_path
+            generation = self._current_generation()
+            entry = generation.entries.get(key)
+            if entry is not None:
+                self.hits += 1
+                return self.respond(entry)
+
+            self.misses += 1
+            response = view(*args, **kwargs)
+            if not isinstance(response, Response) or response.status_code != 200:
+                return response  # errors and tuples are passed through uncached
+            return self.respond(self.store(generation, key, response))
+
+        return wrapper
+
+    def clear(self):
+        # drop every rendered body; the next request renders it again
+        with self._lock:
+            self._generations = {}
+
+    def stats(self):
+        generation = self._generations.get(self.version_fn(), Generation(None, {}))
+        return {
+            "version": generation.version,
+            "entries": len(generation.entries),
+            "generations": len(self._generations),
+            "hits": self.hits,
+            "misses": self.misses,
+            "not_modified": self.not_modified,
+        }
+
+
+def _dataset_version():
+    from cutoff import dataset_version
+    return dataset_version()
+
+
+response_cache = ResponseCache(_dataset_version)
+cached_response = response_cache.cached
@@ -0,0 +1,138 @@
+"""Round-by-round cutoff movement (/cutoff/rounds).
+
+A series is one seat pool across counselling rounds: (YEAR, COLLEGECODE,
+BRANCHCODE, ALLOTCATEGORY). RoundMovement is built once per dataset version
+(cutoff.load_round_movement) with a single argsort on the series keys, ROUND
+and AGGRMARK packed into one integer. After it every (series, round) group is a contiguous slice with
+its marks ascending, so:
+- closing / opening marks are the first / last mark of each slice;
+- seats filled is the slice length;
+- round-to-round deltas compare each group with the one before it, unless a
+  new series starts there.
+
+There is no groupby anywhere.
+"""
+import numpy as np
+import pandas as pd
+
+from cube import MARK_DECIMALS, mark_values
+from params import ArgumentError, comma_list, limit as limit_arg, normalise, number
+
+SERIES_KEYS = ["YEAR", "COLLEGECODE", "BRANCHCODE", "ALLOTCATEGORY"]
+INFO_COLUMNS = ["COLLENAME", "BRANCHNAME"]
+# ?sort= for the series list: column, ascending
+SORTS = {
+    "drop": ("closing_change", True),          # largest fall from the first to the last round first
+    "early": ("first_round_share", False),     # seats mostly gone in round 1 first
+    "allotted": ("allotted", False),
+}
+
+
+def _delta(values, starts_series):
+    # change from the previous round of the same series; NaN for a series' first round
+    out = np.empty_like(values)
+    out[0] = np.nan
+    out[1:] = values[1:] - values[:-1]
+    out[starts_series] = np.nan
+    return np.round(out, MARK_DECIMALS)
+
+
+class RoundMovement:
+    def __init__(self, df: pd.DataFrame):
+        keys = SERIES_KEYS + ["ROUND"]
+        df = df.dropna(subset=keys)
+        marks = mark_values(df["AGGRMARK"])
+        # one int64 sort key: series keys, then round, then the mark's rank
+        # (every part is a dense code, so the product stays far below 2**63)
+        key = np.zeros(len(df), dtype=np.int64)
+        for values in [df[k] for k in keys] + [pd.Series(marks)]:
+            codes, uniques = pd.factorize(values, sort=True)
+            key = key * max(len(uniques), 1) + codes
+        n_marks = max(len(np.unique(marks)), 1)
+        n_rounds = max(df["ROUND"].nunique(), 1)
+        order = np.argsort(key)
+
+        marks = marks[order]
+        group_key = key[order] // n_marks
+        # group = one (series, round); a series starts where the key above ROUND changes
+        starts = np.flatnonzero(np.r_[True, group_key[1:] != group_key[:-1]])
+        ends = np.r_[starts[1:], len(marks)]
+        series_key = group_key[starts] // n_rounds
+        new_series = np.r_[True, series_key[1:] != series_key[:-1]]
+
+        filled = ends - starts
+        closing = marks[starts]
+        opening = marks[ends - 1]
+        series_id = np.cumsum(new_series) - 1
+        first_group = np.flatnonzero(new_series)
+        rounds_per_series = np.diff(np.r_[first_group, len(starts)])
+        allotted = np.add.reduceat(filled, first_group) if len(starts) else np.zeros(0, dtype=np.int64)
+        cumulative = np.cumsum(filled)
+        cumulative = cumulative - np.r_[0, cumulative][first_group][series_id]
+
+        first_rows = df.iloc[order[starts]]
+        info = [col for col in INFO_COLUMNS if col in df.columns]
+        self.rounds = pd.DataFrame({col: first_rows[col].to_numpy() for col in keys + info})
+        self.rounds["closing"] = closing
+        self.rounds["opening"] = opening
+        self.rounds["filled"] = filled
+        self.rounds["cumulative_filled"] = cumulative
+        self.rounds["filled_share"] = np.round(cumulative / allotted[series_id], 4)
+        self.rounds["closing_change"] = _delta(closing, new_series)
+        self.rounds["opening_change"] = _delta(opening, new_series)
+
+        last_group = first_group + rounds_per_series - 1
+        self.series = self.rounds.iloc[first_group][SERIES_KEYS + info].reset_index(drop=True)
+        self.series["rounds"] = rounds_per_series
+        self.series["first_round"] = self.rounds["ROUND"].to_numpy()[first_group]
+        self.series["last_round"] = self.rounds["ROUND"].to_numpy()[last_group]
+        self.series["closing_first"] = closing[first_group]
+        self.series["closing_last"] = closing[last_group]
+        self.series["closing_change"] = np.round(closing[last_group] - closing[first_group], MARK_DECIMALS)
+        self.series["allotted"] = allotted
+        self.series["first_round_share"] = np.round(filled[first_group] / allotted, 4)
+
+        self.first_group = first_group
+        self.n_rounds = rounds_per_series
+        self.lookup = {col: np.array([normalise(v) for v in self.series[col].astype(str)], dtype=object)
+                       for col in ("COLLEGECODE", "BRANCHCODE", "ALLOTCATEGORY")}
+        self.years = self.series["YEAR"].to_numpy()
+
+    def round_rows(self, ids):
+        """Every round of the given series, in series then round order."""
+        lengths = self.n_rounds[ids]
+        offsets = np.cumsum(lengths) - lengths
+        positions = np.repeat(self.first_group[ids] - offsets, lengths) + np.arange(lengths.sum())
+        return self.rounds.iloc[positions].reset_index(drop=True)
+
+
+def run_rounds(movement, args):
+    # default to the latest year in the data
+    year = number(args, "year", int, int(movement.years.max()) if len(movement.years) else None)
+    sort = args.get("sort", "drop")
+    if sort not in SORTS:
+        raise ArgumentError(f"sort must be one of {', '.join(SORTS)}")
+    limit = limit_arg(args)
+
+    keep = movement.years == year
+    for param, col in (("college", "COLLEGECODE"), ("branch", "BRANCHCODE"), ("category", "ALLOTCATEGORY")):
+        if args.get(param):
+            # college codes are read as numbers, so ?college=0103 has to match 103
+            wanted = [normalise(v) for v in comma_list(args, param)]
+            keep &= np.isin(movement.lookup[col], wanted)
+    ids = np.flatnonzero(keep)
+
+    column, ascending = SORTS[sort]
+    values = movement.series[column].to_numpy(dtype="float64")[ids]
+    # NaN-free by construction; stable so ties keep college / branch order
+    ids = ids[np.argsort(values if ascending else -values, kind="stable")]
+    total = len(ids)
+    ids = ids[:limit]
+
+    return {
+        "year": year,
+        "sort": sort,
+        "total": total,
+        "series": movement.series.iloc[ids].reset_index(drop=True),
+        "rounds": movement.round_rows(ids),
+    }
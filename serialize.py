@@ -0,0 +1,121 @@
+"""JSON encoding for DataFrame-backed responses without building a dict per row.
+
+Frames are encoded column by column:
+- numbers are formatted by numpy in one pass (shortest round-trip repr, the
+  same text json.dumps gives);
+- text / categorical columns encode each distinct value once and pick the
+  encoded strings by code;
+- NaN and +/-inf become null.
+
+Rows are then filled into a single per-frame template.
+
+    json_response({"rows": df, "total": 10})     # records: [{"a": 1, ...}, ...]
+    ?layout=columns                              # columns: {"a": [1, ...], ...}
+
+Everything that is not a frame (dicts, lists, numpy scalars and arrays) goes
+through orjson when it is installed, otherwise through the json module.
+"""
+import json
+import math
+
+import numpy as np
+import pandas as pd
+from flask import Response, jsonify, request
+
+try:
+    import orjson
+except ImportError:  # optional - the json module is the fallback
+    orjson = None
+
+LAYOUTS = ("records", "columns")
+
+
+def _default(obj):
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, (pd.Series, pd.Index)):
+        return obj.tolist()
+    if hasattr(obj, "isoformat"):  # Timestamp, datetime, date
+        return obj.isoformat()
+    raise TypeError(f"{type(obj).__name__} is not JSON serialisable")
+
+
+def _finite(obj):
+    # json.dumps writes NaN/Infinity, which is not JSON; only walked when needed
+    if isinstance(obj, float):
+        return obj if math.isfinite(obj) else None
+    if isinstance(obj, dict):
+        return {k: _finite(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_finite(v) for v in obj]
+    if isinstance(obj, (np.generic, np.ndarray, pd.Series, pd.Index)):
+        return _finite(_default(obj))
+    return obj
+
+
+def dumps_plain(obj):
+    """JSON text for anything that is not a DataFrame; NaN/inf -> null."""
+    if orjson is not None:
+        return orjson.dumps(obj, default=_default,
+                            option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS).decode()
+    try:
+        return json.dumps(obj, default=_default, allow_nan=False, separators=(",", ":"))
+    except ValueError:
+        return json.dumps(_finite(obj), default=_default, separators=(",", ":"))
+
+
+def column_tokens(series):
+    """One JSON token per value of `series`, as an object array of str."""
+    values = series.to_numpy() if not isinstance(series.dtype, pd.CategoricalDtype) else None
+    if values is not None and values.dtype.kind == "f":
+        # float32 is formatted as float32 too, so 149.35 stays "149.35"
+        tokens = values.astype(str).astype(object)
+        tokens[~np.isfinite(values)] = "null"
+        return tokens
+    if values is not None and values.dtype.kind in "iu":
+        return values.astype(str).astype(object)
+    if values is not None and values.dtype.kind == "b":
+        return np.where(values, "true", "false").astype(object)
+
+    # text, categoricals, mixed objects: encode each distinct value once
+    codes, uniques = pd.factorize(series, use_na_sentinel=True)
+    encoded = np.array([dumps_plain(v) for v in uniques.tolist()] + ["null"], dtype=object)
+    return encoded[codes]  # code -1 (missing) picks the trailing "null"
+
+
+def frame_records(df):
+    """List of JSON object strings, one per row."""
+    if len(df.columns) == 0:
+        return ["{}"] * len(df)
+    columns = [column_tokens(df.iloc[:, i]) for i in range(len(df.columns))]
+    # one %-format per row fills every column's token into a fixed template
+    template = "{" + ",".join(json.dumps(str(col)).replace("%", "%%") + ":%s" for col in df.columns) + "}"
+    return [template % row for row in zip(*columns)]
+
+
+def frame_json(df, layout="records"):
+    if layout == "columns":
+        return "{" + ",".join(f"{json.dumps(str(col))}:[{','.join(column_tokens(df.iloc[:, i]))}]"
+                              for i, col in enumerate(df.columns)) + "}"
+    return "[" + ",".join(frame_records(df)) + "]"
+
+
+def dumps(obj, layout="records"):
+    """JSON text for `obj`; DataFrames anywhere inside dicts / lists are encoded with frame_json."""
+    if isinstance(obj, pd.DataFrame):
+        return frame_json(obj, layout)
+    if isinstance(obj, dict) and any(isinstance(v, (pd.DataFrame, dict, list)) for v in obj.values()):
+        return "{" + ",".join(f"{json.dumps(str(k))}:{dumps(v, layout)}" for k, v in obj.items()) + "}"
+    if isinstance(obj, list) and any(isinstance(v, pd.DataFrame) for v in obj):
+        return "[" + ",".join(dumps(v, layout) for v in obj) + "]"
+    return dumps_plain(obj)
+
+
+def json_response(payload, status=200):
+    """Like jsonify(payload), with frames encoded column-wise; honours ?layout=columns."""
+    layout = request.args.get("layout", "records")
+    if layout not in LAYOUTS:
+        return jsonify({"error": f"layout must be one of {', '.join(LAYOUTS)}"}), 400
+    return Response(dumps(payload, layout), status=status, mimetype="application/json")
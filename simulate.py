@@ -0,0 +1,353 @@
+"""Seat-allocation simulator for "what if" questions (/cutoff/simulate).
+
+A SeatMatrix is built once per dataset version and year
+(cutoff.load_seat_matrices). It holds:
+- the seats of every bucket, i.e. every (COLLEGECODE, BRANCHCODE,
+  ALLOTCATEGORY), counted from that year's allotments;
+- the applicant pool (mark, community) of the students who were allotted.
+
+A scenario scales seats per branch, shifts every mark, resizes the pool and
+then re-runs the allotment:
+- every applicant lists `choices` programs (college + branch) around the
+  level their mark reaches. They rank them by how competitive each program
+  was (its mean mark) plus a personal taste term;
+- each program is expanded into buckets in the order the student may use
+  them: the open (OC) seats first, then their community's reserved seats
+  (see predict.COMMUNITY_CATEGORIES);
+- seats go to students in merit order. This is deferred acceptance: every
+  round, all unplaced students propose to their next bucket at once, and
+  each bucket keeps its best `seats` candidates by mark. With one merit list
+  this gives the same result as letting students pick one by one in rank
+  order, but each round is a single argsort over the proposals instead of a
+  loop over students.
+
+simulate() returns the predicted closing marks per bucket and the simulated
+allotment rows. cutoff.simulated_insights() turns the rows into the same
+payload build_insights() gives for the real data. run_scenarios() runs many
+scenarios on a process pool.
+"""
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from cube import MAX_MARK, mark_values
+from params import ArgumentError, comma_list, number
+from predict import COMMUNITY_CATEGORIES
+
+BUCKET_KEYS = ["COLLEGECODE", "BRANCHCODE", "ALLOTCATEGORY"]
+PROGRAM_KEYS = ["COLLEGECODE", "BRANCHCODE"]
+INFO_COLUMNS = ["COLLENAME", "BRANCHNAME", "DISTRICT", "COLLEGETYPE"]
+DEFAULT_CHOICES = 30
+MAX_CHOICES = 100
+MAX_APPLICANTS = 200_000
+# applicants x choices one request may simulate: 200k x 30 takes about 3 s and
+# 700 MB in the worker, and every seed is a new response-cache key
+MAX_PROPOSALS = MAX_APPLICANTS * DEFAULT_CHOICES
+# ?seats=CS:x factors and ?seed= must stay within these
+MAX_SEAT_FACTOR = 10.0
+MAX_SEED = 2**32 - 1
+# where applicants look, in program ranks around the first program above their mark:
+# centred a little above it (they aim high), spread over this share of all programs
+REACH_SHARE = 0.02
+SPREAD_SHARE = 0.1
+# personal taste, in marks, added to each program's mean mark when ranking
+TASTE = 5.0
+# applicants allotted per batch, see allot()
+BATCH = 8192
+# jitter for resampled applicants, so copies of one student don't tie
+RESAMPLE_JITTER = 0.5
+
+
+class SeatMatrix:
+    def __init__(self, df: pd.DataFrame, year):
+        df = df.dropna(subset=BUCKET_KEYS + ["AGGRMARK", "COMMUNITY"]).reset_index(drop=True)
+        self.year = year
+        marks = mark_values(df["AGGRMARK"])
+
+        program_ids, _ = pd.factorize(pd.MultiIndex.from_frame(df[PROGRAM_KEYS].astype(str)), sort=True)
+        n_programs = int(program_ids.max()) + 1 if len(df) else 0
+        self.categories = np.array(sorted(df["ALLOTCATEGORY"].astype(str).unique()), dtype=object)
+        category_ids = np.searchsorted(self.categories, df["ALLOTCATEGORY"].astype(str).to_numpy())
+
+        # programs: keys + display columns from their first row, mean mark = how sought-after they are
+        first = df.iloc[np.unique(program_ids, return_index=True)[1]]
+        self.programs = pd.DataFrame({col: first[col].to_numpy()
+                                      for col in PROGRAM_KEYS + INFO_COLUMNS if col in df.columns})
+        counts = np.bincount(program_ids, minlength=n_programs)
+        self.desirability = np.bincount(program_ids, weights=marks, minlength=n_programs) / np.maximum(counts, 1)
+        self.by_desirability = np.argsort(self.desirability, kind="stable")
+
+        # buckets: one per (program, category) that had seats; bucket_of[program, category] -> id or -1
+        n_categories = len(self.categories)
+        cells = program_ids * n_categories + category_ids
+        occupied, self.seats = np.unique(cells, return_counts=True)
+        self.bucket_program = occupied // max(n_categories, 1)
+        self.bucket_category = occupied % max(n_categories, 1)
+        self.bucket_of = np.full((n_programs, n_categories), -1, dtype=np.int64)
+        self.bucket_of[self.bucket_program, self.bucket_category] = np.arange(len(occupied))
+        bucket_ids = self.bucket_of[program_ids, category_ids]
+        self.actual_closing = _bucket_min(bucket_ids, marks, len(occupied))
+
+        # communities -> the category ids they may take, open seats first (-1 = none)
+        self.communities = np.array(sorted(df["COMMUNITY"].astype(str).str.upper().unique()), dtype=object)
+        width = max(len(c) for c in COMMUNITY_CATEGORIES.values())
+        self.eligible = np.full((len(self.communities), width), -1, dtype=np.int64)
+        for i, community in enumerate(self.communities):
+            cats = [c for c in COMMUNITY_CATEGORIES.get(community, ["OC", community]) if c in self.categories]
+            self.eligible[i, :len(cats)] = np.searchsorted(self.categories, cats)
+
+        self.marks = marks
+        self.community = np.searchsorted(self.communities, df["COMMUNITY"].astype(str).str.upper().to_numpy())
+
+
+def _bucket_min(buckets, marks, n):
+    out = np.full(n, np.nan)
+    placed = buckets >= 0
+    if placed.any():
+        lowest = np.full(n, np.inf)
+        np.minimum.at(lowest, buckets[placed], marks[placed])
+        out = np.where(np.isfinite(lowest), lowest, np.nan)
+    return out
+
+
+def _bucket_max(buckets, marks, n):
+    highest = np.full(n, -np.inf)
+    placed = buckets >= 0
+    np.maximum.at(highest, buckets[placed], marks[placed])
+    return np.where(np.isfinite(highest), highest, np.nan)
+
+
+def parse_scenario(args, years):
+    """Scenario dict from query args, e.g. ?seats=CS:1.2,IT:0.9&shift=-5&applicants=200000&seed=1."""
+    year = number(args, "year", int, max(years) if years else None)
+    if year not in years:
+        raise ArgumentError(f"no allotments for year {year}")
+    seats = {}
+    for part in comma_list(args, "seats"):
+        branch, _, factor = part.partition(":")
+        branch = branch.strip().upper() or "*"
+        # read through params.number() so the factor is finite and in range like any other argument
+        seats[branch] = number({f"seats {branch}": factor}, f"seats {branch}", float, lo=0, hi=MAX_SEAT_FACTOR)
+        if seats[branch] is None:
+            raise ArgumentError("seats must look like CS:1.2,IT:0.8 (or *:1.1 for every branch)")
+    applicants = number(args, "applicants", int, lo=1, hi=MAX_APPLICANTS)
+    return {
+        "year": year,
+        "seats": seats,
+        "shift": number(args, "shift", float, 0.0, lo=-MAX_MARK, hi=MAX_MARK),
+        "applicants": applicants,
+        "choices": number(args, "choices", int, DEFAULT_CHOICES, lo=1, hi=MAX_CHOICES),
+        "seed": number(args, "seed", int, 0, lo=0, hi=MAX_SEED),
+    }
+
+
+def check_size(matrix, scenario):
+    """Raise ArgumentError if the scenario would list more than MAX_PROPOSALS choices."""
+    applicants = scenario["applicants"] or len(matrix.marks)
+    if applicants * scenario["choices"] > MAX_PROPOSALS:
+        raise ArgumentError(f"applicants x choices must be at most {MAX_PROPOSALS:,} "
+                            f"(here {applicants:,} x {scenario['choices']}); lower applicants or choices")
+
+
+def scaled_seats(matrix, factors):
+    """Seats per bucket after applying {branch: factor} ("*" = every other branch)."""
+    branches = matrix.programs["BRANCHCODE"].astype(str).str.upper().to_numpy()[matrix.bucket_program]
+    factor = np.full(len(matrix.seats), factors.get("*", 1.0))
+    for branch, value in factors.items():
+        if branch != "*":
+            factor[branches == branch] = value
+    return np.rint(matrix.seats * factor).astype(np.int64)
+
+
+def applicant_pool(matrix, scenario, rng):
+    """(marks, community ids) of the simulated applicants."""
+    marks, community = matrix.marks, matrix.community
+    size = scenario["applicants"]
+    if size is not None and size != len(marks):
+        picked = rng.integers(0, len(marks), size)
+        marks = marks[picked] + rng.uniform(-RESAMPLE_JITTER, RESAMPLE_JITTER, size)
+        community = community[picked]
+    marks = mark_values(np.clip(marks + scenario["shift"], 0.0, MAX_MARK))
+    return marks, community
+
+
+def preference_lists(matrix, marks, community, choices, rng):
+    """Bucket ids each applicant applies to, best first (n x choices*width, -1 padded at the end)."""
+    n, n_programs = len(marks), len(matrix.desirability)
+    ordered = matrix.desirability[matrix.by_desirability].astype(np.float32)
+    # programs are drawn (as ranks in desirability order) around the first one
+    # whose mean mark is above the applicant's; float32 noise keeps the n x draws arrays small
+    level = np.searchsorted(ordered, marks).astype(np.int32)
+    draws = 2 * choices
+    offsets = rng.standard_normal((n, draws), dtype=np.float32)
+    offsets *= max(SPREAD_SHARE * n_programs, choices)
+    offsets += REACH_SHARE * n_programs
+    ranks = np.rint(offsets, out=offsets).astype(np.int32)
+    ranks += level[:, None]
+    np.clip(ranks, 0, n_programs - 1, out=ranks)
+    ranks.sort(axis=1)
+
+    # rank by mean mark + taste; drawing a program twice counts once
+    utility = rng.standard_normal((n, draws), dtype=np.float32)
+    utility *= -TASTE
+    utility -= ordered[ranks]                     # negated, so argsort puts the favourite first
+    utility[:, 1:][ranks[:, 1:] == ranks[:, :-1]] = np.inf
+    order = np.argsort(utility, axis=1)[:, :choices]
+    listed = matrix.by_desirability[np.take_along_axis(ranks, order, axis=1)]
+    listed[np.isinf(np.take_along_axis(utility, order, axis=1))] = -1
+
+    # each program -> its buckets in the order this applicant may use them
+    eligible = matrix.eligible[community]                         # n x width
+    buckets = matrix.bucket_of[listed[:, :, None], np.maximum(eligible, 0)[:, None, :]]
+    buckets[(listed[:, :, None] < 0) | (eligible[:, None, :] < 0)] = -1
+    buckets = buckets.reshape(n, -1)
+    # move the gaps to the end so a -1 means "list exhausted"
+    return np.take_along_axis(buckets, np.argsort(buckets < 0, axis=1, kind="stable"), axis=1)
+
+
+def _deferred_acceptance(preferences, merit, seats):
+    """Bucket per applicant (-1 = none) and rounds taken; merit is the position in the merit list."""
+    n, width = preferences.shape
+    held = np.full(n, -1, dtype=np.int64)
+    next_choice = np.zeros(n, dtype=np.int64)
+    active = np.arange(n)
+    span = int(merit.max()) + 1 if n else 1
+    rounds = 0
+    while len(active):
+        active = active[next_choice[active] < width]
+        proposal = preferences[active, np.minimum(next_choice[active], width - 1)]
+        active, proposal = active[proposal >= 0], proposal[proposal >= 0]
+        if not len(active):
+            break
+        rounds += 1
+        next_choice[active] += 1
+
+        # current holders of the buckets proposed to compete with the new proposals
+        touched = np.zeros(len(seats), dtype=bool)
+        touched[proposal] = True
+        holders = np.flatnonzero(touched[np.maximum(held, 0)] & (held >= 0))
+        students = np.concatenate([holders, active])
+        buckets = np.concatenate([held[holders], proposal])
+        order = np.argsort(buckets * span + merit[students], kind="stable")
+        students, buckets = students[order], buckets[order]
+        starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+        position = np.arange(len(students)) - np.repeat(starts, np.diff(np.r_[starts, len(students)]))
+        keep = position < seats[buckets]
+
+        held[students[keep]] = buckets[keep]
+        held[students[~keep]] = -1
+        active = np.sort(students[~keep])
+    return held, rounds
+
+
+def allot(preferences, merit, seats, batch=BATCH):
+    """Seat per applicant (-1 = none) by merit order, and the deferred-acceptance rounds taken.
+
+    merit[i] is the applicant's position in the merit list (0 = best). Nobody
+    further down the list can take a seat from a better-ranked applicant, so
+    the list is allotted in batches: each batch runs deferred acceptance on
+    the seats the batches before it left, and skips buckets they filled.
+    """
+    n = len(preferences)
+    held = np.full(n, -1, dtype=np.int64)
+    remaining = seats.copy()
+    by_merit = np.argsort(merit, kind="stable")
+    rounds = 0
+    for start in range(0, n, batch):
+        students = by_merit[start:start + batch]
+        choices = preferences[students]
+        choices = np.where(remaining[np.maximum(choices, 0)] > 0, choices, -1)
+        choices = np.take_along_axis(choices, np.argsort(choices < 0, axis=1, kind="stable"), axis=1)
+        got, taken = _deferred_acceptance(choices, merit[students], remaining)
+        held[students] = got
+        remaining -= np.bincount(got[got >= 0], minlength=len(remaining))
+        rounds += taken
+    return held, rounds
+
+
+def simulate(matrix, scenario):
+    started = time.perf_counter()
+    rng = np.random.default_rng(scenario["seed"])
+    seats = scaled_seats(matrix, scenario["seats"])
+    marks, community = applicant_pool(matrix, scenario, rng)
+    preferences = preference_lists(matrix, marks, community, scenario["choices"], rng)
+    # merit list: higher mark first, ties broken at random
+    merit = np.empty(len(marks), dtype=np.int64)
+    merit[np.lexsort([rng.random(len(marks)), -marks])] = np.arange(len(marks))
+    held, rounds = allot(preferences, merit, seats)
+
+    n_buckets = len(seats)
+    placed = held >= 0
+    closing = _bucket_min(held, marks, n_buckets)
+    program = matrix.bucket_program
+    buckets = matrix.programs.iloc[program].reset_index(drop=True)
+    buckets.insert(2, "ALLOTCATEGORY", matrix.categories[matrix.bucket_category])
+    buckets["seats"] = seats
+    buckets["filled"] = np.bincount(held[placed], minlength=n_buckets)
+    buckets["closing"] = closing
+    buckets["opening"] = _bucket_max(held, marks, n_buckets)
+    buckets["actual_closing"] = matrix.actual_closing
+    buckets["closing_change"] = np.round(closing - matrix.actual_closing, 4)
+
+    # one row per simulated allotment, with the columns the cube is built from
+    rows = matrix.programs.iloc[program[held[placed]]].reset_index(drop=True)
+    rows["ALLOTCATEGORY"] = matrix.categories[matrix.bucket_category[held[placed]]]
+    rows["COMMUNITY"] = matrix.communities[community[placed]]
+    rows["YEAR"] = matrix.year
+    rows["ROUND"] = 1  # one simulated round
+    rows["AGGRMARK"] = marks[placed]
+
+    return {
+        "scenario": scenario,
+        "summary": {
+            "year": matrix.year,
+            "applicants": len(marks),
+            "seats": int(seats.sum()),
+            "allotted": int(placed.sum()),
+            "unallotted": int((~placed).sum()),
+            "buckets": n_buckets,
+            "rounds": rounds,
+            "seconds": round(time.perf_counter() - started, 3),
+        },
+        "buckets": buckets,
+        "rows": rows,
+    }
+
+
+def closing_changes(result, limit):
+    """The buckets whose closing mark moved most, largest move first."""
+    # buckets left empty (or empty before) have no change and come last
+    buckets = result["buckets"]
+    moved = buckets["closing_change"].abs().fillna(-1).to_numpy()
+    return buckets.iloc[np.argsort(-moved, kind="stable")[:limit]].reset_index(drop=True)
+
+
+# ---- many scenarios at once ----
+_worker_matrices = None
+
+
+def _init_worker(matrices):
+    global _worker_matrices
+    _worker_matrices = matrices
+
+
+def _simulate_in_worker(scenario):
+    return simulate(_worker_matrices[scenario["year"]], scenario)
+
+
+def run_scenarios(matrices, scenarios, processes=None):
+    """simulate() for every scenario, on a pool of `processes` (default: one per core).
+
+    matrices is {year: SeatMatrix}. Workers are forked, so they share the
+    matrices copy-on-write; only the scenarios and results are pickled.
+    """
+    processes = min(processes or multiprocessing.cpu_count(), len(scenarios))
+    if processes <= 1:
+        return [simulate(matrices[s["year"]], s) for s in scenarios]
+    context = multiprocessing.get_context("fork")
+    with ProcessPoolExecutor(processes, mp_context=context, initializer=_init_worker,
+                             initargs=(matrices,)) as pool:
+        return list(pool.map(_simulate_in_worker, scenarios))
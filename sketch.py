@@ -0,0 +1,224 @@
+"""Mergeable mark distributions for percentiles at any granularity (/cutoff/percentiles).
+
+The cube only keeps count/sum/sumsq/min/max, which is enough for means but
+not for medians or P10/P90. MarkSketches keeps one sketch per (YEAR,
+COLLEGECODE, BRANCHCODE, COMMUNITY), see SKETCH_KEYS. Each sketch is a sparse histogram of the
+marks over fixed bins of BIN_WIDTH marks, plus the exact min and max.
+
+Fixed bins are what makes the sketches mergeable without any loss: two
+histograms over the same bins merge by adding their counts. So:
+- any rollup (district, zone, college type, all years, ...) is the sum of the
+  selected groups' counts, i.e. one bincount;
+- an appended year file is merged into the loaded sketches (cutoff.merge_sketches)
+  instead of rebuilding them.
+
+Error bound: a percentile is read off the merged histogram using each bin's
+midpoint, interpolated between neighbouring ranks like np.quantile (linear)
+and clamped to the exact min / max. It is therefore within BIN_WIDTH / 2
+(0.05 marks) of the exact np.quantile of the same rows. The min (closing
+mark) and max (opening mark) are exact.
+
+Memory is one (group, bin, count) entry per occupied bin. That is at most
+the number of rows and at most groups x NBINS, however many rows the data
+grows to.
+"""
+import numpy as np
+import pandas as pd
+
+from cube import MAX_MARK, align_categories, mark_values
+from params import ArgumentError, comma_list, limit as limit_arg, match_key
+
+SKETCH_KEYS = ["YEAR", "COLLEGECODE", "BRANCHCODE", "COMMUNITY"]
+# rollup dimensions that belong to the college. They are part of the group key
+# too (like COLLENAME in the cube): free where they follow from COLLEGECODE,
+# and still exact where the data disagrees with itself
+COLLEGE_KEYS = ["DISTRICT", "COLLEGETYPE"]
+ATTRIBUTE_COLUMNS = ["COLLENAME"]
+BINS_PER_MARK = 10
+BIN_WIDTH = 1 / BINS_PER_MARK
+NBINS = int(MAX_MARK) * BINS_PER_MARK + 1   # the last bin holds exactly MAX_MARK
+# ?by= / filter parameter -> column (zone is looked up from DISTRICT)
+DIMENSIONS = {
+    "year": "YEAR",
+    "college": "COLLEGECODE",
+    "branch": "BRANCHCODE",
+    "community": "COMMUNITY",
+    "district": "DISTRICT",
+    "college_type": "COLLEGETYPE",
+    "zone": "ZONE",
+}
+DEFAULT_QUANTILES = {"p10": 0.10, "median": 0.50, "p90": 0.90}
+DEFAULT_LIMIT = 1000
+MAX_LIMIT = 10000
+# rollups with at most this many output cells x bins use a dense histogram
+DENSE_CELLS = 4_000_000
+
+
+def _bins(marks):
+    # the tiny epsilon keeps marks that sit exactly on a boundary (149.3) in their own bin
+    bins = np.floor(marks * BINS_PER_MARK + 1e-6)
+    return np.clip(bins, 0, NBINS - 1).astype(np.uint16)
+
+
+class MarkSketches:
+    def __init__(self, df: pd.DataFrame):
+        df = df.dropna(subset=SKETCH_KEYS + ["AGGRMARK"])
+        self.keys = SKETCH_KEYS + [c for c in COLLEGE_KEYS if c in df.columns]
+        group_ids = df.groupby(self.keys, observed=True, sort=True, dropna=False).ngroup().to_numpy()
+        marks = mark_values(df["AGGRMARK"])
+        first = np.unique(group_ids, return_index=True)[1]
+        columns = self.keys + [c for c in ATTRIBUTE_COLUMNS if c in df.columns]
+        self.groups = df.iloc[first][columns].reset_index(drop=True)
+        self._set_entries(group_ids, _bins(marks), np.ones(len(marks), dtype=np.int64))
+        self.min = np.full(len(first), np.inf)
+        np.minimum.at(self.min, group_ids, marks)
+        self.max = np.full(len(first), -np.inf)
+        np.maximum.at(self.max, group_ids, marks)
+
+    def _set_entries(self, group_ids, bins, counts):
+        # one entry per occupied (group, bin), sorted; counts of repeats are added up
+        cells, inverse = np.unique(group_ids.astype(np.int64) * NBINS + bins, return_inverse=True)
+        self.group = (cells // NBINS).astype(np.int32)
+        self.bin = (cells % NBINS).astype(np.uint16)
+        self.count = np.bincount(inverse, weights=counts, minlength=len(cells)).astype(np.int64)
+        self.rows = int(self.count.sum())
+
+    def merge(self, other):
+        """New sketches holding the marks of both (groups with the same keys are merged)."""
+        merged = MarkSketches.__new__(MarkSketches)
+        merged.keys = self.keys
+        both = pd.concat(align_categories([self.groups, other.groups], self.groups.columns), ignore_index=True)
+        ids = both.groupby(self.keys, observed=True, sort=True, dropna=False).ngroup().to_numpy()
+        first = np.unique(ids, return_index=True)[1]
+        ours, theirs = ids[:len(self.groups)], ids[len(self.groups):]
+        merged.groups = both.iloc[first].reset_index(drop=True)
+        merged._set_entries(np.concatenate([ours[self.group], theirs[other.group]]),
+                            np.concatenate([self.bin, other.bin]), np.concatenate([self.count, other.count]))
+        merged.min = np.full(len(first), np.inf)
+        np.minimum.at(merged.min, ids, np.concatenate([self.min, other.min]))
+        merged.max = np.full(len(first), -np.inf)
+        np.maximum.at(merged.max, ids, np.concatenate([self.max, other.max]))
+        return merged
+
+    def nbytes(self):
+        return self.group.nbytes + self.bin.nbytes + self.count.nbytes + self.min.nbytes + self.max.nbytes
+
+    def rollup(self, selected, cell_of_group, n_cells, quantiles):
+        """count, min, max and each quantile per output cell.
+
+        `selected` masks the groups to use, `cell_of_group` maps every group to
+        its output cell (0..n_cells-1).
+        """
+        if selected.all():
+            group, bins, counts = self.group, self.bin, self.count
+        else:
+            use = selected[self.group]
+            group, bins, counts = self.group[use], self.bin[use], self.count[use]
+        keys = cell_of_group[group].astype(np.int64) * NBINS + bins
+        if n_cells * NBINS <= DENSE_CELLS:
+            hist = np.bincount(keys, weights=counts, minlength=n_cells * NBINS).reshape(n_cells, NBINS)
+            cum = np.cumsum(hist, axis=1)
+            total = cum[:, -1]
+
+            def bin_at(rank):
+                # first bin whose cumulative count passes `rank` (0-based)
+                return (cum <= rank[:, None]).sum(axis=1)
+        else:
+            order = np.argsort(keys, kind="stable")
+            keys, counts = keys[order], counts[order]
+            cum = np.cumsum(counts)
+            total = np.bincount(keys // NBINS, weights=counts, minlength=n_cells)
+            offset = np.r_[0, np.cumsum(total)[:-1]]
+
+            def bin_at(rank):
+                at = np.searchsorted(cum, offset + rank, side="right")
+                return keys[np.minimum(at, len(keys) - 1)] % NBINS
+
+        lows = np.full(n_cells, np.inf)
+        np.minimum.at(lows, cell_of_group[selected], self.min[selected])
+        highs = np.full(n_cells, -np.inf)
+        np.maximum.at(highs, cell_of_group[selected], self.max[selected])
+
+        out = {"count": total.astype(np.int64)}
+        filled = total > 0
+        for name, q in quantiles.items():
+            pos = q * np.maximum(total - 1, 0)
+            lo, hi = np.floor(pos), np.ceil(pos)
+            mid_lo = (bin_at(lo) + 0.5) * BIN_WIDTH
+            mid_hi = (bin_at(hi) + 0.5) * BIN_WIDTH
+            value = np.clip(mid_lo + (mid_hi - mid_lo) * (pos - lo), lows, highs)
+            out[name] = np.where(filled, np.round(value, 4), np.nan)
+        out["closing"] = np.where(filled, lows, np.nan)
+        out["opening"] = np.where(filled, highs, np.nan)
+        return out
+
+
+def _group_column(sketches, col):
+    if col == "ZONE":
+        from regional import DISTRICT_ZONE, district_lookup
+        return district_lookup(sketches.groups["DISTRICT"], DISTRICT_ZONE, "UNKNOWN")
+    return sketches.groups[col]
+
+
+def _quantiles(raw):
+    if not raw:
+        return dict(DEFAULT_QUANTILES)
+    quantiles = {}
+    for part in raw.split(","):
+        try:
+            q = float(part)
+        except ValueError:
+            raise ArgumentError("q must be a comma-separated list of numbers between 0 and 1")
+        if not 0 <= q <= 1:
+            raise ArgumentError("q must be a comma-separated list of numbers between 0 and 1")
+        quantiles[f"p{q * 100:g}"] = q
+    return quantiles
+
+
+def run_percentiles(sketches, args):
+    # e.g. ?by=district,year&community=BC&branch=CS,IT&q=0.25,0.5,0.75
+    by = [b.lower() for b in comma_list(args, "by")]
+    for name in by:
+        if name not in DIMENSIONS:
+            raise ArgumentError(f"by must be a comma-separated list of {', '.join(DIMENSIONS)}")
+    quantiles = _quantiles(args.get("q"))
+    limit = limit_arg(args, DEFAULT_LIMIT, MAX_LIMIT)
+
+    selected = np.ones(len(sketches.groups), dtype=bool)
+    for param, col in DIMENSIONS.items():
+        if args.get(param):
+            wanted = {match_key(col, v) for v in comma_list(args, param)}
+            values = _group_column(sketches, col)
+            codes, uniques = pd.factorize(values)
+            keep = np.array([match_key(col, u) in wanted for u in uniques] + [False])
+            selected &= keep[codes]
+
+    columns = [DIMENSIONS[name] for name in by]
+    if columns:
+        keys = pd.DataFrame({col: _group_column(sketches, col) for col in columns})
+        codes = keys.groupby(columns, observed=True, sort=True, dropna=False).ngroup().to_numpy()
+        # only cells with at least one selected group are reported, numbered 0..n_cells-1
+        used, first = np.unique(codes[selected], return_index=True)
+        cell_of_group = np.zeros(len(codes), dtype=np.int64)
+        cell_of_group[selected] = np.searchsorted(used, codes[selected])
+        n_cells = len(used)
+        cells = keys[selected].iloc[first].reset_index(drop=True)
+        if "COLLEGECODE" in columns and "COLLENAME" in sketches.groups.columns:
+            cells.insert(columns.index("COLLEGECODE") + 1, "COLLENAME",
+                         sketches.groups["COLLENAME"][selected].iloc[first].to_numpy())
+    else:
+        cell_of_group = np.zeros(len(selected), dtype=np.int64)
+        n_cells = 1 if selected.any() else 0
+        cells = pd.DataFrame(index=range(n_cells))
+
+    stats = sketches.rollup(selected, cell_of_group, n_cells, quantiles)
+    for name in ["count", "closing", *quantiles, "opening"]:
+        cells[name] = stats[name]
+
+    return {
+        "by": by,
+        "quantiles": quantiles,
+        "error_bound": BIN_WIDTH / 2,
+        "total": n_cells,
+        "results": cells.iloc[:limit],
+    }
@@ -0,0 +1,122 @@
+"""Typed columnar snapshot of the cleaned allotment data.
+
+Build it once after the CSV changes:
+
+    python snapshot.py build
+
+The snapshot is an uncompressed Feather (Arrow IPC) file next to the CSV, so
+workers can memory-map it instead of parsing and cleaning the CSV on boot.
+The source file's size, mtime and sha256 are stored in the Arrow schema
+metadata, with the sha256 of its alias cache (canonical.py); a snapshot whose
+hashes no longer match the CSV and its aliases is ignored.
+"""
+import hashlib
+import json
+import os
+import sys
+
+SNAPSHOT_SUFFIX = ".feather"
+META_KEY = b"tnea_source"
+# bump whenever the cleaned frame's columns or dtypes change, so old snapshots are rebuilt
+SNAPSHOT_FORMAT = 3
+
+
+def snapshot_path_for(csv_path):
+    return os.path.splitext(csv_path)[0] + SNAPSHOT_SUFFIX
+
+
+def file_sha256(path, chunk_size=1 << 20):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def aliases_sha256(csv_path):
+    """sha256 of the alias cache `csv_path` is canonicalised with, or None if there is none yet."""
+    # the cache decides the canonical names, so a changed one means changed rows
+    from cutoff import dataset_alias_path
+    alias_path = dataset_alias_path(csv_path)
+    return file_sha256(alias_path) if os.path.exists(alias_path) else None
+
+
+def _source_info(csv_path, sha256=None):
+    st = os.stat(csv_path)
+    return {
+        "format": SNAPSHOT_FORMAT,
+        "size": st.st_size,
+        "mtime_ns": st.st_mtime_ns,
+        "sha256": sha256 or file_sha256(csv_path),
+        "aliases": aliases_sha256(csv_path),
+    }
+
+
+def write_snapshot(df, csv_path, snap_path=None):
+    import pyarrow as pa
+    import pyarrow.feather as feather
+
+    snap_path = snap_path or snapshot_path_for(csv_path)
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    meta = dict(table.schema.metadata or {})
+    meta[META_KEY] = json.dumps(_source_info(csv_path)).encode()
+    table = table.replace_schema_metadata(meta)
+
+    # write next to the target and rename, so readers never see half a file
+    tmp_path = snap_path + ".tmp"
+    feather.write_feather(table, tmp_path, compression="uncompressed")
+    os.replace(tmp_path, snap_path)
+    return snap_path
+
+
+def snapshot_is_fresh(csv_path, snap_path=None):
+    try:
+        import pyarrow as pa
+    except ImportError:
+        return False
+
+    snap_path = snap_path or snapshot_path_for(csv_path)
+    if not os.path.exists(snap_path):
+        return False
+    with pa.memory_map(snap_path) as source:
+        meta = pa.ipc.open_file(source).schema.metadata or {}
+    if META_KEY not in meta:
+        return False
+    stored = json.loads(meta[META_KEY])
+    if stored.get("format") != SNAPSHOT_FORMAT:
+        return False
+    if stored.get("aliases") != aliases_sha256(csv_path):
+        return False
+
+    st = os.stat(csv_path)
+    if stored["size"] != st.st_size:
+        return False
+    if stored["mtime_ns"] == st.st_mtime_ns:
+        return True
+    # same size but touched (e.g. re-copied) - only the content hash can tell
+    return stored["sha256"] == file_sha256(csv_path)
+
+
+def read_snapshot(csv_path, snap_path=None):
+    """Memory-map the snapshot if it is fresh, otherwise return None."""
+    snap_path = snap_path or snapshot_path_for(csv_path)
+    if not snapshot_is_fresh(csv_path, snap_path):
+        return None
+    import pyarrow.feather as feather
+    return feather.read_feather(snap_path, memory_map=True)
+
+
+def build(csv_path=None):
+    from cutoff import DF_FILE, read_clean_csv
+
+    csv_path = csv_path or DF_FILE
+    df = read_clean_csv(csv_path)
+    snap_path = write_snapshot(df, csv_path)
+    print(f"wrote {snap_path} ({len(df)} rows)")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "build":
+        print("usage: python snapshot.py build [csv_path]")
+        sys.exit(1)
+    build(sys.argv[2] if len(sys.argv) > 2 else None)
@@ -0,0 +1,364 @@
+"""SQLite storage backend for the allotment rows (TNEA_BACKEND=sqlite).
+
+With the default pandas backend every worker holds the whole cleaned frame.
+Here the cleaned rows are ingested into an SQLite file (TNEA_DB, by default
+next to the CSV), indexed on YEAR, COLLEGECODE, BRANCHCODE, COMMUNITY and
+DISTRICT. Workers only keep what is derived from them:
+- the aggregate cube. Its cells are computed by one GROUP BY inside SQLite
+  at ingest and stored next to the rows. Every dashboard insight is a rollup
+  of the cube, so these payloads come out the same as with pandas;
+- the group-level indexes for /cutoff/predict and /cutoff/rounds. They read
+  the rows once while they are built and drop them afterwards.
+
+/cutoff/query runs as SQL (WHERE / ORDER BY / LIMIT) against the file.
+/cutoff/export still builds the in-memory query index on first use.
+
+Every data file is ingested once per (size, mtime, alias cache) under its own source id,
+so restarting a worker only opens the database. A changed file gets a new
+source id and the version before it is kept, so workers still reading that
+version see consistent rows until they move on.
+
+    python -m pytest tests/test_backend_parity.py    # both backends, same payloads?
+"""
+import math
+import os
+import sqlite3
+import threading
+
+import pandas as pd
+
+from metrics import span
+
+TABLE = "allotments"
+# the cube cells of every source, aggregated once at ingest
+CELLS = "cube_cells"
+INDEXED_COLUMNS = ["YEAR", "COLLEGECODE", "BRANCHCODE", "COMMUNITY", "DISTRICT"]
+# bump when the cleaned columns change; databases of another format are emptied
+# and every file is ingested again
+INGEST_FORMAT = 5
+INSERT_BATCH = 50_000
+
+_local = threading.local()
+_ingest_lock = threading.Lock()
+
+
+def db_path_for(csv_path):
+    return os.environ.get("TNEA_DB") or os.path.splitext(csv_path)[0] + ".sqlite"
+
+
+def _connect(db_path):
+    # one connection per thread and process; never reuse one across fork()
+    key = (os.getpid(), db_path)
+    conns = getattr(_local, "conns", None)
+    if conns is None:
+        conns = _local.conns = {}
+    if key not in conns:
+        # autocommit; ingest() opens its own transaction
+        conn = sqlite3.connect(db_path, timeout=300, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        _check_format(conn)
+        conns[key] = conn
+    return conns[key]
+
+
+def _check_format(conn):
+    # tables written by another INGEST_FORMAT may have other columns; drop them
+    # all and start over (the database's user_version holds the format it has)
+    if conn.execute("PRAGMA user_version").fetchone()[0] == INGEST_FORMAT:
+        return
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        # another process may have reset it while this one waited for the lock
+        if conn.execute("PRAGMA user_version").fetchone()[0] != INGEST_FORMAT:
+            for table in (TABLE, CELLS, "sources"):
+                conn.execute(f"DROP TABLE IF EXISTS {table}")
+            conn.execute("CREATE TABLE sources (id INTEGER PRIMARY KEY, path TEXT, size INTEGER, "
+                         "mtime_ns INTEGER, format INTEGER, aliases TEXT, rows INTEGER)")
+            conn.execute(f"PRAGMA user_version = {INGEST_FORMAT}")
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def _sql_type(dtype):
+    if pd.api.types.is_integer_dtype(dtype):
+        return "INTEGER"
+    if pd.api.types.is_float_dtype(dtype):
+        return "REAL"
+    return "TEXT"
+
+
+def _column_values(series):
+    # plain Python values, missing -> None
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        series = series.astype(object)
+    values = series.tolist()
+    if series.dtype == object or series.dtype.kind == "f":
+        values = [None if v is None or v != v else v for v in values]
+    return values
+
+
+def _insert(conn, df, source_id):
+    columns = list(df.columns)
+    placeholders = ",".join("?" * (len(columns) + 1))
+    names = ",".join(f'"{c}"' for c in columns)
+    sql = f'INSERT INTO {TABLE} (source,{names}) VALUES ({placeholders})'
+    for start in range(0, len(df), INSERT_BATCH):
+        chunk = df.iloc[start:start + INSERT_BATCH]
+        values = [_column_values(chunk[c]) for c in columns]
+        conn.executemany(sql, zip([source_id] * len(chunk), *values))
+
+
+def _create_table(conn, df):
+    columns = ",".join(f'"{c}" {_sql_type(df[c].dtype)}' for c in df.columns)
+    conn.execute(f"CREATE TABLE IF NOT EXISTS {TABLE} (source INTEGER NOT NULL, {columns})")
+
+
+def _create_indexes(conn, columns):
+    conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{TABLE}_source ON {TABLE} (source)")
+    for col in INDEXED_COLUMNS:
+        if col in columns:
+            conn.execute(f'CREATE INDEX IF NOT EXISTS idx_{TABLE}_{col.lower()} ON {TABLE} ("{col}")')
+
+
+def _aggregate(table_keys, where):
+    # cube measures over the allotment rows, as a SELECT; cells in order of
+    # their first row, like the pandas groupby(sort=False)
+    keys = ",".join(f'"{k}"' for k in table_keys)
+    return (f"SELECT {keys}, COUNT(*) AS count, SUM(AGGRMARK) AS sum, SUM(AGGRMARK * AGGRMARK) AS sumsq, "
+            f"MIN(AGGRMARK) AS min, MAX(AGGRMARK) AS max "
+            f"FROM {TABLE} WHERE {where} AND AGGRMARK IS NOT NULL GROUP BY {keys} ORDER BY MIN(rowid)")
+
+
+def _store_cells(conn, columns, source_id):
+    from cube import CUBE_KEYS
+    keys = [k for k in CUBE_KEYS if k in columns]
+    conn.execute(f"CREATE TABLE IF NOT EXISTS {CELLS} AS SELECT 0 AS source, * FROM ({_aggregate(keys, '0')})")
+    conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{CELLS}_source ON {CELLS} (source)")
+    conn.execute(f"INSERT INTO {CELLS} SELECT {source_id}, * FROM ({_aggregate(keys, f'source = {source_id}')})")
+
+
+def _cleaned_rows(path):
+    # every year, like the snapshot: TNEA_YEARS is applied when reading
+    from cube import mark_values
+    from cutoff import read_clean_csv
+    from snapshot import read_snapshot
+    df = read_snapshot(path)
+    if df is None:
+        df = read_clean_csv(path)
+    # stored exactly as the pandas backend aggregates them (no float32 noise)
+    return df.assign(AGGRMARK=mark_values(df["AGGRMARK"]))
+
+
+def ingest(path, db_path):
+    """Source id of `path` in the database, ingesting it first if it changed."""
+    from snapshot import aliases_sha256
+    st = os.stat(path)
+    signature = (os.path.abspath(path), st.st_size, st.st_mtime_ns, INGEST_FORMAT)
+    conn = _connect(db_path)
+    with _ingest_lock:
+        # IMMEDIATE: other processes ingesting the same file wait here, then find it done
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT id FROM sources WHERE path=? AND size=? AND mtime_ns=? AND format=? "
+                               "AND aliases IS ?", signature + (aliases_sha256(path),)).fetchone()
+            if row is not None:
+                conn.execute("COMMIT")
+                return row[0]
+            with span("sqlite.ingest"):
+                df = _cleaned_rows(path)
+                # hashed after reading: names the read resolved were added to the cache
+                source_id = conn.execute("INSERT INTO sources (path, size, mtime_ns, format, aliases, rows) "
+                                         "VALUES (?, ?, ?, ?, ?, ?)",
+                                         signature + (aliases_sha256(path), len(df))).lastrowid
+                _create_table(conn, df)
+                _insert(conn, df, source_id)
+                _create_indexes(conn, df.columns)
+                _store_cells(conn, df.columns, source_id)
+                # keep this version and the one before it; older ones have no readers left
+                stale = [r[0] for r in conn.execute("SELECT id FROM sources WHERE path=? ORDER BY id DESC",
+                                                    (signature[0],)).fetchall()[2:]]
+                if stale:
+                    marks = ",".join("?" * len(stale))
+                    conn.execute(f"DELETE FROM {TABLE} WHERE source IN ({marks})", stale)
+                    conn.execute(f"DELETE FROM {CELLS} WHERE source IN ({marks})", stale)
+                    conn.execute(f"DELETE FROM sources WHERE id IN ({marks})", stale)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+    return source_id
+
+
+class SqlTable:
+    """One dataset version: the source ids it is made of, read from `db_path`.
+
+    Stands in for the DataFrame in DatasetCache when TNEA_BACKEND=sqlite.
+    """
+
+    def __init__(self, db_path, sources, years=()):
+        self.db_path = db_path
+        self.sources = tuple(sources)
+        self.years = tuple(years)
+        conn = self.connection()
+        self.columns = [r[1] for r in conn.execute(f"PRAGMA table_info({TABLE})") if r[1] != "source"]
+        self.rows = conn.execute(f"SELECT COUNT(*) FROM {TABLE} WHERE {self.where()}", self.params()).fetchone()[0]
+        self._values = {}
+
+    def __len__(self):
+        return self.rows
+
+    def connection(self):
+        return _connect(self.db_path)
+
+    def where(self, sources=None):
+        # WHERE clause for this version's rows (or just those of `sources`); see params()
+        sources = self.sources if sources is None else sources
+        clause = f"source IN ({','.join('?' * len(sources))})"
+        if self.years:
+            clause += f" AND YEAR IN ({','.join('?' * len(self.years))})"
+        return clause
+
+    def params(self, sources=None):
+        sources = self.sources if sources is None else sources
+        return list(sources) + list(self.years)
+
+    def row_order(self):
+        # rows in the order the pandas backend has them: base file first, then appended files
+        if len(self.sources) == 1:
+            return "rowid"
+        cases = " ".join(f"WHEN {s} THEN {i}" for i, s in enumerate(self.sources))
+        return f"CASE source {cases} END, rowid"
+
+    def values_by_key(self, col):
+        """{params.match_key: [stored values]} for filtering on `col` (cached)."""
+        from params import match_key
+        if col not in self._values:
+            lookup = {}
+            sql = f'SELECT DISTINCT "{col}" FROM {TABLE} WHERE {self.where()} AND "{col}" IS NOT NULL'
+            for (value,) in self.connection().execute(sql, self.params()):
+                lookup.setdefault(match_key(col, value), []).append(value)
+            self._values[col] = lookup
+        return self._values[col]
+
+    def query(self, sql, params=()):
+        return pd.read_sql_query(sql, self.connection(), params=list(params))
+
+
+def loader(db_path, years=()):
+    """DatasetCache loader: ingest the file (if needed) and return a SqlTable for it."""
+    def load(path):
+        return SqlTable(db_path, [ingest(path, db_path)], years)
+    return load
+
+
+def combine(table, part):
+    # an appended file is just one more source id
+    return SqlTable(table.db_path, table.sources + part.sources, table.years)
+
+
+def read_frame(table):
+    """The cleaned rows as a DataFrame (same columns and dtypes as the pandas backend)."""
+    from cube import align_categories
+    from cutoff import CATEGORY_COLUMNS, apply_dtypes
+    names = ",".join(f'"{c}"' for c in table.columns)
+    frames = []
+    with span("sqlite.read_frame"):
+        for source in table.sources:
+            frames.append(apply_dtypes(table.query(
+                f"SELECT {names} FROM {TABLE} WHERE {table.where([source])} ORDER BY rowid",
+                table.params([source]))))
+    frames = align_categories(frames, CATEGORY_COLUMNS)
+    return frames[0] if len(frames) == 1 else pd.concat(frames, ignore_index=True)
+
+
+def build_cube(table):
+    """cube.build_cube(), read from the cells stored at ingest."""
+    from cube import CUBE_KEYS, MEASURES
+    from cutoff import apply_dtypes
+    keys = ",".join(f'"{k}"' for k in CUBE_KEYS if k in table.columns)
+    with span("sqlite.build_cube"):
+        if len(table.sources) == 1:
+            cube = table.query(f"SELECT {keys}, {','.join(MEASURES)} FROM {CELLS} WHERE {table.where()} "
+                               f"ORDER BY rowid", table.params())
+        else:
+            # several files: cells with the same keys are summed across them, in
+            # the order cube.combine_cubes() leaves them (base file first)
+            rank = " ".join(f"WHEN {s} THEN {i}" for i, s in enumerate(table.sources))
+            cube = table.query(
+                f"SELECT {keys}, SUM(count) AS count, SUM(sum) AS sum, SUM(sumsq) AS sumsq, "
+                f"MIN(min) AS min, MAX(max) AS max FROM {CELLS} WHERE {table.where()} GROUP BY {keys} "
+                f"ORDER BY MIN((CASE source {rank} END) * {1 << 40} + rowid)",
+                table.params())
+    return apply_dtypes(cube)
+
+
+def merge_cube(cube, part):
+    # DatasetCache merge function: fold an appended file's cells into the cube
+    from cube import combine_cubes
+    return combine_cubes(cube, build_cube(part))
+
+
+def run_query(table, args):
+    """query.run_query() pushed down to SQL: same parameters, same results."""
+    from params import ArgumentError, limit as limit_arg, match_key, number, page as page_arg
+    from query import FILTERS, RESULT_COLUMNS, filter_values
+
+    where, params = [table.where()], table.params()
+    matches_nothing = False
+    for param, col in FILTERS.items():
+        wanted = filter_values(args, param)
+        if not wanted or col not in table.columns:
+            continue
+        lookup = table.values_by_key(col)
+        stored = [v for key in {match_key(col, v) for v in wanted} for v in lookup.get(key, [])]
+        if not stored:
+            matches_nothing = True
+            continue
+        where.append(f'"{col}" IN ({",".join("?" * len(stored))})')
+        params += stored
+    min_mark, max_mark = number(args, "min_mark"), number(args, "max_mark")
+    if min_mark is not None:
+        where.append("AGGRMARK >= ?")
+        params.append(min_mark)
+    if max_mark is not None:
+        where.append("AGGRMARK <= ?")
+        params.append(max_mark)
+    where = " AND ".join(where)
+
+    conn = table.connection()
+    total = 0 if matches_nothing else conn.execute(f"SELECT COUNT(*) FROM {TABLE} WHERE {where}", params).fetchone()[0]
+
+    sort = args.get("sort", "-AGGRMARK")
+    limit = limit_arg(args)
+    pages = max(1, math.ceil(total / limit))
+    page = page_arg(args, pages)
+
+    descending = sort.startswith("-")
+    col = sort.lstrip("-+").upper()
+    if col not in table.columns:
+        raise ArgumentError(f"cannot sort by {col}")
+    order = table.row_order()
+    if col == "AGGRMARK" and descending and total > len(table) // 16:
+        # the pandas backend walks its presorted mark order backwards here, so ties come last-row-first
+        order = ", ".join(f"{part} DESC" for part in order.split(", "))
+    order_by = f'"{col}" IS NULL, "{col}" {"DESC" if descending else "ASC"}, {order}'
+
+    columns = [c for c in RESULT_COLUMNS if c in table.columns]
+    results = []
+    if total:
+        names = ",".join(f'"{c}"' for c in columns)
+        rows = conn.execute(f"SELECT {names} FROM {TABLE} WHERE {where} ORDER BY {order_by} LIMIT ? OFFSET ?",
+                            params + [limit, (page - 1) * limit])
+        results = [dict(zip(columns, row)) for row in rows]
+
+    return {
+        "total": int(total),
+        "page": page,
+        "pages": pages,
+        "limit": limit,
+        "sort": sort,
+        "results": results,
+    }
@@ -0,0 +1,28 @@
+"""Points the app at a small synthetic dataset (benchmarks/synthetic.py).
+
+cutoff.py reads TNEA_DATA and friends when it is imported, so they are set
+here, before any test module imports the app.
+"""
+import os
+import shutil
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+from synthetic import generate  # noqa: E402
+
+DATA_DIR = tempfile.mkdtemp(prefix="tnea-tests-")
+DATA_FILE = generate(os.path.join(DATA_DIR, "allotments.csv"), 20_000, [2023, 2024, 2025])
+
+os.environ.update(TNEA_DATA=DATA_FILE, TNEA_YEARS_DIR=os.path.join(DATA_DIR, "years"),
+                  TNEA_DB=os.path.join(DATA_DIR, "allotments.sqlite"), TNEA_REFRESH_SECONDS="0",
+                  TNEA_BACKEND="pandas")
+for name in ("TNEA_ALIASES", "TNEA_YEARS"):
+    os.environ.pop(name, None)
+
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(DATA_DIR, ignore_errors=True)
@@ -0,0 +1,51 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import asgi
+import regional
+from app import app
+from response_cache import make_entry
+
+
+@pytest.fixture
+def routes(monkeypatch):
+    # which path each request takes, instead of running it
+    taken = []
+
+    async def inline(environ, send):
+        taken.append(("inline", environ["PATH_INFO"]))
+
+    async def pool(environ, send):
+        taken.append(("pool", environ["PATH_INFO"]))
+
+    monkeypatch.setattr(asgi, "_run_inline", inline)
+    monkeypatch.setattr(asgi, "_run_in_pool", pool)
+    monkeypatch.setattr(asgi, "precomputer", SimpleNamespace(running=True))
+    return taken
+
+
+def request(path):
+    scope = {"type": "http", "method": "GET", "path": path, "query_string": b"", "headers": []}
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        pass
+
+    asyncio.run(asgi.application(scope, receive, send))
+
+
+def test_only_dataset_cache_hits_run_on_the_loop(routes):
+    assert app.test_client().get("/data").status_code == 200
+    # a map response cached as well: its version check stats the boundary file
+    key = "/cutoff/regional-map?"
+    regional.map_cache._current_generation().entries[key] = make_entry(b"{}", "application/json")
+    try:
+        for path in ("/data", "/cutoff/regional-map", "/cutoff/query"):
+            request(path)
+    finally:
+        regional.map_cache.clear()
+    assert routes == [("inline", "/data"), ("pool", "/cutoff/regional-map"), ("pool", "/cutoff/query")]
@@ -0,0 +1,114 @@
+"""The pandas and sqlite backends (TNEA_BACKEND) must serve the same payloads.
+
+The backend is picked when cutoff.py is imported, so each one runs in its own
+interpreter on the test dataset (conftest.py). The sqlite database starts
+empty, so the first sqlite run includes the ingest and the second one reads
+what it left. Numbers are compared with a relative tolerance: SQLite sums the
+marks in a different order than pandas, which can move the last bits.
+"""
+import json
+import math
+import os
+import subprocess
+import sys
+
+import pytest
+
+from conftest import ROOT
+
+URLS = [
+    "/data",
+    "/cutoff-dashboard-data",
+    "/branch_data",
+    "/cutoff/regional-data",
+    "/dashboard-bundle",
+    "/cutoff/query",
+    "/cutoff/query?sort=AGGRMARK&limit=500",
+    "/cutoff/query?community=BC,MBC&sort=-AGGRMARK&page=3",
+    "/cutoff/query?branch=cs&min_mark=150&max_mark=180&sort=COLLENAME",
+    "/cutoff/query?district=COIMBATORE&sort=-DISTRICT&limit=100",
+    "/cutoff/query?district=tirupur,THE NILGIRIS&limit=100",
+    "/cutoff/query?college=nope",
+    "/cutoff/query?sort=NOPE",
+    "/cutoff/query?year=abc",
+    "/cutoff/predict?mark=175&community=BC",
+    "/cutoff/predict?mark=150&community=OC&branch=CS,IT",
+    "/cutoff/predict?mark=150&district=tirupur",
+    "/cutoff/rounds",
+    "/cutoff/rounds?sort=allotted&limit=200",
+    "/cutoff/percentiles?by=zone,year",
+    "/cutoff/percentiles?by=college,branch&community=BC&q=0.05,0.5&limit=200",
+    "/cutoff/export?year=2024&community=BC&limit=300",
+    "/cutoff/export?kind=cube&district=COIMBATORE",
+]
+REL_TOL = 1e-9
+MAX_DIFFS = 20
+
+CHILD = """
+import json, sys
+from app import app, preload
+preload()
+client = app.test_client()
+responses = {}
+for url in json.loads(sys.argv[1]):
+    r = client.get(url)
+    text = r.get_data(as_text=True)
+    body = r.get_json() if r.is_json else [json.loads(line) for line in text.splitlines()]
+    responses[url] = {"status": r.status_code, "body": body}
+with open(sys.argv[2], "w") as f:
+    json.dump(responses, f)
+"""
+
+
+def serve(backend, db_path, out_path):
+    env = dict(os.environ, TNEA_BACKEND=backend, TNEA_DB=db_path, TNEA_REFRESH_SECONDS="0")
+    subprocess.run([sys.executable, "-c", CHILD, json.dumps(URLS), out_path], cwd=ROOT, env=env,
+                   check=True, capture_output=True)
+    with open(out_path) as f:
+        return json.load(f)
+
+
+@pytest.fixture(scope="module")
+def payloads(tmp_path_factory):
+    tmp = tmp_path_factory.mktemp("parity")
+    db_path = str(tmp / "parity.sqlite")
+    return {backend: serve(backend.split()[0], db_path, str(tmp / f"{i}.json"))
+            for i, backend in enumerate(("pandas", "sqlite", "sqlite (ingested)"))}
+
+
+def diff(a, b, path, out):
+    if len(out) >= MAX_DIFFS:
+        return
+    if isinstance(a, dict) and isinstance(b, dict):
+        if set(a) != set(b):
+            out.append(f"{path}: keys {sorted(set(a) ^ set(b))}")
+        for key in sorted(set(a) & set(b)):
+            diff(a[key], b[key], f"{path}/{key}", out)
+    elif isinstance(a, list) and isinstance(b, list):
+        if len(a) != len(b):
+            out.append(f"{path}: {len(a)} vs {len(b)} items")
+            return
+        for i, (x, y) in enumerate(zip(a, b)):
+            diff(x, y, f"{path}[{i}]", out)
+    elif isinstance(a, (int, float)) and isinstance(b, (int, float)) and not isinstance(a, bool):
+        if not math.isclose(a, b, rel_tol=REL_TOL):
+            out.append(f"{path}: {a!r} vs {b!r}")
+    elif a != b:
+        out.append(f"{path}: {a!r:.80} vs {b!r:.80}")
+
+
+@pytest.mark.parametrize("backend", ["sqlite", "sqlite (ingested)"])
+@pytest.mark.parametrize("url", URLS)
+def test_backends_serve_the_same_payload(payloads, backend, url):
+    expected, actual = payloads["pandas"][url], payloads[backend][url]
+    assert actual["status"] == expected["status"]
+    diffs = []
+    diff(expected["body"], actual["body"], url, diffs)
+    assert not diffs, "\n".join(diffs)
+
+
+def test_payloads_are_not_empty(payloads):
+    # a comparison of two empty answers would prove nothing
+    for url in ("/data", "/cutoff/query", "/cutoff/export?year=2024&community=BC&limit=300"):
+        assert payloads["pandas"][url]["status"] == 200
+        assert payloads["pandas"][url]["body"]
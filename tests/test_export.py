@@ -0,0 +1,31 @@
+import pytest
+
+from app import app
+
+
+@pytest.fixture(scope="module")
+def client():
+    return app.test_client()
+
+
+@pytest.mark.parametrize("url, error", [
+    ("/cutoff/export?kind=cubes", "kind must be one of rows, cube"),
+    ("/cutoff/export?kind=cube&category=BC", "kind=cube cannot be filtered by category"),
+    ("/cutoff/export?kind=cube&community=BC&category=BC,OC", "kind=cube cannot be filtered by category"),
+])
+def test_export_rejects_what_it_cannot_apply(client, url, error):
+    response = client.get(url)
+    assert response.status_code == 400
+    assert response.get_json() == {"error": error}
+
+
+def test_cube_export_applies_cube_filters(client):
+    everything = client.get("/cutoff/export?kind=cube").data.splitlines()
+    filtered = client.get("/cutoff/export?kind=cube&community=BC").data.splitlines()
+    assert 0 < len(filtered) < len(everything)
+    assert all(b'"COMMUNITY":"BC"' in line for line in filtered)
+
+
+def test_row_export_still_filters_by_category(client):
+    rows = client.get("/cutoff/export?category=BC&limit=100").data.splitlines()
+    assert rows and all(b'"ALLOTCATEGORY":"BC"' in line for line in rows)
@@ -0,0 +1,37 @@
+import pytest
+
+from app import app
+
+
+@pytest.fixture(scope="module")
+def client():
+    return app.test_client()
+
+
+# a raw spelling from the CSVs and the canonical name the rows are stored under
+SPELLINGS = [("tirupur", "TIRUPPUR"), ("THE NILGIRIS", "NILGIRIS"), ("Nagappattinam", "NAGAPATTINAM")]
+URLS = [
+    "/cutoff/query?district={}&limit=500",
+    "/cutoff/predict?mark=150&district={}&limit=500",
+    "/cutoff/percentiles?by=district,year&district={}",
+    "/cutoff/export?district={}",
+    "/cutoff/export?kind=cube&district={}",
+]
+
+
+def fetch(client, url):
+    response = client.get(url)
+    assert response.status_code == 200
+    return response.data
+
+
+@pytest.mark.parametrize("url", URLS)
+@pytest.mark.parametrize("raw, canonical", SPELLINGS)
+def test_raw_district_spelling_matches_canonical_rows(client, url, raw, canonical):
+    by_canonical = fetch(client, url.format(canonical))
+    assert canonical.encode() in by_canonical
+    assert fetch(client, url.format(raw)) == by_canonical
+
+
+def test_district_filter_still_rejects_unknown_names(client):
+    assert client.get("/cutoff/query?district=ATLANTIS").get_json()["total"] == 0
@@ -0,0 +1,58 @@
+import threading
+import time
+
+import pytest
+
+import app as app_module
+import cutoff
+import health
+from datastore import DatasetCache
+
+
+@pytest.fixture
+def cold_app(monkeypatch):
+    # a fresh process as far as /readyz can tell: nothing loaded, not ready
+    readiness = health.Readiness()
+    dataset = DatasetCache(cutoff.DF_FILE, cutoff.load_clean, extra_dir=cutoff.YEARS_DIR,
+                           combine=cutoff.concat_clean)
+    monkeypatch.setattr(health, "readiness", readiness)
+    monkeypatch.setattr(app_module, "readiness", readiness)
+    monkeypatch.setattr(cutoff, "_dataset", dataset)
+    return app_module.create_app(), readiness, dataset
+
+
+def wait_for(condition, timeout=30):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_readyz_waits_for_the_whole_warm_up(cold_app):
+    app, readiness, dataset = cold_app
+    client = app.test_client()
+    release = threading.Event()
+
+    def slow_load():
+        cutoff.load_data()  # the first dataset load happens early in the warm-up
+        release.wait(30)
+
+    readiness.start(slow_load)
+    wait_for(lambda: dataset.stats()["loaded"])
+    for _ in range(20):
+        assert client.get("/readyz").status_code == 503
+        time.sleep(0.01)
+
+    release.set()
+    wait_for(lambda: not readiness.loading)
+    response = client.get("/readyz")
+    assert response.status_code == 200
+    assert response.get_json()["load_seconds"] is not None
+
+
+def test_readyz_turns_ready_on_a_lazy_load(cold_app):
+    app, readiness, _ = cold_app
+    client = app.test_client()
+    assert client.get("/readyz").status_code == 503
+    assert client.get("/data").status_code == 200
+    assert client.get("/readyz").status_code == 200
@@ -0,0 +1,39 @@
+import json
+
+import pytest
+
+import geo
+import regional
+from app import app
+from datastore import DatasetCache
+
+
+def square(x, y):
+    return {"type": "Polygon", "coordinates": [[[x, y], [x + 1, y], [x + 1, y + 1], [x, y + 1], [x, y]]]}
+
+
+@pytest.fixture
+def boundaries(tmp_path, monkeypatch):
+    def use(features):
+        path = tmp_path / "districts.geojson"
+        path.write_text(json.dumps({"type": "FeatureCollection", "features": [
+            {"type": "Feature", "properties": props, "geometry": square(i, 0)} for i, props in enumerate(features)]}))
+        monkeypatch.setitem(geo._sources, regional.MAP_NAME, DatasetCache(str(path), geo.load_geojson))
+        regional.map_cache.clear()
+    yield use
+    regional.map_cache.clear()
+
+
+def test_map_labels_every_district_feature(boundaries):
+    boundaries([{"DISTRICT": "Tiruppur"}, {"dtname": "The Nilgiris"}, {"STNAME": "TAMIL NADU"}])
+    doc = app.test_client().get("/cutoff/regional-map").get_json()
+    districts = [f["properties"]["district"] for f in doc["features"]]
+    assert districts == ["TIRUPPUR", "NILGIRIS"]
+    assert all(f["properties"]["allotments"] > 0 for f in doc["features"])
+
+
+def test_map_without_district_features_is_an_error(boundaries):
+    boundaries([{"STNAME": "TAMIL NADU"}])
+    response = app.test_client().get("/cutoff/regional-map")
+    assert response.status_code == 404
+    assert "no district features" in response.get_json()["error"]
@@ -0,0 +1,78 @@
+"""Vectorised trend metrics over a pivoted frame (one column per year).
+
+Replaces the row-wise DataFrame.apply(axis=1) trend helpers that used to live
+in build_insights and regional_data.
+"""
+import numpy as np
+import pandas as pd
+
+
+def year_pairs(years):
+    """Consecutive (start, end) year pairs, plus first -> last if not already one."""
+    years = list(years)
+    pairs = list(zip(years, years[1:]))
+    if (years[0], years[-1]) not in pairs:
+        pairs.append((years[0], years[-1]))
+    return pairs
+
+
+def pair_label(start, end):
+    # 2023, 2025 -> "23_25", the suffix used in payload keys like growth_23_25
+    return f"{start % 100:02d}_{end % 100:02d}"
+
+
+def pct_change(start, end):
+    """(end - start) / start * 100, NaN where start is missing or zero."""
+    start = np.asarray(start, dtype="float64")
+    end = np.asarray(end, dtype="float64")
+    with np.errstate(divide="ignore", invalid="ignore"):
+        pct = (end - start) / start * 100.0
+    return np.where(np.isfinite(start) & (start != 0), pct, np.nan)
+
+
+def row_std(values):
+    """Sample std per row ignoring NaN (same as DataFrame.std(axis=1))."""
+    present = ~np.isnan(values)
+    n = present.sum(axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean = np.where(present, values, 0.0).sum(axis=1) / n
+        sq = np.where(present, (values - mean[:, None]) ** 2, 0.0).sum(axis=1)
+        return np.where(n > 1, np.sqrt(sq / (n - 1)), np.nan)
+
+
+def trend_metrics(frame: pd.DataFrame, year_cols, stable_label=None) -> pd.DataFrame:
+    """Trend metrics for each row of `frame` across the ordered `year_cols`.
+
+    Returns a frame (same index) with Net_Change (last - first year),
+    Pct_Change, Volatility, Increasing / Decreasing (strictly monotonic over
+    every year, all present) and Trend. Rows that are neither increasing nor
+    decreasing get `stable_label` if given, otherwise up/down/flat from the
+    sign of Net_Change.
+    """
+    values = frame[list(year_cols)].to_numpy(dtype="float64")
+    first, last = values[:, 0], values[:, -1]
+    net = last - first
+
+    # a single year can't be a trend
+    complete = ~np.isnan(values).any(axis=1) & (values.shape[1] > 1)
+    steps = np.diff(values, axis=1)
+    increasing = complete & (steps > 0).all(axis=1)
+    decreasing = complete & (steps < 0).all(axis=1)
+
+    if stable_label is None:
+        trend = np.select(
+            [increasing, decreasing, net > 0, net < 0],
+            ["increasing", "decreasing", "up", "down"],
+            default="flat",
+        )
+    else:
+        trend = np.select([increasing, decreasing], ["increasing", "decreasing"], default=stable_label)
+
+    return pd.DataFrame({
+        "Net_Change": net,
+        "Pct_Change": pct_change(first, last),
+        "Volatility": row_std(values),
+        "Increasing": increasing,
+        "Decreasing": decreasing,
+        "Trend": trend,
+    }, index=frame.index)